@@ -1,11 +1,25 @@
 import os.path
-from time import sleep
+import random
+import shutil
 from monitoring.SystemMonitor import SystemMonitor
 from monitoring.InjectionManager import InjectionManager
-from utils.utilities import write_dict_to_csv
+from monitoring.ProbeBackend import PsutilProbeBackend, TraceRecordingBackend, TraceReplayBackend
+from monitoring.SamplingService import SamplingService
+from utils.Clock import WALL_CLOCK
+from utils.FixedRateScheduler import FixedRateScheduler
+from utils.CsvSink import CsvSink
+from utils.NpzChunkSink import NpzChunkSink
 from utils.SystemState import SystemState
 
 DEBUG: bool = False
+OUTPUT_FORMAT: str = "csv" # "csv" to write the dataset as a CSV file, "npz" to write it as a series of compressed NumPy chunks (to be loaded with utils.NpzChunkSink.load_npz_chunks)
+NPZ_COMPRESS: bool = True # True for compressed .npz chunks (smaller), False for a .npy file per column, that utils.NpzChunkSink.iter_npz_chunks can memory-map
+INJECTOR_WORKERS: int = 1 # number of long-lived processes that execute the injections (0 to start a new process at each injection)
+TRACE_MODE: str = None # None to monitor the system, "record" to also write every raw reading of the system into TRACE_FILENAME, "replay" to replay TRACE_FILENAME on a virtual clock (without injections and without waiting)
+TRACE_FILENAME: str = "output_folder/probe_trace.jsonl"
+TRACE_SPEEDUP: float = 0 # in replay mode, ratio between the recorded time and the real time waited (0 means as fast as possible)
+TRACE_SEED: int = 0 # seed of the shuffle of the injectors when a trace is recorded or replayed, so that the replay labels the observations as the recorded run
+SHARED_SAMPLER_NAME: str = None # if given (e.g. "dcml_sampler"), every observation is also published into a shared memory ring buffer with this name, read by main_anomaly_detector.py instead of sampling the system again
 
 if __name__ == "__main__":
     """
@@ -14,6 +28,7 @@ if __name__ == "__main__":
 
     # General variables
     csv_filename = 'DCML_Project_dataset.csv'
+    npz_folder = 'DCML_Project_dataset_npz'
     out_folder = 'output_folder'
 
     if not DEBUG:
@@ -29,7 +44,7 @@ if __name__ == "__main__":
         #inj_json = 'src/injectors_json.json'
         inj_json = 'src/debug_injectors.json'
         verbose = True
-    sleep_time_after_obs = 0.1 # time to sleep before to make a new observation
+    slack_time_per_obs = 0.1 # time left free in each sampling period, besides the time needed by the monitor, for writing the row and starting/stopping injections
 
     # Checking if output_folder already exists: if yes, delete
     if not os.path.exists(out_folder):
@@ -40,39 +55,76 @@ if __name__ == "__main__":
     if os.path.exists(csv_filename):
         os.remove(csv_filename)
 
-    monitor = SystemMonitor()
+    # Checking if npz_folder already exists: if yes, delete
+    npz_folder = os.path.join(out_folder, npz_folder)
+    if os.path.exists(npz_folder):
+        shutil.rmtree(npz_folder)
 
-    real_time_between_obs = sleep_time_after_obs + monitor.get_estimation_monitoring_time_per_obs()
+    clock = WALL_CLOCK
+    if TRACE_MODE == "record":
+        monitor = SystemMonitor(backend=TraceRecordingBackend(PsutilProbeBackend(), TRACE_FILENAME))
+    elif TRACE_MODE == "replay":
+        backend = TraceReplayBackend.load(TRACE_FILENAME, TRACE_SPEEDUP)
+        clock = backend.clock
+        monitor = SystemMonitor(backend=backend, clock=clock)
+    else:
+        monitor = SystemMonitor()
+    if TRACE_MODE is not None:
+        random.seed(TRACE_SEED)
+
+    # the observations are taken on fixed deadlines, so the sampling period (and the duration of the injections) is known exactly
+    sampling_period = slack_time_per_obs + monitor.get_estimation_monitoring_time_per_obs()
+    scheduler = FixedRateScheduler(sampling_period, clock)
+    sampling_service = SamplingService(monitor, SHARED_SAMPLER_NAME, sampling_period=sampling_period) if SHARED_SAMPLER_NAME is not None else None
 
-    injection_manager = InjectionManager(json_object=inj_json, obs_per_inj=obs_per_inj, inj_number=inj_number, inj_duration=obs_per_inj*real_time_between_obs*1000, verbose=verbose)
+    injection_manager = InjectionManager(json_object=inj_json, obs_per_inj=obs_per_inj, inj_number=inj_number, inj_duration=obs_per_inj*sampling_period*1000, verbose=verbose,
+                                         dry_run=TRACE_MODE == "replay", clock=clock, worker_pool_size=INJECTOR_WORKERS)
     injection_manager.read_injectors(shuffle=True) # fill up the list of injectors with those specified in the JSON file and perform a shuffle of the elements in the list
     
     # Variables used in the loop as flags to do the "switch" between normal and abnormal behavior of the system
     num_obs_done: int = 0
     num_obs_to_do: int = obs_norm_behav # the process starts monitoring the normal behavior of the system
     
-    is_first_time: bool = True
+    if OUTPUT_FORMAT == "npz":
+        data_sink = NpzChunkSink(npz_folder, compress=NPZ_COMPRESS)
+    else:
+        data_sink = CsvSink(csv_filename) # the CSV file is kept open for the whole monitoring and rows are written in batches
 
-    while True:
-        if num_obs_to_do - num_obs_done > 0:
-            monitored_data = monitor.monitor()
-            write_dict_to_csv(csv_filename, monitored_data, is_first_time)
-            is_first_time = False
-            num_obs_done += 1
-            sleep(sleep_time_after_obs)
-        else:
-            if monitor.get_system_state() == SystemState.NORMAL: # starts an injection
-                if not injection_manager.injectors_list_is_empty():
-                    monitor.start_injection(injection_manager.start_injection())
-                    num_obs_to_do = obs_per_inj
-                else:
-                    break
-            else: # stops the current injection
-                injection_manager.stop_injection()
-                monitor.end_injection()
-                num_obs_to_do = obs_norm_behav
-                if injection_manager.injectors_list_is_empty():
-                    break 
-            num_obs_done = 0
+    try:
+        while True:
+            if num_obs_to_do - num_obs_done > 0:
+                scheduler.wait_next()
+                record = monitor.monitor_record()
+                if sampling_service is not None:
+                    sampling_service.publish(record)
+                data_sink.write(record.to_dict())
+                num_obs_done += 1
+            else:
+                if monitor.get_system_state() == SystemState.NORMAL: # starts an injection
+                    if not injection_manager.injectors_list_is_empty():
+                        monitor.start_injection(injection_manager.start_injection())
+                        num_obs_to_do = obs_per_inj
+                    else:
+                        break
+                else: # stops the current injection
+                    injection_manager.stop_injection()
+                    monitor.end_injection()
+                    num_obs_to_do = obs_norm_behav
+                    if injection_manager.injectors_list_is_empty():
+                        break 
+                num_obs_done = 0
+    except KeyboardInterrupt:
+        print("Monitoring interrupted. The data monitored so far are in the output folder")
+        raise SystemExit(1)
+    finally:
+        data_sink.close() # the rows still in memory are written to the file also if the monitoring is interrupted
+        if sampling_service is not None:
+            sampling_service.close()
+        monitor.close()
+        injection_manager.close() # stops the current injection, if any, and the injector workers
+        print("Sampling statistics:\n" + scheduler.report()) # skipped ticks and lateness show if the host was too loaded to keep the sampling rate
     
-    print("Monitoring finished. All injections performed correctly!\nYou can find all monitored data in the output folder in the CSV file DCML_Project_dataset.csv")
\ No newline at end of file
+    if OUTPUT_FORMAT == "npz":
+        print("Monitoring finished. All injections performed correctly!\nYou can find all monitored data in the output folder in the folder DCML_Project_dataset_npz")
+    else:
+        print("Monitoring finished. All injections performed correctly!\nYou can find all monitored data in the output folder in the CSV file DCML_Project_dataset.csv")
\ No newline at end of file
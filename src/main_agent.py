@@ -0,0 +1,21 @@
+import argparse
+from monitoring.MonitoringAgent import MonitoringAgent
+
+if __name__ == "__main__":
+    """
+    Main method to start the agent that monitors this host and streams the observations to the collector (main_collector.py)
+    """
+    parser = argparse.ArgumentParser(description="Agent that streams the observations of the system monitor to a collector")
+    parser.add_argument("--collector", default="127.0.0.1:5555", help="address of the collector (host:port or unix:/path/to/socket)")
+    parser.add_argument("--host-name", default=None, help="name of this host used by the collector (default: the host name of the machine)")
+    parser.add_argument("--period", type=float, default=1.0, help="time between two observations, in seconds")
+    args = parser.parse_args()
+
+    agent = MonitoringAgent(args.collector, host_name=args.host_name, sampling_period=args.period)
+    agent.connect()
+    print(f"Agent {agent.host_name} connected to the collector, it sends {len(agent.features)} features. Press Ctrl+C to stop it")
+    try:
+        agent.run()
+    except KeyboardInterrupt:
+        agent.stop()
+        agent.close()
@@ -1,32 +1,97 @@
-import joblib
+import os
 from time import sleep
-from monitoring.AnomalyDetector import AnomalyDetector
+from monitoring.AnomalyDetector import AnomalyDetector, OUT_FOLDER
 from monitoring.SystemMonitor import SystemMonitor
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import StackingClassifier
+from monitoring.SamplingReader import SamplingReader
+from monitoring.MetricsServer import MetricsServer
+from monitoring.AdaptiveSamplingPolicy import AdaptiveSamplingPolicy
+from monitoring.LogPolicy import LogPolicy
+from monitoring.ProbePlan import ProbePlan
+from monitoring.WindowFeatureEngine import WindowFeatureEngine
+from monitoring.FlatModel import FlatStackingClassifier
+from utils.PhaseTimer import PhaseTimer
+from utils.StageTimers import StageTimers
+from utils.RuntimeProfiler import RuntimeProfiler, PROFILE_SIGNAL, TRACEMALLOC_SIGNAL
+from utils.utilities import load_model
+
+MODEL_FILENAME = "saved_models/best_model_stacking.pkl"
+FLAT_MODEL_FILENAME = "saved_models/flat_model.npz" # the model exported (and verified) by main_export_flat_model.py, used in place of MODEL_FILENAME if it exists
+SCALER_FILENAME = "saved_models/scaler.pkl"
+GATE_MODEL_FILENAME = "saved_models/gate_model.pkl" # optional cheap model (see train_gate in CascadeClassifier.py) evaluated before the stacking classifier
+SLACK_TIME_PER_OBS = 0.1 # time left free in each sampling period, besides the time needed by the monitor (the observations are taken on fixed deadlines)
+SHARED_SAMPLER_NAME = None # if given (e.g. "dcml_sampler"), the observations are read from the SamplingService with this name (started by main.py or main_sampler.py) instead of sampling the system
+SLOW_SAMPLING_PERIOD = None # if given (e.g. 5), the host is sampled every SLOW_SAMPLING_PERIOD seconds with a reduced probe set while it is normal, and at the full rate with all the probes as soon as an anomaly is detected
+SPARSE_LOGGING = False # if True, the full datapoints are logged only around the anomalies and the log files are rotated and compressed (see LogPolicy)
+FIRST_PREDICTION_TIMEOUT = 60 # seconds after which the startup is aborted if the detector has not made its first prediction
+METRICS_ADDRESS = None # if given (e.g. "127.0.0.1:9108" or "unix:/tmp/dcml_detector_metrics.sock"), the metrics of the detector are served in the Prometheus text format at /metrics
 
 if __name__ == "__main__":
      """
      Main method to start the anomaly detection
      """
-     stacking_classifier: StackingClassifier = joblib.load('saved_models/best_model_stacking.pkl')
-     standard_scaler: StandardScaler = joblib.load('saved_models/scaler.pkl')
- 
-     features_to_remove = ['time', 'datetime','virtual_mem_total','injector',\
-                                          'core_0_%nice', 'core_0_%iowait', 'core_0_%softirq', 'core_0_%irq', 'core_0_%steal', 'core_0_%guest', 'core_0_%guest_nice',\
-                                          'core_1_%nice', 'core_1_%iowait', 'core_1_%softirq', 'core_1_%irq', 'core_1_%steal', 'core_1_%guest', 'core_1_%guest_nice',\
-                                          'core_2_%nice', 'core_2_%iowait', 'core_2_%softirq', 'core_2_%irq', 'core_2_%steal', 'core_2_%guest', 'core_2_%guest_nice',\
-                                          'core_3_%nice', 'core_3_%iowait', 'core_3_%softirq', 'core_3_%irq', 'core_3_%steal', 'core_3_%guest', 'core_3_%guest_nice',\
-                                          'core_4_%nice', 'core_4_%iowait', 'core_4_%softirq', 'core_4_%irq', 'core_4_%steal', 'core_4_%guest', 'core_4_%guest_nice',\
-                                          'core_5_%nice', 'core_5_%iowait', 'core_5_%softirq', 'core_5_%irq', 'core_5_%steal', 'core_5_%guest', 'core_5_%guest_nice',\
-                                          'core_6_%nice', 'core_6_%iowait', 'core_6_%softirq', 'core_6_%irq', 'core_6_%steal', 'core_6_%guest', 'core_6_%guest_nice',\
-                                          'core_7_%nice', 'core_7_%iowait', 'core_7_%softirq', 'core_7_%irq', 'core_7_%steal', 'core_7_%guest', 'core_7_%guest_nice']
-                                             
-     anomaly_detector = AnomalyDetector(stacking_classifier, standard_scaler, SystemMonitor(interval_cpu_cores_percent=0.9), features_to_remove)
-     anomaly_detector.start_anomaly_detection()
+     # the modules imported above do not import pandas, sklearn or xgboost: the libraries needed by the models are imported when they are unpickled.
+     # The arrays of the models are memory-mapped, so that more detectors on the same host share the same pages
+     startup = PhaseTimer()
+     # the duration of each stage of the detection (and of each probe of the monitor) is always recorded, while the CPU profiling and the
+     # tracing of the allocations are started and stopped by signals, on the live detector
+     stage_timers = StageTimers()
+     profiler = RuntimeProfiler(OUT_FOLDER, [stage_timers])
+     profiler.install()
+     with startup.phase("load scaler"):
+          standard_scaler = load_model(SCALER_FILENAME)
+     with startup.phase("load model"):
+          # the flat model needs only NumPy: xgboost is not imported at all
+          stacking_classifier = FlatStackingClassifier.load(FLAT_MODEL_FILENAME) if os.path.exists(FLAT_MODEL_FILENAME) else load_model(MODEL_FILENAME)
+          gate_classifier = load_model(GATE_MODEL_FILENAME) if os.path.exists(GATE_MODEL_FILENAME) else None
+
+     with startup.phase("build monitor"):
+          # if the model uses windowed features, they are computed in streaming from the metrics of the monitor
+          window_engine = WindowFeatureEngine.from_features(standard_scaler.feature_names_in_)
+          # the monitor collects only the metrics used by the model, while the features to remove are computed by the AnomalyDetector
+          probe_plan = ProbePlan.from_features(list(standard_scaler.feature_names_in_) + (window_engine.columns if window_engine is not None else []))
+          if SHARED_SAMPLER_NAME is not None: # the service publishes all the metrics: the detector reads the ones used by the model
+               system_monitor = SamplingReader(SHARED_SAMPLER_NAME)
+          else:
+               system_monitor = SystemMonitor(interval_cpu_cores_percent=0.9, probe_plan=probe_plan, stage_timers=stage_timers)
+
+     with startup.phase("build detector"):
+          if SHARED_SAMPLER_NAME is not None: # one prediction for each observation published by the service
+               sampling_period = system_monitor.sampling_period
+          else:
+               sampling_period = SLACK_TIME_PER_OBS + system_monitor.get_estimation_monitoring_time_per_obs()
+          sampling_policy = AdaptiveSamplingPolicy(max(SLOW_SAMPLING_PERIOD, sampling_period), sampling_period) if SLOW_SAMPLING_PERIOD is not None else None
+          anomaly_detector = AnomalyDetector(stacking_classifier, standard_scaler, system_monitor, pipelined=True, sampling_period=sampling_period,
+                                             window_engine=window_engine, gate_clf=gate_classifier, stage_timers=stage_timers, profiler=profiler,
+                                             sampling_policy=sampling_policy, log_policy=LogPolicy() if SPARSE_LOGGING else None)
+     with startup.phase("warm-up prediction"):
+          anomaly_detector.warm_up()
+     metrics_server = MetricsServer(anomaly_detector, METRICS_ADDRESS) if METRICS_ADDRESS is not None else None
+     if metrics_server is not None:
+          metrics_server.start()
      try:
+          with startup.phase("first observation and prediction"): # the first observation lasts at least the intervals of the CPU probe
+               anomaly_detector.start_anomaly_detection()
+               if not anomaly_detector.wait_first_prediction(FIRST_PREDICTION_TIMEOUT):
+                    anomaly_detector.stop()
+                    if metrics_server is not None:
+                         metrics_server.stop()
+                    raise SystemExit(f"The anomaly detector stopped or made no prediction within {FIRST_PREDICTION_TIMEOUT} s (see the errors above)")
+          print("Startup time:\n" + startup.report())
           print("Press Ctrl+C to stop the anomaly detector")
+          if metrics_server is not None:
+               print(f"Metrics served at {METRICS_ADDRESS} (GET /metrics)")
+          print(f"To profile it: kill -{PROFILE_SIGNAL.name[3:]} {os.getpid()} to start/stop cProfile, kill -{TRACEMALLOC_SIGNAL.name[3:]} {os.getpid()} to start/stop tracemalloc (reports in {OUT_FOLDER}/)")
           while anomaly_detector.is_detecting():
                sleep(0.5)
      except KeyboardInterrupt:
           anomaly_detector.stop()
+          if metrics_server is not None:
+               metrics_server.stop()
+          print("Sampling statistics:\n" + anomaly_detector.scheduler.report())
+          print("Stage latencies (ms):\n" + stage_timers.report())
+          if sampling_policy is not None:
+               print(f"Adaptive sampling statistics: {anomaly_detector.get_sampling_stats()}")
+          if SPARSE_LOGGING:
+               print(f"Datapoint log statistics: {anomaly_detector.get_log_stats()}")
+          if gate_classifier is not None:
+               print(f"Cascade statistics: {anomaly_detector.get_cascade_stats()}")
@@ -0,0 +1,49 @@
+import sys
+import argparse
+import tempfile
+from monitoring.BenchmarkSuite import BenchmarkSuite, BENCHMARK_GROUPS
+from monitoring.ProbeBackend import RecordedProbeBackend, PsutilProbeBackend
+from utils.BenchmarkRunner import BenchmarkRunner, load_baseline, format_comparisons, environment_info, REGRESSION_TOLERANCE
+
+if __name__ == "__main__":
+    """
+    Main method to run the micro-benchmarks of the hot paths of the project, optionally saving the results as a baseline or comparing them with one
+    """
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the monitor, the anomaly detector, the CSV logs, the injectors and the models")
+    parser.add_argument("--groups", nargs="+", choices=BENCHMARK_GROUPS, default=list(BENCHMARK_GROUPS), help="groups of benchmarks to run")
+    parser.add_argument("--iterations", type=int, default=1000, help="timed iterations of each benchmark")
+    parser.add_argument("--slow-iterations", type=int, default=5, help="timed iterations of the injector and model loading benchmarks")
+    parser.add_argument("--probe-samples", default=None, help="JSON file of probe snapshots to replay (default: synthetic snapshots of an 8-core host)")
+    parser.add_argument("--record", default=None, help="record probe snapshots of this host into this JSON file and exit")
+    parser.add_argument("--record-count", type=int, default=200, help="number of snapshots to record")
+    parser.add_argument("--record-interval", type=float, default=0.1, help="seconds between two recorded snapshots")
+    parser.add_argument("--model", default=None, help="file of the saved model (default: a small model trained on the replayed snapshots)")
+    parser.add_argument("--scaler", default=None, help="file of the saved scaler, needed together with --model")
+    parser.add_argument("--save-baseline", default=None, help="JSON file in which the results are saved")
+    parser.add_argument("--baseline", default=None, help="JSON file of a previous run to compare the results with")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="relative increase of a latency reported as a regression")
+    args = parser.parse_args()
+
+    if args.record is not None:
+        RecordedProbeBackend.record(PsutilProbeBackend(), args.record_count, args.record_interval).save(args.record)
+        print(f"{args.record_count} probe snapshots saved in {args.record}")
+        sys.exit(0)
+
+    backend = RecordedProbeBackend.load(args.probe_samples) if args.probe_samples is not None else RecordedProbeBackend.synthetic()
+    runner = BenchmarkRunner(args.iterations)
+    with tempfile.TemporaryDirectory() as work_dir:
+        suite = BenchmarkSuite(runner, backend, work_dir, args.model, args.scaler, args.slow_iterations)
+        suite.run(tuple(args.groups))
+    print(runner.report())
+
+    if args.save_baseline is not None:
+        runner.save(args.save_baseline)
+        print(f"Results saved in {args.save_baseline}")
+    if args.baseline is not None:
+        baseline = load_baseline(args.baseline)
+        if baseline["environment"]["platform"] != environment_info()["platform"]:
+            print(f"Warning: the baseline was measured on {baseline['environment']['platform']}")
+        comparisons = runner.compare(baseline, args.tolerance)
+        print(format_comparisons(comparisons))
+        if any(comparison["regression"] for comparison in comparisons):
+            sys.exit(1)
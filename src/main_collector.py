@@ -0,0 +1,29 @@
+import joblib
+import argparse
+from time import sleep
+from monitoring.AnomalyCollector import AnomalyCollector
+from monitoring.SeverityTracker import TRESHOLD_TO_RESET_FLAG
+
+if __name__ == "__main__":
+    """
+    Main method to start the collector that scores the observations streamed by the agents (main_agent.py) of many hosts
+    """
+    parser = argparse.ArgumentParser(description="Collector that scores, in micro-batches, the observations of many monitoring agents")
+    parser.add_argument("--address", default="0.0.0.0:5555", help="address on which the collector listens (host:port or unix:/path/to/socket)")
+    parser.add_argument("--model", default="saved_models/best_model_stacking.pkl", help="file of the saved model")
+    parser.add_argument("--scaler", default="saved_models/scaler.pkl", help="file of the saved scaler")
+    parser.add_argument("--batch-size", type=int, default=256, help="maximum number of observations scored with a single call of the model")
+    parser.add_argument("--batch-timeout", type=float, default=0.05, help="maximum time, in seconds, that an observation waits for a batch to be filled")
+    parser.add_argument("--reset-threshold", type=int, default=TRESHOLD_TO_RESET_FLAG, help="consecutive normal predictions after which the severity level of a host is reset")
+    parser.add_argument("--out-folder", default="collector_log", help="folder in which the log file is written")
+    args = parser.parse_args()
+
+    collector = AnomalyCollector(joblib.load(args.model), joblib.load(args.scaler), args.address, batch_size=args.batch_size,
+                                 batch_timeout=args.batch_timeout, reset_threshold=args.reset_threshold, out_folder=args.out_folder)
+    collector.start()
+    try:
+        print("Press Ctrl+C to stop the collector")
+        while True:
+            sleep(0.5)
+    except KeyboardInterrupt:
+        collector.stop()
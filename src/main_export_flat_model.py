@@ -0,0 +1,70 @@
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from monitoring.FlatModel import FlatStackingClassifier
+from utils.utilities import load_model
+
+PROBA_TOLERANCE = 1e-6 # maximum difference accepted on the probabilities of the base learners and of the final estimator (see FlatStackingClassifier)
+FLAT_MODEL_FILENAME = "saved_models/flat_model.npz" # file loaded by the anomaly detector in place of the saved model when it exists
+
+if __name__ == "__main__":
+    """
+    Main method to export the saved StackingClassifier into flat NumPy arrays and to check, on the collected dataset, that the flat evaluator
+    gives the same probabilities of the original model (within PROBA_TOLERANCE) and the same labels. The flat model is written to a temporary
+    file and moved to its final name only when the verification passes, so a failed export never replaces the file loaded by the anomaly detector
+    """
+    parser = argparse.ArgumentParser(description="Export of the stacking model into flat arrays and verification against predict_proba")
+    parser.add_argument("--model", default="saved_models/best_model_stacking.pkl", help="file of the saved model")
+    parser.add_argument("--scaler", default="saved_models/scaler.pkl", help="file of the saved scaler")
+    parser.add_argument("--dataset", default="output_folder/DCML_Project_dataset.csv", help="CSV file with the rows used for the verification")
+    parser.add_argument("--out", default=FLAT_MODEL_FILENAME, help="file in which the flat model is saved")
+    parser.add_argument("--float32", action="store_true", help="walk and sum the trees in float32 (the probabilities are not verified, so the model cannot be saved in the file loaded by the anomaly detector)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="number of rows of the dataset verified at once")
+    args = parser.parse_args()
+    if args.float32 and os.path.abspath(args.out) == os.path.abspath(FLAT_MODEL_FILENAME):
+        parser.error(f"a float32 model cannot be saved in {FLAT_MODEL_FILENAME}, that is loaded by the anomaly detector: choose another file with --out")
+
+    stacking_classifier = load_model(args.model, mmap_mode=None)
+    standard_scaler = load_model(args.scaler, mmap_mode=None)
+    for estimator in stacking_classifier.estimators_:
+        if hasattr(estimator, "n_jobs") and type(estimator).__name__ != "XGBClassifier":
+            estimator.n_jobs = 1 # the probabilities of the trees of a forest are summed in a fixed order only with a single job
+    flat_model = FlatStackingClassifier.from_stacking(stacking_classifier, np.float32 if args.float32 else np.float64)
+    tmp_filename = args.out + ".tmp.npz" # np.savez appends .npz to the names without it
+    flat_model.save(tmp_filename)
+    flat_model = FlatStackingClassifier.load(tmp_filename)
+
+    feature_names = list(standard_scaler.feature_names_in_)
+    names = [name for name, estimator in stacking_classifier.named_estimators_.items() if estimator != "drop"]
+    base_learners = [estimator for estimator in stacking_classifier.estimators_ if estimator != "drop"]
+    num_rows = 0
+    close_rows = {name: 0 for name in names + ["final"]}
+    max_diff = {name: 0.0 for name in names + ["final"]}
+    labels_agreement = 0
+    for chunk in pd.read_csv(args.dataset, chunksize=args.chunk_size):
+        x = standard_scaler.transform(chunk[feature_names])
+        flat_base_proba = flat_model.base_learners_proba(x)
+        for name, estimator, flat_proba in zip(names, base_learners, flat_base_proba):
+            proba = estimator.predict_proba(x)
+            close_rows[name] += int((np.abs(flat_proba - proba) <= PROBA_TOLERANCE).all(axis=1).sum())
+            max_diff[name] = max(max_diff[name], float(np.abs(flat_proba - proba).max()))
+        proba = stacking_classifier.predict_proba(x)
+        flat_proba = flat_model.predict_proba(x)
+        close_rows["final"] += int((np.abs(flat_proba - proba) <= PROBA_TOLERANCE).all(axis=1).sum())
+        max_diff["final"] = max(max_diff["final"], float(np.abs(flat_proba - proba).max()))
+        labels_agreement += int((flat_proba.argmax(axis=1) == proba.argmax(axis=1)).sum())
+        num_rows += len(chunk)
+
+    for name in names + ["final"]:
+        print(f"{name}: {close_rows[name]}/{num_rows} rows within {PROBA_TOLERANCE:g}, max difference {max_diff[name]:.3e}")
+    print(f"Predicted labels equal on {labels_agreement}/{num_rows} rows")
+    if not args.float32 and (any(close_rows[name] != num_rows for name in names + ["final"]) or labels_agreement != num_rows):
+        os.remove(tmp_filename)
+        print("Verification FAILED: the flat model must not be used in place of the original one")
+        sys.exit(1)
+    os.replace(tmp_filename, args.out)
+    if not args.float32:
+        print("Verification passed")
+    print(f"Flat model saved in {args.out}")
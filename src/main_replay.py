@@ -0,0 +1,22 @@
+import argparse
+from monitoring.ReplayScorer import score_files
+from monitoring.SeverityTracker import TRESHOLD_TO_RESET_FLAG
+
+if __name__ == "__main__":
+    """
+    Main method to score offline historical data (e.g. output_folder/DCML_Project_dataset.csv or log/datapoint_with_predictions.log of another host)
+    """
+    parser = argparse.ArgumentParser(description="Offline replay of the anomaly detector on CSV files")
+    parser.add_argument("input_files", nargs="+", help="CSV files to score")
+    parser.add_argument("--model", default="saved_models/best_model_stacking.pkl", help="file of the saved model")
+    parser.add_argument("--scaler", default="saved_models/scaler.pkl", help="file of the saved scaler")
+    parser.add_argument("--out-folder", default="replay_log", help="folder in which the log files are written")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="number of rows read, scaled and predicted at once")
+    parser.add_argument("--reset-threshold", type=int, default=TRESHOLD_TO_RESET_FLAG, help="consecutive normal predictions after which the severity level is reset")
+    parser.add_argument("--processes", type=int, default=None, help="number of processes used to score the files (default: number of cores)")
+    args = parser.parse_args()
+
+    summaries = score_files(args.model, args.scaler, args.input_files, args.out_folder, args.chunk_size, args.reset_threshold, args.processes)
+    for summary in summaries:
+        print(summary)
+    print(f"Replay finished. You can find the log files in the folder {args.out_folder}")
@@ -0,0 +1,31 @@
+import signal
+import argparse
+from time import sleep
+from monitoring.SystemMonitor import SystemMonitor, TRAINING_CPU_TIMES_INTERVAL
+from monitoring.SamplingService import SamplingService, DEFAULT_SERVICE_NAME, DEFAULT_RING_CAPACITY
+
+if __name__ == "__main__":
+    """
+    Main method to start the sampling service: the only process that samples this host, publishing the observations into a shared memory
+    ring buffer read by the other processes (e.g. main_anomaly_detector.py with SHARED_SAMPLER_NAME set)
+    """
+    parser = argparse.ArgumentParser(description="Service that samples the system and publishes the observations into shared memory")
+    parser.add_argument("--name", default=DEFAULT_SERVICE_NAME, help="name of the shared memory segment, given to the readers")
+    parser.add_argument("--period", type=float, default=1.0, help="time between two observations, in seconds")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_RING_CAPACITY, help="number of observations kept in the ring buffer")
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, signal.default_int_handler) # also when terminated, the shared memory segment is removed
+
+    # non-blocking monitor: the CPU percentages cover the whole period between two observations, and the CPU times percentages are rescaled
+    # to the window of the training set, so that the detectors reading the service score features with the distribution seen by the model
+    monitor = SystemMonitor(non_blocking=True, interval_cpu_times_percent=TRAINING_CPU_TIMES_INTERVAL)
+    sampling_service = SamplingService(monitor, args.name, capacity=args.capacity, sampling_period=args.period)
+    sampling_service.start()
+    print(f"Sampling service {sampling_service.name} started ({len(monitor.schema)} metrics every {args.period} s). Press Ctrl+C to stop it")
+    try:
+        while True:
+            sleep(1)
+    except KeyboardInterrupt:
+        sampling_service.close()
+        monitor.close()
+        print("Sampling statistics:\n" + sampling_service.scheduler.report())
@@ -0,0 +1,79 @@
+from utils.SeverityLevel import SeverityLevel
+
+CALM_PREDICTIONS = 30 # consecutive normal predictions, with the severity level back to LEVEL_5, needed to go back to the slow cadence
+
+class AdaptiveSamplingPolicy:
+    """
+    Class that decides the sampling cadence of the anomaly detector from its predictions: while the system is NORMAL it is sampled every
+    slow_period seconds, optionally with a reduced probe set (see SystemMonitor.set_reduced_probes), and as soon as a single anomaly is
+    detected or the severity level rises it is sampled every fast_period seconds with all the probes. The hysteresis (calm_predictions)
+    keeps the fast cadence until the system has been normal for a while, so that the cadence does not flap on isolated anomalies
+    """
+
+    def __init__(self, slow_period: float, fast_period: float, calm_predictions: int = CALM_PREDICTIONS, reduced_probes: bool = True):
+        """
+        Constructor
+        :param slow_period: time between two samples while the system is normal, in seconds
+        :param fast_period: time between two samples after an anomaly, in seconds
+        :param calm_predictions: number of consecutive normal predictions at LEVEL_5 after which the slow cadence is restored
+        :param reduced_probes: True if the monitor reads only the cheap probes at the slow cadence, carrying forward the other values
+        """
+        if fast_period > slow_period:
+            raise ValueError("The fast period (%g s) must not be longer than the slow period (%g s)" % (fast_period, slow_period))
+        self.slow_period = slow_period
+        self.fast_period = fast_period
+        self.calm_predictions = calm_predictions
+        self.reduced_probes = reduced_probes
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Method that restores the slow cadence and clears the counters
+        """
+        self.fast: bool = False
+        self.calm_count: int = 0 # consecutive normal predictions at LEVEL_5 since the last anomaly
+        self.stats = {"switches_to_fast": 0, "switches_to_slow": 0, "fast_predictions": 0, "slow_predictions": 0}
+
+    @property
+    def period(self) -> float:
+        """
+        :return: the time between two samples of the current cadence, in seconds
+        """
+        return self.fast_period if self.fast else self.slow_period
+
+    def use_reduced_probes(self) -> bool:
+        """
+        :return: True if the monitor has to read only the cheap probes at the current cadence
+        """
+        return self.reduced_probes and not self.fast
+
+    def update(self, anomaly_detected: bool, severity_level: SeverityLevel) -> bool:
+        """
+        Method to call after each prediction of the model, with the severity level updated by it
+        :param anomaly_detected: True if the model detected an anomaly
+        :param severity_level: the current severity level of the system
+        :return: True if the cadence has changed
+        """
+        self.stats["fast_predictions" if self.fast else "slow_predictions"] += 1
+        if anomaly_detected or severity_level != SeverityLevel.LEVEL_5:
+            self.calm_count = 0
+            if not self.fast:
+                self.fast = True
+                self.stats["switches_to_fast"] += 1
+                return True
+            return False
+        if not self.fast:
+            return False
+        self.calm_count += 1
+        if self.calm_count < self.calm_predictions:
+            return False
+        self.fast = False
+        self.calm_count = 0
+        self.stats["switches_to_slow"] += 1
+        return True
+
+    def get_stats(self) -> dict:
+        """
+        Method that returns the current cadence and the counters of the policy (switches between the cadences, predictions made at each cadence)
+        """
+        return dict(self.stats, mode="fast" if self.fast else "slow", period_s=self.period)
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import queue
+import socket
+import threading
+import numpy as np
+from monitoring.InferencePipeline import InferencePipeline
+from monitoring.SeverityTracker import SeverityTracker, SEVERITY_LEVEL_STATUS, TRESHOLD_TO_RESET_FLAG
+from utils.SeverityLevel import SeverityLevel
+from utils.StreamProtocol import parse_address, pack_json, read_message, unpack_observation, MSG_HELLO, MSG_FEATURES, MSG_OBSERVATION, MSG_ERROR
+from utils.CsvSink import CsvSink
+from datetime import datetime
+
+OUT_FOLDER = "collector_log"
+LOG_PREDICTIONS_PER_HOST_FILENAME = "predictions_per_host.log"
+ACCEPT_TIMEOUT = 0.5 # seconds waited by the accept call before checking if the collector has been stopped
+
+class AnomalyCollector:
+    """
+    Class of the collector service: it receives the streams of observations of many MonitoringAgent instances, scores them in micro-batches
+    (observations of different hosts go in the same predict_proba call) and tracks the severity level of each host separately
+    """
+
+    def __init__(self, model_clf, scaler, address: str, batch_size: int = 256, batch_timeout: float = 0.05, queue_size: int = 4096,
+                 reset_threshold: int = TRESHOLD_TO_RESET_FLAG, out_folder: str = OUT_FOLDER):
+        """
+        Constructor
+        :param model_clf: classifier already trained to use as anomaly detector
+        :param scaler: StandardScaler fitted on the training set of the model, with the names of the features (the features requested to the agents)
+        :param address: address on which the collector listens ("host:port" for TCP or "unix:/path/to/socket")
+        :param batch_size: maximum number of observations scored with a single call of the model
+        :param batch_timeout: maximum time, in seconds, that the first observation of a batch waits for the others
+        :param queue_size: maximum number of observations waiting to be scored. When the queue is full the connections are not read,
+            so the agents are slowed down by TCP flow control
+        :param reset_threshold: number of consecutive normal predictions after which the number of anomalies currently detected for a host is set to zero
+        :param out_folder: folder in which the log file with the predictions of all the hosts is written
+        """
+        self.features: list = list(scaler.feature_names_in_)
+        self.pipeline = InferencePipeline(model_clf, scaler, self.features, self.features)
+        self.address = address
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.reset_threshold = reset_threshold
+        self.observations = queue.Queue(maxsize=queue_size) # items (host, time in milliseconds, values)
+        self.severity_trackers: dict = {} # host -> SeverityTracker, used only by the scoring thread
+        self.lock = threading.Lock() # protects the states of the hosts read from the outside
+        self.host_states: dict = {}
+        self.force_stop = threading.Event()
+        self.server_sock = None
+        self.threads: list = []
+        self.num_batches: int = 0
+        self.num_scored: int = 0
+        if not os.path.exists(out_folder):
+            os.makedirs(out_folder)
+        self.log_filename = os.path.join(out_folder, LOG_PREDICTIONS_PER_HOST_FILENAME)
+
+    def start(self) -> None:
+        """
+        Method to call to start listening for agents and scoring their observations
+        """
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.remove(address)
+        self.server_sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_sock.bind(address)
+        self.server_sock.listen()
+        self.server_sock.settimeout(ACCEPT_TIMEOUT)
+        self.force_stop.clear()
+        self.threads = [threading.Thread(target=self.accept_loop), threading.Thread(target=self.scoring_loop)]
+        for thread in self.threads:
+            thread.start()
+        print(f"The collector is listening on {self.address}")
+
+    def stop(self) -> None:
+        """
+        Method to call to stop the collector: the observations already received are scored before returning
+        """
+        self.force_stop.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self.server_sock.close()
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.remove(address)
+        print("The collector has been stopped")
+
+    def accept_loop(self) -> None:
+        """
+        Loop that accepts the connections of the agents, each one handled by its own thread.
+        This method should not be called from the outside of the class.
+        """
+        while not self.force_stop.is_set():
+            try:
+                conn, _ = self.server_sock.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout(None)
+            threading.Thread(target=self.handle_agent, args=(conn,), daemon=True).start()
+
+    def handle_agent(self, conn: socket.socket) -> None:
+        """
+        Method that performs the handshake with an agent and then puts its observations in the queue of the observations to score.
+        This method should not be called from the outside of the class.
+        :param conn: the connection with the agent
+        """
+        with conn, conn.makefile("rb") as stream:
+            msg_type, payload = read_message(stream)
+            if msg_type != MSG_HELLO:
+                conn.sendall(pack_json(MSG_ERROR, {"error": "the first message has to be HELLO"}))
+                return
+            host = json.loads(payload)["host"]
+            conn.sendall(pack_json(MSG_FEATURES, {"features": self.features}))
+            print(f"Agent {host} connected")
+            num_features = len(self.features)
+            while not self.force_stop.is_set():
+                msg_type, payload = read_message(stream)
+                if msg_type is None:
+                    break
+                if msg_type != MSG_OBSERVATION:
+                    continue
+                time_ms, values = unpack_observation(payload)
+                if len(values) != num_features:
+                    conn.sendall(pack_json(MSG_ERROR, {"error": "expected %d values, received %d" % (num_features, len(values))}))
+                    break
+                self.observations.put((host, time_ms, values))
+            print(f"Agent {host} disconnected")
+
+    def next_batch(self) -> list:
+        """
+        Method that waits for the next micro-batch of observations: it returns when batch_size observations are available or when
+        batch_timeout seconds have passed since the arrival of the first one.
+        This method should not be called from the outside of the class.
+        :return: list of items (host, time in milliseconds, values), empty if no observation arrived
+        """
+        try:
+            batch = [self.observations.get(timeout=self.batch_timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.observations.get(timeout=remaining) if remaining > 0 else self.observations.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def scoring_loop(self) -> None:
+        """
+        Loop that scores the micro-batches with a single call of the model and updates the severity level of each host.
+        This method should not be called from the outside of the class.
+        """
+        with CsvSink(self.log_filename) as log_sink:
+            while not (self.force_stop.is_set() and self.observations.empty()):
+                batch = self.next_batch()
+                if batch:
+                    self.score_batch(batch, log_sink)
+
+    def score_batch(self, batch: list, log_sink: CsvSink) -> None:
+        """
+        Method that scores a micro-batch of observations of different hosts.
+        This method should not be called from the outside of the class.
+        :param batch: list of items (host, time in milliseconds, values)
+        :param log_sink: the sink of the log file
+        """
+        predicted_labels, predicted_proba = self.pipeline.predict(np.vstack([values for _, _, values in batch]))
+        for (host, time_ms, _), label, proba in zip(batch, predicted_labels.tolist(), predicted_proba):
+            anomaly_detected = label == 1
+            tracker = self.severity_trackers.get(host)
+            if tracker is None:
+                tracker = self.severity_trackers[host] = SeverityTracker(self.reset_threshold)
+            previous_level = tracker.severity_level
+            severity_level = tracker.update(anomaly_detected)
+            if severity_level != previous_level:
+                print(f"{host}: {SEVERITY_LEVEL_STATUS[severity_level]}")
+            log_sink.write({
+                "host": host,
+                "date_and_time": datetime.fromtimestamp(time_ms / 1000).strftime("%Y-%m-%d %H:%M:%S"),
+                "prediction": "ANOMALY DETECTED" if anomaly_detected else "NORMAL STATE",
+                "predicted_proba": str(proba.reshape(1, -1)),
+                "severity_level": SEVERITY_LEVEL_STATUS[severity_level]
+            })
+            with self.lock:
+                self.host_states[host] = {"severity_level": severity_level, "num_anomalies_detec": tracker.num_anomalies_detec, "last_time": time_ms}
+        self.num_batches += 1
+        self.num_scored += len(batch)
+
+    def get_host_states(self) -> dict:
+        """
+        Method that returns the current state of each host seen by the collector
+        :return: dictionary host -> {"severity_level", "num_anomalies_detec", "last_time"}
+        """
+        with self.lock:
+            return {host: dict(state) for host, state in self.host_states.items()}
+
+    def get_severity_level(self, host: str) -> SeverityLevel:
+        """
+        Method that returns the current severity level of a host (LEVEL_5 if the host is unknown)
+        """
+        with self.lock:
+            state = self.host_states.get(host)
+        return state["severity_level"] if state is not None else SeverityLevel.LEVEL_5
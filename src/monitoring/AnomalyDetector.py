@@ -1,38 +1,116 @@
-import pandas as pd
 import os.path
+import time
+import queue
 import threading
+import numpy as np
+from datetime import datetime
+from typing import TYPE_CHECKING
 from monitoring.SystemMonitor import SystemMonitor
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import StackingClassifier
+from monitoring.InferencePipeline import InferencePipeline
+from monitoring.ObservationRecord import ObservationRecord, METADATA_COLUMNS
+from monitoring.WindowFeatureEngine import WindowFeatureEngine
+from monitoring.CascadeClassifier import CascadeClassifier, UNCERTAINTY_BAND
+from monitoring.SeverityTracker import SeverityTracker, SEVERITY_LEVEL_STATUS, TRESHOLD_TO_RESET_FLAG
+from monitoring.AdaptiveSamplingPolicy import AdaptiveSamplingPolicy
+from monitoring.LogPolicy import LogPolicy
 from utils.SeverityLevel import SeverityLevel
-from utils.utilities import current_date_and_time, write_dict_to_csv
+from utils.CsvSink import CsvSink
+from utils.FixedRateScheduler import FixedRateScheduler
+from utils.StageTimers import StageTimers
+from utils.RuntimeProfiler import RuntimeProfiler
 from collections import OrderedDict
+if TYPE_CHECKING: # sklearn is imported only when the model is unpickled, so that this module can be imported quickly
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.ensemble import StackingClassifier
 
-TRESHOLD_TO_RESET_FLAG = 5 # after this number of consecutive times that the anomaly detector says NOTHING DETECTED, the SeverityLevel is set to LEVEL_5 (the lowest one)
 OUT_FOLDER = "log"
 LOG_DATAPOINT_AND_PREDICTION_FILENAME = "datapoint_with_predictions.log"
 LOG_PREDICTIONS_AND_SEVERITY_LEVEL = "predictions_with_severity_level.log"
+QUEUE_GET_TIMEOUT = 0.1 # seconds waited on an empty queue by a stage of the pipeline before checking if the detector has been stopped
+FIRST_PREDICTION_POLL = 0.1 # seconds between two checks that the detection is still running, while waiting for the first prediction
 
 class AnomalyDetector():
 
-    def __init__(self, model_clf: StackingClassifier, scaler: StandardScaler = None, monitor: SystemMonitor = SystemMonitor(), feature_to_avoid: list = None):
+    def __init__(self, model_clf: "StackingClassifier", scaler: "StandardScaler" = None, monitor: SystemMonitor = None, feature_to_avoid: list = None,
+                 pipelined: bool = False, queue_size: int = 64, sampling_period: float = 0, window_engine: WindowFeatureEngine = None,
+                 gate_clf = None, uncertainty_band: tuple = UNCERTAINTY_BAND, audit_every: int = 0, stage_timers: StageTimers = None,
+                 profiler: RuntimeProfiler = None, sampling_policy: AdaptiveSamplingPolicy = None,
+                 log_policy: LogPolicy = None):
         """
         Constructor
         :param model_clf: StackingClassifier already trained to use as anomaly detector
         :param scaler: StandardScaler, fitted on the training set used to train the model, to apply to monitored data before giving them in input to the model
-        :param monitor: instance of the monitor
-        :param feature_to_avoid: list of features to don't give in input to the model
+        :param monitor: instance of the monitor (if None, a SystemMonitor with the default parameters is built)
+        :param feature_to_avoid: list of features to don't give in input to the model. If None, it is computed automatically as the
+            monitored features not used by the scaler (or only time, datetime and injector if the scaler has no feature names)
+        :param pipelined: if True, sampling, inference and logging run in three threads connected by bounded queues, so that a slow model call
+            or a slow disk does not delay the next sample. When a queue is full its oldest item is dropped (and counted)
+        :param queue_size: maximum number of items in each queue of the pipeline
+        :param sampling_period: time between two samples, in seconds: the samples are taken on fixed deadlines of the monotonic clock of the monitor
+            by a FixedRateScheduler (0 means that samples are taken back to back)
+        :param window_engine: if given, the windowed features of some monitored metrics are computed at each observation and given in input
+            to the model alongside the raw ones (e.g. WindowFeatureEngine.from_features(scaler.feature_names_in_))
+        :param gate_clf: if given, a cheap classifier trained on the same scaled features (see train_gate in CascadeClassifier.py) that scores every
+            observation: model_clf is evaluated only when the probability of anomaly given by the gate is inside uncertainty_band
+        :param uncertainty_band: pair (low, high) of probabilities of anomaly of the gate for which model_clf is evaluated
+        :param audit_every: if greater than 0, model_clf is evaluated also on one out of audit_every observations decided by the gate alone,
+            to measure the agreement between the two models (see get_cascade_stats)
+        :param stage_timers: the timers in which the duration of each stage of the detection (sample, window, transform, model, severity, alert, log
+            and the whole tick) is recorded. If None, new timers are created (see get_stage_stats). Give the same timers to the SystemMonitor
+            to record also the duration of its probes
+        :param profiler: if given, the threads of the detection start and stop their CPU profiler when it is requested (e.g. by a signal)
+        :param sampling_policy: if given, the time between two samples (and the probe set of the monitor) is decided by the policy after each
+            prediction, in place of sampling_period: slow while the system is normal, fast after an anomaly. Also in the pipelined detector the wait
+            for a sample of the slow cadence is shortened as soon as the policy switches to the fast one
+        :param log_policy: if given, the full datapoints are logged only around the anomalies (plus a decimated sample of the others) and both
+            log files are rotated and compressed as described by the policy. If None, every datapoint is logged into two files that grow without limits
         """
         self.model_clf = model_clf
         self.scaler = scaler  
+        if monitor is None: # built here and not as default value, so that importing this module does not read the system
+            monitor = SystemMonitor()
         self.monitor = monitor  
+        scaler_features = list(scaler.feature_names_in_) if scaler is not None and hasattr(scaler, "feature_names_in_") else None
+        if feature_to_avoid is None:
+            feature_to_avoid = [column for column in list(METADATA_COLUMNS) + monitor.schema.columns if scaler_features is None or column not in scaler_features]
         self.feature_to_avoid = feature_to_avoid
+        # the inference pipeline is compiled once: the features are taken in the order of the scaler (or, if it has no feature names,
+        # in the order of the monitor's schema without the features to avoid). If the monitor does not collect some of them, an error is raised here
+        # The windowed features, if any, follow the values of the monitor's schema in the rows given in input to the pipeline
+        self.window_engine = window_engine
+        input_columns = monitor.schema.columns
+        if window_engine is not None:
+            self.window_idx = monitor.schema.column_indices(window_engine.columns) # position of the metrics of the engine in the values of an observation
+            input_columns = input_columns + window_engine.feature_columns
+            self.sample_buffer = np.empty(len(input_columns), dtype=np.float64)
+        feature_names = scaler_features
+        if feature_names is None:
+            feature_names = [column for column in input_columns if column not in feature_to_avoid]
+        self.cascade = CascadeClassifier(gate_clf, model_clf, uncertainty_band, audit_every) if gate_clf is not None else None
+        self.pipeline = InferencePipeline(self.cascade if self.cascade is not None else model_clf, scaler, input_columns, feature_names)
+        self.stage_timers = stage_timers if stage_timers is not None else StageTimers()
+        self.pipeline.stage_timers = self.stage_timers
+        self.profiler = profiler
+        self.logged_columns = [column for column in self.pipeline.feature_names if column in monitor.schema.index] # features taken from the observations
+        self.pipelined = pipelined
+        self.queue_size = queue_size
+        self.sampling_period = sampling_period
+        self.sampling_policy = sampling_policy
+        self.log_policy = log_policy
         self.init()
 
     def init(self):
         self.is_alive: bool = False
+        self.lock = threading.Lock()
+        self.first_prediction = threading.Event() # set when the first prediction after the start of the detection is made
         self.thread_detection = None
         self.severity_level = SeverityLevel.LEVEL_5
+        self.severity_tracker = SeverityTracker(TRESHOLD_TO_RESET_FLAG)
+        self.pipeline_stats = {"samples": 0, "dropped_samples": 0, "predictions": 0, "dropped_logs": 0, "anomalies": 0, "normal": 0} # each counter is updated by a single stage of the pipeline
+        self.scheduler = FixedRateScheduler(self.sampling_policy.slow_period if self.sampling_policy is not None else self.sampling_period,
+                                            self.monitor.clock) # fires the samples, reset at each start
+        self.sample_queue = None
+        self.log_queue = None
         if not os.path.exists(OUT_FOLDER):
             os.mkdir(OUT_FOLDER)
         self.dp_log_filename = os.path.join(OUT_FOLDER, LOG_DATAPOINT_AND_PREDICTION_FILENAME) # path to the log file that stores each datapoint + the prediction of the model on it
@@ -46,42 +124,287 @@ class AnomalyDetector():
         with self.lock:
             dp_log_filename = self.dp_log_filename
             sl_log_filename = self.sl_log_filename
+
+        # the two log files are kept open for the whole detection and their rows are written in batches
+        if self.log_policy is not None:
+            self.dp_log_sink, self.sl_log_sink = self.log_policy.open_sinks(dp_log_filename, sl_log_filename)
+        else:
+            self.dp_log_sink = CsvSink(dp_log_filename)
+            self.sl_log_sink = CsvSink(sl_log_filename)
+        self.severity_tracker = SeverityTracker(TRESHOLD_TO_RESET_FLAG) # counters of the anomalies detected, reset at each start
+        self.scheduler.reset()
+        if self.sampling_policy is not None: # each detection starts at the slow cadence
+            self.sampling_policy.reset()
+            self.apply_sampling_cadence()
+        if self.window_engine is not None:
+            self.window_engine.reset()
+        try:
+            if self.pipelined:
+                self.pipelined_detection()
+            else:
+                self.detection_loop()
+        finally:
+            self.dp_log_sink.close()
+            self.sl_log_sink.close()
+
+    def detection_loop(self) -> None:
+        """
+        Loop of the anomaly detection, executed until the stop method is called.
+        This method should not be called from the outside of the class.
+        """
+        timers = self.stage_timers
+        try:
+            while self.scheduler.wait_next(self.force_stop):
+                if self.profiler is not None:
+                    self.profiler.checkpoint()
+                tick_start = time.perf_counter_ns()
+                record = self.monitor.monitor_record()
+                start = timers.record("sample", tick_start)
+                values = self.sample_values(record)
+                if self.window_engine is not None:
+                    timers.record("window", start)
+                anomaly_detected, predicted_proba, current_sl = self.process_sample(values)
+                start = time.perf_counter_ns()
+                self.log_system_info(self.datapoint_dict(record, values), observation_time=record.time, anomaly_detected=anomaly_detected,
+                                     predicted_proba=predicted_proba, severity_level=current_sl)
+                timers.record("log", start)
+                timers.record("tick", tick_start)
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop()
+
+    def sample_values(self, record: ObservationRecord) -> np.ndarray:
+        """
+        Method that builds the row given in input to the pipeline from an observation: its values followed, if a window engine is used,
+        by the windowed features updated with the observation. This method should not be called from the outside of the class.
+        :param record: the observation made by the monitor
+        :return: the row, overwritten at the next call
+        """
+        if self.window_engine is None:
+            return record.values
+        num_values = len(record.values)
+        self.sample_buffer[:num_values] = record.values
+        self.sample_buffer[num_values:] = self.window_engine.update(record.values[self.window_idx])
+        return self.sample_buffer
+
+    def datapoint_dict(self, record: ObservationRecord, values: np.ndarray) -> dict:
+        """
+        Method that builds the dictionary of the features given in input to the model, written in the datapoint log.
+        This method should not be called from the outside of the class.
+        :param record: the observation made by the monitor
+        :param values: the row given in input to the pipeline
+        :return: dictionary with the features in the order of the model
+        """
+        datapoint = record.to_dict(self.logged_columns)
+        if self.window_engine is None:
+            return datapoint
+        input_features = values[self.pipeline.feature_idx].tolist()
+        return {feature: datapoint.get(feature, value) for feature, value in zip(self.pipeline.feature_names, input_features)}
+
+    def process_sample(self, values: np.ndarray) -> tuple:
+        """
+        Method that gives a sample in input to the model and updates the severity level of the system with the prediction.
+        This method should not be called from the outside of the class.
+        :param values: the row given in input to the pipeline (see sample_values)
+        :return: a tuple (True if an anomaly is detected, predicted probabilities, current severity level)
+        """
+        with self.lock:
+            predicted_label, predicted_proba = self.pipeline.predict(values) # the model is evaluated only once
+            anomaly_detected: bool = (predicted_label[0] == 1)
+            self.pipeline_stats["anomalies" if anomaly_detected else "normal"] += 1
+            self.first_prediction.set()
+            start = time.perf_counter_ns()
+            self.severity_tracker.update(anomaly_detected)
+
+            self.update_severity_level(self.severity_tracker.num_anomalies_detec)
+            if self.sampling_policy is not None and self.sampling_policy.update(anomaly_detected, self.severity_level):
+                self.apply_sampling_cadence()
+            start = self.stage_timers.record("severity", start)
+            self.raise_alert(anomaly_detected)
+            self.stage_timers.record("alert", start)
             current_sl = self.severity_level
-        
-        num_anomalies_detec: int = 0 # number of anomalies currently detected
-        reset_flag: int = 0 # this is incremented each time a normal behavior is detected. If its value reaches a treshold (TRESHOLD_TO_RESET_FLAG), the num_anomalies_detec variable is set to zero.
-                            # This is the case when, after a long anomaly is detected, the system is said to be normal enough times to be considered safe
-        is_first_time: bool = True
-        while not self.force_stop.is_set():
-            with self.lock:
-                datapoint_monitored: dict = self.monitor.monitor()
-
-                for item in self.feature_to_avoid:
-                    del datapoint_monitored[item]
-
-                datapoint = pd.DataFrame([datapoint_monitored])
-                if self.scaler is not None:
-                    datapoint_std = self.scaler.transform(datapoint)
-                anomaly_detected: bool = (self.model_clf.predict(datapoint_std) == 1)
-                predicted_proba: float = self.model_clf.predict_proba(datapoint_std)
-                if anomaly_detected:
-                    num_anomalies_detec += 1
-                    reset_flag = 0
-                elif reset_flag >= TRESHOLD_TO_RESET_FLAG:
-                    reset_flag = 0
-                    num_anomalies_detec = 0
-                elif num_anomalies_detec > 0:
-                    reset_flag += 1
-                    num_anomalies_detec -= 1
-
-                self.update_severity_level(num_anomalies_detec)
-                self.raise_alert(anomaly_detected)
-                current_sl = self.severity_level
-
-            self.log_system_info(datapoint_monitored, prediction="ANOMALY DETECTED" if anomaly_detected else "NORMAL STATE", predicted_proba=predicted_proba,
-                                 is_first_time=is_first_time, dp_log_fn=dp_log_filename, sl_log_fn=sl_log_filename,
-                                 severity_level=current_sl)
-            is_first_time=False
+        return anomaly_detected, predicted_proba, current_sl
+
+    def apply_sampling_cadence(self) -> None:
+        """
+        Method that gives the cadence decided by the sampling policy to the scheduler of the samples and to the monitor.
+        This method should not be called from the outside of the class.
+        """
+        self.scheduler.set_period(self.sampling_policy.period)
+        self.monitor.set_reduced_probes(self.sampling_policy.use_reduced_probes())
+
+    def pipelined_detection(self) -> None:
+        """
+        Method that runs the detection as a pipeline: this thread samples the system with its own cadence, while an inference thread and a log
+        writer thread consume the samples and the predictions through bounded queues. This method should not be called from the outside of the class.
+        """
+        self.sample_queue = queue.Queue(maxsize=self.queue_size)
+        self.log_queue = queue.Queue(maxsize=self.queue_size)
+        self.inference_done = threading.Event()
+        inference_thread = threading.Thread(target=self.inference_stage)
+        writer_thread = threading.Thread(target=self.log_writer_stage)
+        inference_thread.start()
+        writer_thread.start()
+        try:
+            self.sampler_stage()
+        finally:
+            # the stages are stopped in order, so that the items already in the queues are processed
+            self.force_stop.set()
+            inference_thread.join()
+            self.inference_done.set()
+            writer_thread.join()
+
+    def put_dropping_oldest(self, items_queue: queue.Queue, item, drop_counter: str) -> None:
+        """
+        Method to put an item in a bounded queue without blocking: if the queue is full, its oldest item is dropped
+        :param items_queue: the queue
+        :param item: the item to put
+        :param drop_counter: name of the counter of pipeline_stats incremented for each dropped item
+        """
+        while True:
+            try:
+                items_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    items_queue.get_nowait()
+                    self.pipeline_stats[drop_counter] += 1
+                except queue.Empty:
+                    pass
+
+    def sampler_stage(self) -> None:
+        """
+        First stage of the pipeline: it samples the system every sampling_period seconds and puts a copy of each observation in the sample queue
+        """
+        timers = self.stage_timers
+        try:
+            while self.scheduler.wait_next(self.force_stop):
+                if self.profiler is not None:
+                    self.profiler.checkpoint()
+                start = time.perf_counter_ns()
+                record = self.monitor.monitor_record()
+                start = timers.record("sample", start)
+                # the window engine is updated here, so that the windows contain also the samples dropped later; the rows of the buffers are reused, so they are copied
+                values = self.sample_values(record).copy()
+                if self.window_engine is not None:
+                    timers.record("window", start)
+                sample = ObservationRecord(record.schema, values[:len(record.values)], record.time, record.datetime, record.injector, record.monotonic_time)
+                self.put_dropping_oldest(self.sample_queue, (sample, values), "dropped_samples")
+                self.pipeline_stats["samples"] += 1
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop()
+
+    def inference_stage(self) -> None:
+        """
+        Second stage of the pipeline: it gives the samples in input to the model, updates the severity level and puts the results in the log queue.
+        When the detector is stopped, the samples still in the queue are processed before returning
+        """
+        try:
+            while not (self.force_stop.is_set() and self.sample_queue.empty()):
+                if self.profiler is not None:
+                    self.profiler.checkpoint()
+                try:
+                    record, values = self.sample_queue.get(timeout=QUEUE_GET_TIMEOUT)
+                except queue.Empty:
+                    continue
+                anomaly_detected, predicted_proba, current_sl = self.process_sample(values)
+                self.pipeline_stats["predictions"] += 1
+                self.put_dropping_oldest(self.log_queue, (record, values, anomaly_detected, predicted_proba, current_sl), "dropped_logs")
+        except BaseException:
+            self.force_stop.set() # e.g. an error of the model: the whole pipeline is stopped, instead of sampling without predictions
+            self.scheduler.wake()
+            raise
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop()
+
+    def log_writer_stage(self) -> None:
+        """
+        Last stage of the pipeline: it writes the results of the inference into the log files.
+        It returns when the inference stage has finished and the log queue is empty
+        """
+        try:
+            while not (self.inference_done.is_set() and self.log_queue.empty()):
+                if self.profiler is not None:
+                    self.profiler.checkpoint()
+                try:
+                    record, values, anomaly_detected, predicted_proba, current_sl = self.log_queue.get(timeout=QUEUE_GET_TIMEOUT)
+                except queue.Empty:
+                    continue
+                start = time.perf_counter_ns()
+                self.log_system_info(self.datapoint_dict(record, values), observation_time=record.time, anomaly_detected=anomaly_detected,
+                                     predicted_proba=predicted_proba, severity_level=current_sl)
+                self.stage_timers.record("log", start)
+        except BaseException:
+            self.force_stop.set() # e.g. the disk is full: the whole pipeline is stopped
+            self.scheduler.wake()
+            raise
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop()
+
+    def get_pipeline_stats(self) -> dict:
+        """
+        Method that returns the counters of the pipeline (samples taken, predictions made, anomalous and normal predictions, samples and log rows dropped) and the current length of its queues
+        """
+        stats = dict(self.pipeline_stats)
+        stats["sample_queue_size"] = self.sample_queue.qsize() if self.sample_queue is not None else 0
+        stats["log_queue_size"] = self.log_queue.qsize() if self.log_queue is not None else 0
+        return stats
+
+    def get_scheduler_stats(self) -> dict:
+        """
+        Method that returns the counters and the histograms (lateness of the samples, actual periods) of the scheduler of the samples
+        """
+        return self.scheduler.get_stats()
+
+    def get_sampling_stats(self) -> dict:
+        """
+        Method that returns the current cadence and the counters of the sampling policy, or None if the detector samples at a fixed cadence
+        """
+        if self.sampling_policy is None:
+            return None
+        with self.lock:
+            return self.sampling_policy.get_stats()
+
+    def get_log_stats(self) -> dict:
+        """
+        Method that returns the counters of the datapoint log (datapoints received, datapoints written, events), or None if every datapoint is logged
+        """
+        if self.log_policy is None or not hasattr(self, "dp_log_sink"):
+            return None
+        return self.dp_log_sink.get_stats()
+
+    def get_stage_stats(self) -> dict:
+        """
+        Method that returns the latency histograms of the stages of the detection (see StageTimers), in microseconds
+        """
+        return self.stage_timers.get_stats()
+
+    def warm_up(self) -> None:
+        """
+        Method that makes a prediction on a synthetic observation (the mean of the training set), without logging it or updating the severity level,
+        so that the lazy initializations of the models are done before the first real observation
+        """
+        values = np.zeros(len(self.monitor.schema) + (len(self.window_engine.feature_columns) if self.window_engine is not None else 0))
+        values[self.pipeline.feature_idx] = self.pipeline.mean
+        self.pipeline.stage_timers = None # the slow first call is not recorded
+        self.pipeline.predict(values)
+        self.pipeline.stage_timers = self.stage_timers
+        if self.cascade is not None: # the full model is evaluated by the cascade only when the gate is uncertain
+            self.cascade.full_clf.predict_proba(self.pipeline.transform(values))
+            self.cascade.reset_stats()
+
+    def get_cascade_stats(self) -> dict:
+        """
+        Method that returns the counters of the cascade (how often the gate short-circuits the full model and how often they agree),
+        or None if the detector does not use a gate
+        """
+        if self.cascade is None:
+            return None
+        with self.lock:
+            return self.cascade.get_stats()
 
     def start_anomaly_detection(self) -> None:
         """
@@ -89,7 +412,7 @@ class AnomalyDetector():
         """
         if self.thread_detection is None or not self.thread_detection.is_alive():
             self.force_stop = threading.Event()
-            self.lock = threading.Lock()
+            self.first_prediction.clear()
             self.thread_detection = threading.Thread(target=self.detect_anomalies)
             self.thread_detection.start()
             self.is_alive = True
@@ -97,12 +420,26 @@ class AnomalyDetector():
         else:
             print("Anomaly detector is already running")
 
+    def wait_first_prediction(self, timeout: float = None) -> bool:
+        """
+        Method that waits for the first prediction after the start of the detection
+        :param timeout: maximum time to wait, in seconds (None to wait until the prediction is made or the detection stops)
+        :return: True if the first prediction has been made, False if the timeout expired or the detection stopped before it
+            (e.g. a probe of the monitor or the model raised an error)
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while not self.first_prediction.wait(FIRST_PREDICTION_POLL):
+            if not self.is_detecting() or (deadline is not None and time.monotonic() >= deadline):
+                return self.first_prediction.is_set()
+        return True
+
     def stop(self) -> None:
         """
         Method to call to stop ongoing run-time anomaly detection
         """
         if self.thread_detection is not None:
             self.force_stop.set()
+            self.scheduler.wake() # the sampler may be waiting for a deadline of the slow cadence
             self.thread_detection.join()
             self.thread_detection = None
             self.is_alive = False
@@ -130,36 +467,29 @@ class AnomalyDetector():
         """
         This function updates the severity level of the system after each monitoring
         """
-        if num_obs_anomalies >= 15:
-            self.severity_level = SeverityLevel.LEVEL_1
-        elif num_obs_anomalies >= 10:
-            self.severity_level = SeverityLevel.LEVEL_2
-        elif num_obs_anomalies >= 4:
-            self.severity_level = SeverityLevel.LEVEL_3
-        elif num_obs_anomalies >= 1:
-            self.severity_level = SeverityLevel.LEVEL_4
-        else:
-            self.severity_level = SeverityLevel.LEVEL_5
+        self.severity_level = self.severity_tracker.severity_level_from_anomalies(num_obs_anomalies)
 
     def is_detecting(self) -> bool:
         """
-        Method that returns True if the anomaly detection in running; otherwise it returns false
+        Method that returns True if the anomaly detection in running; otherwise it returns false (also when the detection thread ended because of an error)
         """
-        return self.is_alive
+        return self.is_alive and self.thread_detection is not None and self.thread_detection.is_alive()
     
-    def log_system_info(self, dict_item: dict, prediction, predicted_proba, is_first_time, dp_log_fn, sl_log_fn, severity_level) -> None:
+    def log_system_info(self, dict_item: dict, observation_time: int, anomaly_detected: bool, predicted_proba, severity_level) -> None:
         """
-        Method to log in a CSV format info about the system and predictions made by the classifier into two log files dp_log_fn and sl_log_fn
-        :param dict_item: dictionary to write into the log file dp_log_fn
-        :param prediction: string representing the prediction made by the classifier
+        Method to log in a CSV format info about the system and predictions made by the classifier into the two log files of the detector:
+        the first one stores date + time, prediction, predicted probability and datapoints on which the model make predictions, while
+        the second one stores date + time, prediction, predicted probability and the current severity level
+        :param dict_item: dictionary to write into the first log file
+        :param observation_time: time of the observation (milliseconds since the epoch, as ObservationRecord.time), written as date + time of the rows:
+            in the pipelined detector the rows can be written long after the observation, e.g. when the disk is slow
+        :param anomaly_detected: True if the classifier detected an anomaly
         :param predicted_proba: prediction probability computed by the classifier
-        :param is_first_time: True means that is the first log into files and then the header has to be written
-        :param dp_log_fn: name of the log file in which log info about date + time, prediction, predicted probability and datapoints on which the model make predictions
-        :param sl_log_fn: name of the log file in which log info about date + time, prediction, predicted probability and the current severity level
         :param severity_level: the current severity level of the system
         :return:
         """
-        date_and_time_of_monitoring = current_date_and_time()
+        date_and_time_of_monitoring = datetime.fromtimestamp(observation_time / 1000)
+        prediction = "ANOMALY DETECTED" if anomaly_detected else "NORMAL STATE"
         dict_dp = {
             'date_and_time': str(date_and_time_of_monitoring),
             'prediction': str(prediction),
@@ -167,22 +497,15 @@ class AnomalyDetector():
         }
         dict_dp.update(dict_item)
         
-        write_dict_to_csv(dp_log_fn, dict_dp, is_first_time)
+        if self.log_policy is not None: # the datapoint is written only if it is near an event
+            self.dp_log_sink.write(dict_dp, LogPolicy.is_event(anomaly_detected, severity_level))
+        else:
+            self.dp_log_sink.write(dict_dp)
 
-        match severity_level:
-            case SeverityLevel.LEVEL_1:
-                sev_level_string = "LEVEL 1 - System Status -> CRITICAL"
-            case SeverityLevel.LEVEL_2:
-                sev_level_string = "LEVEL 2 - System Status -> SEVERE"
-            case SeverityLevel.LEVEL_3:
-                sev_level_string = "LEVEL 3 - System Status -> CAUTION"
-            case SeverityLevel.LEVEL_4:
-                sev_level_string = "LEVEL 4 - System Status -> UNDER OBSERVATION"
-            case SeverityLevel.LEVEL_5:
-                sev_level_string = "LEVEL 5 - System Status -> NORMAL"
+        sev_level_string = SEVERITY_LEVEL_STATUS[severity_level]
 
         dict_sl = OrderedDict([('date_and_time', date_and_time_of_monitoring), ('prediction', prediction), ('predicted_proba', predicted_proba), ('severity_level', sev_level_string)],)
-        write_dict_to_csv(sl_log_fn, dict_sl, is_first_time)
+        self.sl_log_sink.write(dict_sl)
 
 
 
@@ -0,0 +1,216 @@
+import os
+import contextlib
+import numpy as np
+from monitoring.SystemMonitor import SystemMonitor
+from monitoring.ProbePlan import ProbePlan
+from monitoring.ProbeBackend import RecordedProbeBackend
+from monitoring.AnomalyDetector import AnomalyDetector
+from monitoring.FlatModel import FlatStackingClassifier
+from monitoring.LoadInjector import MemoryStressInjection
+from monitoring.InjectorWorkerPool import InjectorWorkerPool
+from utils.BenchmarkRunner import BenchmarkRunner
+from utils.CsvSink import CsvSink
+from utils.utilities import write_dict_to_csv, load_model
+
+BENCHMARK_GROUPS = ("monitor", "detector", "csv", "injector", "model") # groups of benchmarks that can be run by the suite
+SYNTHETIC_TRAINING_ROWS = 2000 # observations replayed to train the synthetic model, when no saved model is given
+INJECTOR_TARGET_BYTES = 0 # memory used by the system targeted by the memory injector: it never allocates, since only its start and stop are measured
+
+class BenchmarkSuite:
+    """
+    Class with the micro-benchmarks of the hot paths of the project: the observation of the SystemMonitor, a tick of the AnomalyDetector
+    (sample, predict, severity, log), the writing of the CSV rows, the start and stop of a LoadInjector and the loading of the models.
+    The monitor reads the system through a RecordedProbeBackend, so the results do not depend on the load of the host and nothing sleeps,
+    except the injector benchmark, that starts and stops a real injection process
+    """
+
+    def __init__(self, runner: BenchmarkRunner, backend: RecordedProbeBackend, work_dir: str, model_filename: str = None, scaler_filename: str = None,
+                 slow_iterations: int = 5):
+        """
+        Constructor
+        :param runner: the runner that measures and collects the results
+        :param backend: the recorded backend replayed by every monitor of the suite (each monitor replays it from the first reading)
+        :param work_dir: folder in which the log files and the synthetic models are written
+        :param model_filename: file of the saved model. If None (or if scaler_filename is None), a small StackingClassifier is trained with
+            a fixed seed on the observations of the backend
+        :param scaler_filename: file of the saved scaler
+        :param slow_iterations: number of iterations of the benchmarks whose iterations last milliseconds (injector and model loading)
+        """
+        self.runner = runner
+        self.backend = backend
+        self.work_dir = work_dir
+        self.slow_iterations = slow_iterations
+        if model_filename is not None and scaler_filename is not None:
+            self.model_filename = model_filename
+            self.scaler_filename = scaler_filename
+            self.model_clf = load_model(model_filename, mmap_mode=None)
+            self.scaler = load_model(scaler_filename, mmap_mode=None)
+        else:
+            self.model_clf, self.scaler = self.train_synthetic_model()
+            self.model_filename, self.scaler_filename = self.save_synthetic_model()
+        self.flat_filename = os.path.join(work_dir, "flat_model.npz")
+        try:
+            FlatStackingClassifier.from_stacking(self.model_clf).save(self.flat_filename)
+        except ValueError: # the model has base learners that can not be exported
+            self.flat_filename = None
+
+    def make_monitor(self, probe_plan: ProbePlan = None) -> SystemMonitor:
+        """
+        Method that builds a non-blocking monitor that replays the recorded backend from its first reading
+        :param probe_plan: the metrics to collect (all of them if None)
+        """
+        return SystemMonitor(non_blocking=True, backend=RecordedProbeBackend(self.backend.sequences, self.backend.fields), probe_plan=probe_plan)
+
+    def train_synthetic_model(self) -> tuple:
+        """
+        Method that trains, with a fixed seed, a small model of the same kind of the saved one on observations replayed from the backend:
+        an observation is labelled as anomalous if its global CPU usage is above the median.
+        This method should not be called from the outside of the class.
+        :return: a tuple (StackingClassifier, StandardScaler with the names of the features)
+        """
+        import pandas as pd
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.ensemble import StackingClassifier, RandomForestClassifier
+        from sklearn.linear_model import LogisticRegression
+        from xgboost import XGBClassifier
+        monitor = self.make_monitor()
+        rows = np.array([monitor.monitor_record().values.copy() for _ in range(SYNTHETIC_TRAINING_ROWS)])
+        x = pd.DataFrame(rows, columns=monitor.schema.columns)
+        y = (x["%cpu_global_usage"] > x["%cpu_global_usage"].median()).astype(int)
+        scaler = StandardScaler().fit(x)
+        model_clf = StackingClassifier([("rf", RandomForestClassifier(n_estimators=50, max_depth=8, random_state=0, n_jobs=1)),
+                                        ("xgb", XGBClassifier(n_estimators=50, max_depth=4, random_state=0, n_jobs=1))],
+                                       final_estimator=LogisticRegression())
+        return model_clf.fit(scaler.transform(x), y), scaler
+
+    def save_synthetic_model(self) -> tuple:
+        """
+        Method that saves the synthetic model and scaler in the working folder, so that their loading can be measured.
+        This method should not be called from the outside of the class.
+        :return: a tuple (file of the model, file of the scaler)
+        """
+        import joblib
+        model_filename = os.path.join(self.work_dir, "model.pkl")
+        scaler_filename = os.path.join(self.work_dir, "scaler.pkl")
+        joblib.dump(self.model_clf, model_filename)
+        joblib.dump(self.scaler, scaler_filename)
+        return model_filename, scaler_filename
+
+    def run(self, groups: tuple = BENCHMARK_GROUPS) -> dict:
+        """
+        Method that runs the benchmarks of the given groups
+        :param groups: names of the groups to run (see BENCHMARK_GROUPS)
+        :return: the results of the runner
+        """
+        for group in groups:
+            getattr(self, "bench_" + group)()
+        return self.runner.results
+
+    def bench_monitor(self) -> None:
+        """
+        Benchmarks of an observation of the SystemMonitor collecting all the metrics, as a record and as a dictionary
+        """
+        monitor = self.make_monitor()
+        self.runner.run("monitor.monitor_record", monitor.monitor_record)
+        monitor = self.make_monitor()
+        self.runner.run("monitor.monitor", monitor.monitor)
+
+    def bench_detector(self) -> None:
+        """
+        Benchmarks of a tick of the AnomalyDetector (the body of its detection loop), split into its stages, with the model and,
+        if it can be exported, with the flat model
+        """
+        models = [("detector.tick", self.model_clf)]
+        if self.flat_filename is not None:
+            models.append(("detector.tick_flat", FlatStackingClassifier.load(self.flat_filename)))
+        for name, model_clf in models:
+            monitor = self.make_monitor(ProbePlan.from_features(self.scaler.feature_names_in_))
+            detector = AnomalyDetector(model_clf, self.scaler, monitor)
+            with CsvSink(os.path.join(self.work_dir, "datapoint_with_predictions.log")) as dp_log_sink, \
+                 CsvSink(os.path.join(self.work_dir, "predictions_with_severity_level.log")) as sl_log_sink, \
+                 open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull): # the alerts are printed at each tick
+                detector.dp_log_sink = dp_log_sink
+                detector.sl_log_sink = sl_log_sink
+                self.runner.run_stages(name, self.detector_stages(detector))
+
+    @staticmethod
+    def detector_stages(detector: AnomalyDetector) -> list:
+        """
+        Method that splits the body of the detection loop of the AnomalyDetector into stages.
+        This method should not be called from the outside of the class.
+        :param detector: the detector, with its log sinks already open
+        :return: list of pairs (name of the stage, function)
+        """
+        def sample(_):
+            record = detector.monitor.monitor_record()
+            return record, detector.sample_values(record)
+
+        def predict(state):
+            record, values = state
+            predicted_label, predicted_proba = detector.pipeline.predict(values)
+            return record, values, predicted_label[0] == 1, predicted_proba
+
+        def severity(state):
+            detector.severity_tracker.update(state[2])
+            detector.update_severity_level(detector.severity_tracker.num_anomalies_detec)
+            detector.raise_alert(state[2])
+            return state
+
+        def log(state):
+            record, values, anomaly_detected, predicted_proba = state
+            detector.log_system_info(detector.datapoint_dict(record, values), observation_time=record.time, anomaly_detected=anomaly_detected,
+                                     predicted_proba=predicted_proba, severity_level=detector.severity_level)
+
+        return [("sample", sample), ("predict", predict), ("severity", severity), ("log", log)]
+
+    def bench_csv(self) -> None:
+        """
+        Benchmarks of the writing of an observation as a row of a CSV file, opening the file at each row (write_dict_to_csv) and with a CsvSink
+        """
+        dict_item = self.make_monitor().monitor()
+        filename = os.path.join(self.work_dir, "write_dict_to_csv.csv")
+        write_dict_to_csv(filename, dict_item, True)
+        self.runner.run("csv.write_dict_to_csv", lambda: write_dict_to_csv(filename, dict_item, False))
+        with CsvSink(os.path.join(self.work_dir, "csv_sink.csv")) as sink:
+            self.runner.run("csv.CsvSink.write", lambda: sink.write(dict_item))
+
+    def bench_injector(self) -> None:
+        """
+        Benchmarks of the start and of the stop of a LoadInjector, executed in a new process (the start ends when the process is started)
+        and by an InjectorWorkerPool (the start ends when the load has started). They start real processes
+        """
+        def start(_):
+            injector = MemoryStressInjection("MEM", 0, target_bytes=INJECTOR_TARGET_BYTES)
+            injector.inject()
+            injector.inj_thread.join()
+            return injector
+
+        def stop(injector):
+            injector.force_close()
+
+        def start_pool(_):
+            injector = MemoryStressInjection("MEM", 0, target_bytes=INJECTOR_TARGET_BYTES)
+            pool.start_injection(injector)
+            return injector
+
+        def stop_pool(injector):
+            pool.stop_injection(injector)
+
+        runner = BenchmarkRunner(self.slow_iterations, warmup=1, alloc_iterations=0)
+        self.runner.results["injector.start_stop"] = runner.run_stages("injector.start_stop", [("start", start), ("stop", stop)])
+        pool = InjectorWorkerPool(1)
+        try:
+            self.runner.results["injector.start_stop_pool"] = runner.run_stages("injector.start_stop_pool", [("start", start_pool), ("stop", stop_pool)])
+        finally:
+            pool.close()
+
+    def bench_model(self) -> None:
+        """
+        Benchmarks of the loading of the scaler, of the model and, if it can be exported, of the flat model
+        """
+        runner = BenchmarkRunner(self.slow_iterations, warmup=1, alloc_iterations=self.slow_iterations)
+        loads = [("model.load_scaler", lambda: load_model(self.scaler_filename)), ("model.load_model", lambda: load_model(self.model_filename))]
+        if self.flat_filename is not None:
+            loads.append(("model.load_flat", lambda: FlatStackingClassifier.load(self.flat_filename)))
+        for name, func in loads:
+            self.runner.results[name] = runner.run(name, func)
@@ -0,0 +1,79 @@
+import math
+import random
+
+PROFILE_KINDS = ("constant", "ramp", "square", "random_walk") # shapes of the CPU load that can be requested to the CPU injector
+
+class CPULoadProfile:
+    """
+    Class that describes the CPU utilisation (percentage of each core) requested to the CPU injector as a function of the time since the start
+    of the injection: constant, ramp (from low to high in each period), square wave (high in the first half of each period, low in the second)
+    or random walk between low and high. With a seed, the random walk is the same at each injection
+    """
+
+    def __init__(self, kind: str = "constant", low: float = 50, high: float = 100, period_s: float = 10, step: float = 10, seed: int = None):
+        """
+        Constructor
+        :param kind: one of PROFILE_KINDS
+        :param low: minimum utilisation, in percentage (the starting point of the ramp and the random walk)
+        :param high: maximum utilisation, in percentage (the utilisation of the constant profile)
+        :param period_s: period of the ramp and of the square wave, in seconds
+        :param step: maximum change of the utilisation of the random walk per second, in percentage
+        :param seed: seed of the random walk (None for a different walk at each injection)
+        """
+        if kind not in PROFILE_KINDS:
+            raise ValueError("Unknown CPU load profile '%s', expected one of %s" % (kind, PROFILE_KINDS))
+        self.kind = kind
+        self.low = max(0.0, min(low, high))
+        self.high = min(100.0, max(low, high))
+        self.period_s = period_s
+        self.step = step
+        self.seed = seed
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Method to call at the start of each injection: the random walk restarts from low
+        """
+        self.rng = random.Random(self.seed)
+        self.walk_value = self.low
+        self.walk_time = 0.0
+
+    def target(self, elapsed_s: float) -> float:
+        """
+        Method that returns the utilisation requested at a given time. The random walk must be asked for increasing times
+        :param elapsed_s: seconds since the start of the injection
+        :return: the utilisation of each core, in percentage
+        """
+        if self.kind == "constant":
+            return self.high
+        if self.kind == "ramp":
+            return self.low + (self.high - self.low) * math.fmod(elapsed_s, self.period_s) / self.period_s
+        if self.kind == "square":
+            return self.high if math.fmod(elapsed_s, self.period_s) < self.period_s / 2 else self.low
+        max_change = self.step * max(elapsed_s - self.walk_time, 0)
+        self.walk_value = min(self.high, max(self.low, self.walk_value + self.rng.uniform(-max_change, max_change)))
+        self.walk_time = elapsed_s
+        return self.walk_value
+
+    def get_name(self) -> str:
+        """
+        Method to get a string description of the profile
+        """
+        if self.kind == "constant":
+            return self.kind + str(self.high)
+        return self.kind + str(self.low) + "-" + str(self.high) + ("-p" + str(self.period_s) if self.kind in ("ramp", "square") else "")
+
+    @classmethod
+    def fromJSON(cls, job):
+        """
+        This function allows to create a profile from its json description (e.g. {"kind": "square", "low": 20, "high": 90, "period_s": 5})
+        :param job: the JSON description of the profile (None for the default profile)
+        :return: the profile object
+        """
+        job = job if job is not None else {}
+        return CPULoadProfile(kind=(job['kind'] if 'kind' in job else "constant"),
+                              low=(job['low'] if 'low' in job else 50),
+                              high=(job['high'] if 'high' in job else 100),
+                              period_s=(job['period_s'] if 'period_s' in job else 10),
+                              step=(job['step'] if 'step' in job else 10),
+                              seed=(job['seed'] if 'seed' in job else None))
@@ -0,0 +1,107 @@
+import numpy as np
+
+UNCERTAINTY_BAND = (0.05, 0.95) # probabilities of anomaly of the gate for which the full model is evaluated
+
+class CascadeClassifier:
+    """
+    Class that puts a cheap first-stage model (the gate, e.g. a logistic regression or a shallow tree trained on the same scaled features)
+    in front of the full model (e.g. the StackingClassifier). The gate scores every row and the full model is evaluated only on the rows
+    for which the probability of anomaly given by the gate falls inside the uncertainty band. It exposes classes_ and predict_proba,
+    so it can be used in place of the full model (e.g. by the InferencePipeline)
+    """
+
+    def __init__(self, gate_clf, full_clf, uncertainty_band: tuple = UNCERTAINTY_BAND, audit_every: int = 0):
+        """
+        Constructor
+        :param gate_clf: the first-stage classifier, already trained, with a predict_proba method and the same classes of the full model
+        :param full_clf: the full classifier, already trained
+        :param uncertainty_band: pair (low, high): if the probability of anomaly given by the gate is in (low, high), the full model is evaluated
+        :param audit_every: if greater than 0, the full model is evaluated also on one out of audit_every rows decided by the gate alone,
+            to measure how often the gate agrees with the full model when it short-circuits it
+        """
+        if list(gate_clf.classes_) != list(full_clf.classes_):
+            raise ValueError("The gate and the full model have different classes")
+        self.gate_clf = gate_clf
+        self.full_clf = full_clf
+        self.classes_ = full_clf.classes_
+        self.low, self.high = uncertainty_band
+        self.audit_every = audit_every
+        self.anomaly_idx = list(self.classes_).index(1) # column of the probability of anomaly
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """
+        Method that sets to zero the counters of the cascade
+        """
+        self.num_rows: int = 0 # rows scored by the gate
+        self.num_short_circuits: int = 0 # rows decided by the gate alone
+        self.num_full: int = 0 # rows in the uncertainty band, decided by the full model
+        self.num_full_agreements: int = 0 # rows in the uncertainty band for which the label of the gate is the same of the full model
+        self.num_audits: int = 0 # short-circuited rows evaluated also by the full model
+        self.num_audit_agreements: int = 0 # audited rows for which the label of the gate is the same of the full model
+
+    def predict_proba(self, x: np.ndarray) -> np.ndarray:
+        """
+        Method that computes the probability of each class for the rows of x: the probabilities of the gate for the rows outside the
+        uncertainty band and those of the full model for the other ones
+        :param x: 2-D array of scaled features
+        :return: 2-D array (rows x classes) of probabilities
+        """
+        proba = self.gate_clf.predict_proba(x)
+        p_anomaly = proba[:, self.anomaly_idx]
+        uncertain = (p_anomaly > self.low) & (p_anomaly < self.high)
+        num_uncertain = int(uncertain.sum())
+        if self.audit_every > 0:
+            # the position of the rows counts all the rows short-circuited so far, so that one out of audit_every is audited
+            short_circuit_number = self.num_short_circuits + np.cumsum(~uncertain)
+            audited = ~uncertain & (short_circuit_number % self.audit_every == 0)
+        else:
+            audited = np.zeros(len(x), dtype=bool)
+        evaluate_full = uncertain | audited
+        if evaluate_full.any():
+            full_proba = self.full_clf.predict_proba(x[evaluate_full])
+            gate_labels = proba[evaluate_full].argmax(axis=1)
+            agreements = gate_labels == full_proba.argmax(axis=1)
+            was_uncertain = uncertain[evaluate_full]
+            self.num_full_agreements += int(agreements[was_uncertain].sum())
+            self.num_audits += int((~was_uncertain).sum())
+            self.num_audit_agreements += int(agreements[~was_uncertain].sum())
+            proba[uncertain] = full_proba[was_uncertain]
+        self.num_rows += len(x)
+        self.num_full += num_uncertain
+        self.num_short_circuits += len(x) - num_uncertain
+        return proba
+
+    def get_stats(self) -> dict:
+        """
+        Method that returns the counters of the cascade and the rates derived from them
+        """
+        return {
+            "rows": self.num_rows,
+            "short_circuits": self.num_short_circuits,
+            "full_evaluations": self.num_full,
+            "short_circuit_rate": self.num_short_circuits / self.num_rows if self.num_rows > 0 else 0.0,
+            "full_agreement_rate": self.num_full_agreements / self.num_full if self.num_full > 0 else None,
+            "audits": self.num_audits,
+            "audit_agreement_rate": self.num_audit_agreements / self.num_audits if self.num_audits > 0 else None
+        }
+
+
+def train_gate(x_scaled: np.ndarray, y: np.ndarray, model: str = "logistic", max_depth: int = 3):
+    """
+    This function trains a cheap first-stage model for the CascadeClassifier, on the same scaled features (and labels) used to train the full model
+    :param x_scaled: 2-D array (or DataFrame) of scaled features
+    :param y: labels (0 normal, 1 anomaly)
+    :param model: "logistic" for a logistic regression or "tree" for a shallow decision tree
+    :param max_depth: maximum depth of the decision tree
+    :return: the trained gate
+    """
+    from sklearn.linear_model import LogisticRegression # imported here since the gate is trained offline
+    from sklearn.tree import DecisionTreeClassifier
+    if model == "logistic":
+        gate = LogisticRegression(max_iter=1000)
+    elif model == "tree":
+        gate = DecisionTreeClassifier(max_depth=max_depth)
+    else:
+        raise ValueError("Unknown gate model: %s" % model)
+    return gate.fit(x_scaled, y)
@@ -0,0 +1,415 @@
+import json
+import numpy as np
+from utils.utilities import load_npz_mmap
+
+LIBSVM_MIN_PROB = 1e-7 # bounds applied by libsvm to the probabilities of the Platt scaling
+LIBSVM_MAX_ITER = 100 # maximum number of iterations of multiclass_probability in libsvm
+XGB_SIGMOID_MAX_EXP = np.float32(88.7) # bound applied by xgboost to the argument of expf in the sigmoid
+PREDICT_BLOCK_ROWS = 1024 # maximum number of rows evaluated at once
+
+class FlatTrees:
+    """
+    Class that stores a group of binary decision trees (e.g. the trees of a random forest or of a boosted ensemble) as flat arrays,
+    one entry per node: feature index, threshold, left and right child and value. The leaves point to themselves, so all the trees are
+    walked together, for all the rows, with max_depth vectorized NumPy steps
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray, default_left: np.ndarray,
+                 value: np.ndarray, roots: np.ndarray, max_depth: int, strict: bool):
+        """
+        Constructor
+        :param feature: index of the feature tested by each node
+        :param threshold: threshold of each node
+        :param left: index of the left child of each node (the node itself for the leaves)
+        :param right: index of the right child of each node (the node itself for the leaves)
+        :param default_left: True if the rows with a missing value (NaN) go to the left child
+        :param value: 2-D array (nodes x outputs) with the value of each node (only the values of the leaves are used)
+        :param roots: index of the root of each tree
+        :param max_depth: maximum depth of the trees
+        :param strict: True if a row goes to the left child when its value is < threshold (xgboost), False if when it is <= threshold (sklearn)
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.strict = bool(strict)
+
+    @classmethod
+    def from_sklearn_trees(cls, trees: list, leaf_values: list):
+        """
+        This function flattens a list of sklearn decision trees
+        :param trees: the fitted trees (e.g. the estimators_ of a RandomForestClassifier)
+        :param leaf_values: for each tree, the 2-D array (nodes x outputs) of the values of its nodes
+        :return: the FlatTrees
+        """
+        features, thresholds, lefts, rights, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for tree in trees:
+            t = tree.tree_
+            node_ids = np.arange(t.node_count, dtype=np.intp)
+            is_leaf = t.children_left < 0
+            features.append(np.where(is_leaf, 0, t.feature))
+            thresholds.append(np.where(is_leaf, 0.0, t.threshold))
+            lefts.append(np.where(is_leaf, node_ids, t.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, t.children_right) + offset)
+            roots.append(offset)
+            offset += t.node_count
+            max_depth = max(max_depth, t.max_depth)
+        return cls(np.concatenate(features).astype(np.intp), np.concatenate(thresholds), np.concatenate(lefts), np.concatenate(rights),
+                   np.zeros(offset, dtype=bool), np.concatenate(leaf_values), np.array(roots, dtype=np.intp), max_depth, strict=False)
+
+    @classmethod
+    def from_xgboost(cls, booster):
+        """
+        This function flattens the trees of an xgboost Booster, reading them from its JSON model
+        :param booster: the Booster (e.g. XGBClassifier.get_booster())
+        :return: a tuple (FlatTrees with the leaf values as a single output, learner section of the JSON model)
+        """
+        learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+        features, thresholds, lefts, rights, default_lefts, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for tree in learner["gradient_booster"]["model"]["trees"]:
+            left = np.array(tree["left_children"], dtype=np.intp)
+            right = np.array(tree["right_children"], dtype=np.intp)
+            conditions = np.array(tree["split_conditions"], dtype=np.float32) # threshold of the splits and value of the leaves
+            is_leaf = left < 0
+            node_ids = np.arange(len(left), dtype=np.intp)
+            features.append(np.where(is_leaf, 0, np.array(tree["split_indices"], dtype=np.intp)))
+            thresholds.append(np.where(is_leaf, 0.0, conditions.astype(np.float64)))
+            lefts.append(np.where(is_leaf, node_ids, left) + offset)
+            rights.append(np.where(is_leaf, node_ids, right) + offset)
+            default_lefts.append(np.array(tree["default_left"], dtype=bool))
+            values.append(np.where(is_leaf, conditions, np.float32(0)).reshape(-1, 1))
+            roots.append(offset)
+            offset += len(left)
+            max_depth = max(max_depth, tree_depth(left, right))
+        flat_trees = cls(np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts), np.concatenate(rights), np.concatenate(default_lefts),
+                         np.concatenate(values), np.array(roots, dtype=np.intp), max_depth, strict=True)
+        return flat_trees, learner
+
+    def astype(self, dtype):
+        """
+        :return: a copy of the trees with thresholds and values of the given dtype (e.g. np.float32); the arrays that already have it are shared
+        """
+        return FlatTrees(self.feature, self.threshold.astype(dtype, copy=False), self.left, self.right, self.default_left, self.value.astype(dtype, copy=False),
+                         self.roots, self.max_depth, self.strict)
+
+    def apply(self, x: np.ndarray) -> np.ndarray:
+        """
+        Method that finds the leaf reached by each row in each tree
+        :param x: 2-D array (rows x features), already rounded as the trees expect (see FlatStackingClassifier.predict_proba)
+        :return: 2-D array (rows x trees) with the index of the leaves
+        """
+        nodes = np.repeat(self.roots[np.newaxis, :], len(x), axis=0)
+        rows = np.arange(len(x))[:, np.newaxis]
+        for _ in range(self.max_depth):
+            x_node = x[rows, self.feature[nodes]]
+            threshold = self.threshold[nodes]
+            go_left = x_node < threshold if self.strict else x_node <= threshold
+            go_left |= np.isnan(x_node) & self.default_left[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def leaf_values(self, x: np.ndarray) -> np.ndarray:
+        """
+        :return: 3-D array (rows x trees x outputs) with the value of the leaf reached by each row in each tree
+        """
+        return self.value[self.apply(x)]
+
+    def to_arrays(self, prefix: str) -> dict:
+        """
+        :return: dictionary of the arrays of the trees, with the keys prefixed by prefix (used to save them in an npz file)
+        """
+        arrays = {"feature": self.feature, "threshold": self.threshold, "left": self.left, "right": self.right, "default_left": self.default_left,
+                  "value": self.value, "roots": self.roots, "max_depth": np.array(self.max_depth), "strict": np.array(self.strict)}
+        return {prefix + name: array for name, array in arrays.items()}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str):
+        """
+        This function builds the trees from the arrays saved with to_arrays
+        """
+        names = ("feature", "threshold", "left", "right", "default_left", "value", "roots", "max_depth", "strict")
+        return cls(*(arrays[prefix + name] for name in names))
+
+
+def tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    """
+    This function computes the depth of a tree given its children arrays (-1 for the leaves), with node 0 as root
+    """
+    depth = np.zeros(len(left), dtype=np.intp)
+    for node in range(len(left)): # in the xgboost JSON model the children always follow their parent
+        if left[node] >= 0:
+            depth[left[node]] = depth[node] + 1
+            depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+def sklearn_tree_proba(tree) -> np.ndarray:
+    """
+    This function computes, for every node of a sklearn classification tree, the probabilities returned by predict_proba for a row
+    that reaches that node (the weighted class counts normalized as in DecisionTreeClassifier.predict_proba)
+    """
+    proba = tree.tree_.value[:, 0, :tree.n_classes_].astype(np.float64)
+    normalizer = proba.sum(axis=1)[:, np.newaxis]
+    normalizer[normalizer == 0.0] = 1.0
+    proba /= normalizer
+    return proba
+
+
+class FlatStackingClassifier:
+    """
+    Class that evaluates a binary StackingClassifier (base learners: random forests and decision trees, XGBClassifier, AdaBoostClassifier
+    of decision trees; final estimator: SVC or LogisticRegression) from flat NumPy arrays, without sklearn and xgboost at run time.
+    In float64 mode the operations of sklearn, xgboost and libsvm are replicated as closely as possible, but the results are not the same bit for bit:
+    xgboost sums the margins of its trees in an order of its own (the probabilities can differ by one float32 ulp) and libsvm computes the RBF kernel
+    of the SVC with the BLAS of the host (with fused multiply-adds on recent CPUs) and the exp of the C library, so the final probabilities can differ
+    by about 1e-8. main_export_flat_model.py checks the probabilities against a tolerance and the predicted labels on the dataset.
+    In float32 mode the trees are walked and summed in float32
+    """
+
+    def __init__(self, classes: np.ndarray, base_learners: list, meta: dict, passthrough: bool = False, dtype=np.float64):
+        """
+        Constructor, use from_stacking or load to build an instance
+        :param classes: the classes of the model
+        :param base_learners: list of dictionaries {"kind", "trees", and the parameters of the kind}
+        :param meta: dictionary with the kind and the parameters of the final estimator
+        :param passthrough: True if the features are given in input to the final estimator together with the predictions of the base learners
+        :param dtype: np.float64 (same results of the original model, within rounding) or np.float32
+        """
+        self.classes_ = np.asarray(classes)
+        self.dtype = np.dtype(dtype)
+        if self.dtype == np.float32: # the dictionaries given are not modified
+            base_learners = [dict(learner, trees=learner["trees"].astype(np.float32)) for learner in base_learners]
+        self.base_learners = base_learners
+        self.meta = meta
+        self.passthrough = passthrough
+
+    @classmethod
+    def from_stacking(cls, model_clf, dtype=np.float64):
+        """
+        This function exports a fitted StackingClassifier into flat arrays
+        :param model_clf: the StackingClassifier
+        :param dtype: np.float64 or np.float32
+        :return: the FlatStackingClassifier
+        """
+        if len(model_clf.classes_) != 2:
+            raise ValueError("Only binary stacking classifiers can be exported")
+        base_learners = []
+        for name, estimator, method in zip(model_clf.named_estimators_.keys(), model_clf.estimators_, model_clf.stack_method_):
+            if estimator == "drop":
+                continue
+            if method != "predict_proba":
+                raise ValueError(f"The base learner {name} uses {method}: only predict_proba is supported")
+            base_learners.append(export_base_learner(estimator))
+        return cls(model_clf.classes_, base_learners, export_meta_learner(model_clf.final_estimator_), model_clf.passthrough, dtype)
+
+    def save(self, filename: str) -> None:
+        """
+        Method that saves the flat model into an uncompressed npz file, whose arrays load memory-maps
+        :param filename: the name of the file
+        """
+        arrays = {"classes": self.classes_}
+        header = {"passthrough": self.passthrough, "dtype": self.dtype.name, "base_learners": [], "meta": {}}
+        for i, learner in enumerate(self.base_learners):
+            header["base_learners"].append({key: value for key, value in learner.items() if key != "trees"})
+            arrays.update(learner["trees"].to_arrays(f"base{i}_"))
+        for key, value in self.meta.items():
+            if isinstance(value, np.ndarray):
+                arrays["meta_" + key] = value
+            else:
+                header["meta"][key] = value
+        arrays["header"] = np.array(json.dumps(header))
+        np.savez(filename, **arrays)
+
+    @classmethod
+    def load(cls, filename: str):
+        """
+        This function loads a flat model saved with the save method. The arrays are memory-mapped in read-only mode (see load_npz_mmap),
+        so that more detectors on the same host share the same pages
+        :param filename: the name of the file
+        :return: the FlatStackingClassifier
+        """
+        arrays = load_npz_mmap(filename)
+        header = json.loads(str(arrays["header"]))
+        base_learners = []
+        for i, learner in enumerate(header["base_learners"]):
+            learner = dict(learner)
+            learner["trees"] = FlatTrees.from_arrays(arrays, f"base{i}_")
+            base_learners.append(learner)
+        meta = dict(header["meta"])
+        meta.update({key[len("meta_"):]: arrays[key] for key in arrays if key.startswith("meta_")})
+        return cls(arrays["classes"], base_learners, meta, header["passthrough"], np.dtype(header["dtype"]))
+
+    def base_learners_proba(self, x: np.ndarray) -> list:
+        """
+        Method that computes the probabilities given by each base learner
+        :param x: 2-D array of scaled features
+        :return: list with a 2-D array (rows x classes) of probabilities for each base learner
+        """
+        x_trees = np.asarray(x, dtype=np.float64).astype(np.float32) # sklearn and xgboost trees compare the features as float32 values
+        if self.dtype == np.float64:
+            x_trees = x_trees.astype(np.float64)
+        return [base_learner_proba(learner, x_trees) for learner in self.base_learners]
+
+    def predict_proba(self, x: np.ndarray) -> np.ndarray:
+        """
+        Method that computes the probability of each class for the rows of x
+        :param x: 2-D array of scaled features
+        :return: 2-D array (rows x classes) of probabilities
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if len(x) > PREDICT_BLOCK_ROWS: # the intermediate arrays grow with rows x trees (and rows x support vectors), so large inputs are split
+            return np.vstack([self.predict_proba(x[i:i + PREDICT_BLOCK_ROWS]) for i in range(0, len(x), PREDICT_BLOCK_ROWS)])
+        meta_features = [proba[:, 1:] for proba in self.base_learners_proba(x)]
+        if self.passthrough:
+            meta_features.append(x)
+        return meta_learner_proba(self.meta, np.hstack(meta_features))
+
+
+def export_base_learner(estimator) -> dict:
+    """
+    This function exports a base learner of the stacking into a dictionary with its kind, its FlatTrees and its parameters
+    """
+    kind = type(estimator).__name__
+    if kind in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        trees = FlatTrees.from_sklearn_trees(estimator.estimators_, [sklearn_tree_proba(tree) for tree in estimator.estimators_])
+        return {"kind": "forest", "trees": trees}
+    if kind == "DecisionTreeClassifier":
+        return {"kind": "forest", "trees": FlatTrees.from_sklearn_trees([estimator], [sklearn_tree_proba(estimator)])}
+    if kind == "XGBClassifier":
+        trees, learner = FlatTrees.from_xgboost(estimator.get_booster())
+        if learner["objective"]["name"] != "binary:logistic":
+            raise ValueError("Only XGBClassifier with binary:logistic objective can be exported")
+        base_score = np.float32(learner["learner_model_param"]["base_score"])
+        # ProbToMargin of the logistic objective: the float32 logf of C is correctly rounded, so it is computed in float64 and rounded
+        base_margin = -np.float32(np.log(np.float64(np.float32(1) / base_score - np.float32(1))))
+        return {"kind": "xgboost", "trees": trees, "base_margin": float(base_margin)}
+    if kind == "AdaBoostClassifier":
+        n_classes = estimator.n_classes_
+        leaf_values = []
+        for tree, weight in zip(estimator.estimators_, estimator.estimator_weights_):
+            proba = sklearn_tree_proba(tree)
+            if estimator.algorithm == "SAMME.R": # same operations of _samme_proba in sklearn, applied to every node
+                np.clip(proba, np.finfo(proba.dtype).eps, None, out=proba)
+                log_proba = np.log(proba)
+                leaf_values.append((n_classes - 1) * (log_proba - (1.0 / n_classes) * log_proba.sum(axis=1)[:, np.newaxis]))
+            else: # SAMME: one-hot of the predicted class multiplied by the weight of the tree
+                leaf_values.append((proba.argmax(axis=1)[:, np.newaxis] == np.arange(n_classes)) * weight)
+        trees = FlatTrees.from_sklearn_trees(estimator.estimators_, leaf_values)
+        return {"kind": "adaboost", "trees": trees, "weights_sum": float(estimator.estimator_weights_.sum())}
+    raise ValueError(f"Base learner {kind} not supported")
+
+
+def export_meta_learner(estimator) -> dict:
+    """
+    This function exports the final estimator of the stacking into a dictionary with its kind and its parameters
+    """
+    kind = type(estimator).__name__
+    if kind == "SVC":
+        if not estimator.probability:
+            raise ValueError("The SVC must be fitted with probability=True")
+        if estimator.kernel not in ("rbf", "linear"):
+            raise ValueError(f"SVC kernel {estimator.kernel} not supported")
+        return {"kind": "svc", "kernel": estimator.kernel, "gamma": float(estimator._gamma), "support_vectors": estimator.support_vectors_,
+                "dual_coef": estimator._dual_coef_[0], "intercept": float(estimator._intercept_[0]),
+                "prob_a": float(estimator.probA_[0]), "prob_b": float(estimator.probB_[0])}
+    if kind == "LogisticRegression":
+        return {"kind": "logistic", "coef": estimator.coef_, "intercept": estimator.intercept_}
+    raise ValueError(f"Final estimator {kind} not supported")
+
+
+def base_learner_proba(learner: dict, x: np.ndarray) -> np.ndarray:
+    """
+    This function computes the predict_proba of a base learner, replicating the operations of sklearn and xgboost
+    :param learner: the dictionary of the base learner
+    :param x: features already rounded to float32
+    :return: 2-D array (rows x 2) of probabilities
+    """
+    trees: FlatTrees = learner["trees"]
+    leaf_values = trees.leaf_values(x) # rows x trees x outputs
+    kind = learner["kind"]
+    if kind == "forest": # the probabilities of the trees are summed one tree at a time and then averaged
+        return np.cumsum(leaf_values, axis=1)[:, -1] / leaf_values.shape[1]
+    if kind == "xgboost": # the margin starts from the base margin and the leaves are added in float32, one tree at a time
+        base = np.full((len(x), 1), learner["base_margin"], dtype=np.float32)
+        margin = np.cumsum(np.concatenate((base, leaf_values[:, :, 0].astype(np.float32)), axis=1), axis=1, dtype=np.float32)[:, -1]
+        exp_margin = np.exp(np.minimum(-margin, XGB_SIGMOID_MAX_EXP).astype(np.float64)).astype(np.float32) # expf of C, correctly rounded
+        p = np.float32(1) / (exp_margin + np.float32(1))
+        return np.vstack((np.float32(1) - p, p)).T
+    if kind == "adaboost": # decision function and softmax of AdaBoostClassifier for two classes
+        pred = np.cumsum(leaf_values, axis=1)[:, -1] / learner["weights_sum"]
+        pred[:, 0] *= -1
+        decision = pred.sum(axis=1)
+        decision = np.vstack([-decision, decision]).T / 2
+        decision -= np.max(decision, axis=1).reshape((-1, 1))
+        np.exp(decision, decision)
+        decision /= np.sum(decision, axis=1).reshape((-1, 1))
+        return decision
+    raise ValueError(f"Base learner {kind} not supported")
+
+
+def meta_learner_proba(meta: dict, x: np.ndarray) -> np.ndarray:
+    """
+    This function computes the predict_proba of the final estimator, replicating the operations of sklearn and libsvm
+    :param meta: the dictionary of the final estimator
+    :param x: 2-D array of the predictions of the base learners
+    :return: 2-D array (rows x 2) of probabilities
+    """
+    if meta["kind"] == "svc":
+        support_vectors = meta["support_vectors"]
+        if meta["kernel"] == "rbf":
+            diff = x[:, np.newaxis, :] - support_vectors[np.newaxis, :, :]
+            kernel = np.exp(-meta["gamma"] * np.cumsum(diff * diff, axis=2)[:, :, -1])
+        else:
+            kernel = np.cumsum(x[:, np.newaxis, :] * support_vectors[np.newaxis, :, :], axis=2)[:, :, -1]
+        decision = np.cumsum(meta["dual_coef"] * kernel, axis=1)[:, -1] + meta["intercept"] # libsvm sums one support vector at a time
+        f_apb = decision * meta["prob_a"] + meta["prob_b"]
+        with np.errstate(over="ignore"):
+            p = np.where(f_apb >= 0, np.exp(-f_apb) / (1.0 + np.exp(-f_apb)), 1.0 / (1 + np.exp(f_apb)))
+        r01 = np.minimum(np.maximum(p, LIBSVM_MIN_PROB), 1 - LIBSVM_MIN_PROB)
+        return libsvm_binary_probability(r01, 1 - r01)
+    if meta["kind"] == "logistic":
+        from scipy.special import expit # same logistic function of LogisticRegression.predict_proba
+        p = expit((x @ meta["coef"].T + meta["intercept"]).ravel())
+        return np.vstack([1 - p, p]).T
+    raise ValueError(f"Final estimator {meta['kind']} not supported")
+
+
+def libsvm_binary_probability(r01: np.ndarray, r10: np.ndarray) -> np.ndarray:
+    """
+    This function replicates, for two classes and for all the rows at once, the iterative method (multiclass_probability) used by the libsvm
+    of sklearn to compute the probabilities of the classes from the pairwise probabilities, stopping each row at the same iteration of libsvm
+    :param r01: probability of the first class given by the Platt scaling
+    :param r10: probability of the second class (1 - r01)
+    :return: 2-D array (rows x 2) of probabilities
+    """
+    k = 2
+    eps = 0.005 / k
+    q00 = 0.0 + r10 * r10
+    q01 = -r10 * r01
+    q11 = 0.0 + r01 * r01
+    q = [[q00, q01], [q01, q11]]
+    p = [np.full(len(r01), 1.0 / k), np.full(len(r01), 1.0 / k)]
+    active = np.ones(len(r01), dtype=bool)
+    for _ in range(max(LIBSVM_MAX_ITER, k)):
+        qp = [0.0 + q[t][0] * p[0] + q[t][1] * p[1] for t in range(k)]
+        pqp = 0.0 + p[0] * qp[0] + p[1] * qp[1]
+        max_error = np.maximum(np.maximum(0.0, np.abs(qp[0] - pqp)), np.abs(qp[1] - pqp))
+        active &= ~(max_error < eps)
+        if not active.any():
+            break
+        for t in range(k): # each row is updated only while it has not converged
+            diff = (-qp[t] + pqp) / q[t][t]
+            p[t] = np.where(active, p[t] + diff, p[t])
+            pqp = np.where(active, (pqp + diff * (diff * q[t][t] + 2 * qp[t])) / (1 + diff) / (1 + diff), pqp)
+            for j in range(k):
+                qp[j] = np.where(active, (qp[j] + diff * q[t][j]) / (1 + diff), qp[j])
+                p[j] = np.where(active, p[j] / (1 + diff), p[j])
+    return np.vstack(p).T
@@ -0,0 +1,87 @@
+import time
+import numpy as np
+from typing import TYPE_CHECKING
+from utils.StageTimers import StageTimers
+if TYPE_CHECKING: # sklearn is imported only when the model is unpickled
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.ensemble import StackingClassifier
+
+class InferencePipeline:
+    """
+    Class that compiles, once, the steps needed to get a prediction from the values of an observation:
+    selection of the features in the order expected by the scaler, standardization as a plain NumPy affine transform and a single
+    call to predict_proba of the model, from which the predicted label is derived. No DataFrame is built on the hot path
+    """
+
+    def __init__(self, model_clf: "StackingClassifier", scaler: "StandardScaler" = None, input_columns: list = None, feature_names: list = None):
+        """
+        Constructor
+        :param model_clf: classifier already trained, with a predict_proba method
+        :param scaler: StandardScaler fitted on the training set of the model (None if the values are not standardized)
+        :param input_columns: names of the columns of the rows that will be given in input to the pipeline (e.g. the columns of the monitor's schema)
+        :param feature_names: names of the features given in input to the model, in the expected order.
+            If None, they are taken from the feature_names_in_ attribute of the scaler
+        """
+        self.model_clf = model_clf
+        if feature_names is None:
+            if scaler is None or not hasattr(scaler, "feature_names_in_"):
+                raise ValueError("The names of the features can not be taken from the scaler, they have to be given explicitly")
+            feature_names = list(scaler.feature_names_in_)
+        self.feature_names: list = list(feature_names)
+        input_index = {column: i for i, column in enumerate(input_columns)}
+        missing = [feature for feature in self.feature_names if feature not in input_index]
+        if missing:
+            raise ValueError("Features required by the model but not available in the input rows: %s" % ", ".join(missing))
+        self.feature_idx = np.array([input_index[feature] for feature in self.feature_names], dtype=np.intp)
+
+        # standardization folded into (x - mean) / scale, with the same parameters (and operations) of scaler.transform
+        num_features = len(self.feature_names)
+        self.mean = np.zeros(num_features)
+        self.scale = np.ones(num_features)
+        if scaler is not None:
+            if scaler.with_mean:
+                self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+            if scaler.with_std:
+                self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+        self.classes = np.asarray(model_clf.classes_)
+        self.row_buffer = np.empty((1, num_features), dtype=np.float64) # preallocated input of the model for single-row predictions
+        self.stage_timers: StageTimers = None # if set, the durations of the standardization and of the model call are recorded in it
+
+    def transform(self, values: np.ndarray) -> np.ndarray:
+        """
+        Method that selects and standardizes the features of one or more rows
+        :param values: array of values of a single row (1-D) or of a batch of rows (2-D), following input_columns
+        :return: 2-D array of standardized features, ready to be given in input to the model
+        """
+        if values.ndim == 1:
+            x = self.row_buffer
+            np.take(values, self.feature_idx, out=x[0])
+        else:
+            x = values[:, self.feature_idx]
+        np.subtract(x, self.mean, out=x)
+        np.divide(x, self.scale, out=x)
+        return x
+
+    def predict_proba(self, values: np.ndarray) -> np.ndarray:
+        """
+        Method that computes the probability of each class for one or more rows
+        :param values: array of values of a single row (1-D) or of a batch of rows (2-D), following input_columns
+        :return: 2-D array (rows x classes) of probabilities
+        """
+        if self.stage_timers is None:
+            return self.model_clf.predict_proba(self.transform(values))
+        start = time.perf_counter_ns()
+        x = self.transform(values)
+        start = self.stage_timers.record("transform", start)
+        predicted_proba = self.model_clf.predict_proba(x)
+        self.stage_timers.record("model", start)
+        return predicted_proba
+
+    def predict(self, values: np.ndarray) -> tuple:
+        """
+        Method that computes the predicted label and the probability of each class for one or more rows, evaluating the model only once
+        :param values: array of values of a single row (1-D) or of a batch of rows (2-D), following input_columns
+        :return: a tuple (array of predicted labels, 2-D array rows x classes of probabilities)
+        """
+        predicted_proba = self.predict_proba(values)
+        return self.classes[predicted_proba.argmax(axis=1)], predicted_proba
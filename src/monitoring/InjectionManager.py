@@ -2,13 +2,16 @@ import json
 import random
 import os
 from .LoadInjector import LoadInjector
+from .InjectorWorkerPool import InjectorWorkerPool
+from utils.Clock import Clock, WALL_CLOCK
 
 class InjectionManager:
     """
     Class to manage easily injections in the system given a JSON file containing the description of each injection
     """
 
-    def __init__(self, json_object, inj_duration, obs_per_inj: int, inj_number: int = -1, verbose: bool = False):
+    def __init__(self, json_object, inj_duration, obs_per_inj: int, inj_number: int = -1, verbose: bool = False, dry_run: bool = False, clock: Clock = WALL_CLOCK,
+                 worker_pool_size: int = 0):
         """
         Constructor
         :param json_object: the json object or file containing a json object
@@ -17,6 +20,12 @@ class InjectionManager:
         :param inj_number: number of injection to perform. If the injectors in the json are less, injectors are replicated randomly to reach this value. 
             In case of default value -1, the number of injections to perform are those in the json file
         :param verbose: True is debug information has to be shown 
+        :param dry_run: if True, the injectors are not executed: only the start and end times of the injections are recorded
+            (e.g. when the monitor replays a trace, whose readings already contain the effects of the recorded injections)
+        :param clock: the clock that gives the start and end times of the injections in dry-run mode
+        :param worker_pool_size: if greater than 0, the injections are executed by a pool of this number of long-lived worker processes,
+            started here and reused for the whole campaign (see InjectorWorkerPool), so that an injection starts as soon as it is requested
+            and the process creation is not paid at each injection. Call close at the end of the campaign
         """
         self.json_object = json_object      
         self.inj_duration = inj_duration
@@ -26,6 +35,9 @@ class InjectionManager:
         self.injectors = []
         self.current_inj: LoadInjector = None
         self.num_inj_already_performed = 0 # this is the number of injection already performed
+        self.dry_run = dry_run
+        self.clock = clock
+        self.worker_pool = InjectorWorkerPool(worker_pool_size) if worker_pool_size > 0 and not dry_run else None
 
     def read_injectors(self, shuffle: bool = False) -> None:
         """
@@ -89,7 +101,12 @@ class InjectionManager:
             self.current_inj = self.injectors.pop(0)
             self.if_verbose("Injecting with injector '%s'" % self.current_inj.get_name())
             # Starts the injection
-            self.current_inj.inject()
+            if self.dry_run:
+                self.current_inj.start_inj_time = self.clock.time_ms()
+            elif self.worker_pool is not None:
+                self.worker_pool.start_injection(self.current_inj)
+            else:
+                self.current_inj.inject()
             return self.current_inj.get_name()
         else:
             print("All injectors have been injected. None available for injection")
@@ -101,11 +118,27 @@ class InjectionManager:
         """
         if self.current_inj is not None:
             self.if_verbose("Stop of the injection of injector '%s'" % self.current_inj.get_name())
-            self.current_inj.force_close()
+            if self.dry_run:
+                self.current_inj.end_inj_time = self.clock.time_ms()
+                self.current_inj.injected_interval.append({'start': self.current_inj.start_inj_time, 'end': self.current_inj.end_inj_time})
+            elif self.worker_pool is not None:
+                self.worker_pool.stop_injection(self.current_inj)
+            else:
+                self.current_inj.force_close()
             self.current_inj = None
         else:
             self.if_verbose("There are no ongoing injections to stop")
 
+    def close(self) -> None:
+        """
+        Method to call at the end of the campaign: it stops the current injection, if any, and terminates the worker pool
+        """
+        if self.current_inj is not None:
+            self.stop_injection()
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+            self.worker_pool = None
+
     def injectors_list_is_empty(self) -> bool:
         """
         This method check if the injectors are finished
@@ -0,0 +1,118 @@
+import os
+import atexit
+import signal
+import threading
+import multiprocessing
+from monitoring.LoadInjector import LoadInjector
+from utils.utilities import current_ms
+
+START_TIMEOUT = 30 # seconds waited for a worker to report that the load has started
+
+class InjectorWorkerPool:
+    """
+    Class that keeps a pool of long-lived worker processes, started once and reused for all the injections of a campaign.
+    Each worker is driven over a pipe: it receives the injector to execute, runs its load body and replies as soon as the load has actually
+    started, so that an injection starts within milliseconds and its start time is the time at which the system is loaded
+    """
+
+    def __init__(self, num_workers: int = 1):
+        """
+        Constructor, the worker processes are started here (before the caller starts other threads, since they are forked).
+        They are not daemonic, since the CPU injectors start processes themselves: close is registered to be called at exit
+        :param num_workers: number of worker processes, i.e. maximum number of injections running at the same time
+        """
+        self.workers = [] # pairs (process, connection)
+        for _ in range(num_workers):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=injector_worker, args=(child_conn,))
+            process.start()
+            child_conn.close()
+            self.workers.append((process, parent_conn))
+        self.idle_workers = list(range(num_workers))
+        self.busy_workers: dict = {} # id of the injector -> index of the worker executing it
+        atexit.register(self.close)
+
+    def start_injection(self, injector: LoadInjector) -> None:
+        """
+        Method that executes an injector in an idle worker and waits until the load has started
+        :param injector: the injector to execute, not started yet
+        """
+        if not self.idle_workers:
+            raise RuntimeError("All the workers of the pool are busy")
+        worker = self.idle_workers.pop(0)
+        conn = self.workers[worker][1]
+        conn.send(("start", injector))
+        if not conn.poll(START_TIMEOUT):
+            raise RuntimeError("The worker did not start the injection %s" % injector.get_name())
+        _, injector.start_inj_time = conn.recv()
+        injector.completed_flag = False
+        self.busy_workers[id(injector)] = worker
+
+    def stop_injection(self, injector: LoadInjector) -> None:
+        """
+        Method that stops an injector started by start_injection, waiting for the end of its load
+        :param injector: the injector to stop
+        """
+        worker = self.busy_workers.pop(id(injector))
+        conn = self.workers[worker][1]
+        conn.send(("stop", None))
+        _, injector.end_inj_time = conn.recv()
+        injector.completed_flag = True
+        injector.injected_interval.append({'start': injector.start_inj_time, 'end': injector.end_inj_time})
+        self.idle_workers.append(worker)
+
+    def close(self) -> None:
+        """
+        Method that terminates the worker processes, stopping the injections still running. It can be called more than once
+        """
+        for worker in list(self.busy_workers.values()):
+            self.workers[worker][1].send(("stop", None))
+            self.workers[worker][1].recv()
+        self.busy_workers = {}
+        for process, conn in self.workers:
+            conn.send(("exit", None))
+            process.join()
+            conn.close()
+        self.workers = []
+        self.idle_workers = []
+        atexit.unregister(self.close)
+
+
+def injector_worker(conn) -> None:
+    """
+    Main function of a worker process of the pool. The load body of an injector runs in the main thread of the worker (e.g. the
+    load of a single core sets the CPU affinity of the main thread), while a second thread replies to the commands received on the pipe
+    :param conn: the connection with the pool
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # on Ctrl+C the workers are stopped by the pool, after the current injection
+    affinity = os.sched_getaffinity(0)
+    while True:
+        command, injector = conn.recv()
+        if command != "start":
+            break
+        injector.stop_inj = threading.Event()
+        injector.load_started = threading.Event()
+        listener = threading.Thread(target=injector_listener, args=(conn, injector))
+        listener.start()
+        try:
+            injector.load_body()
+        except Exception as e:
+            print("The injection %s failed: %s" % (injector.get_name(), e))
+        finally:
+            injector.load_started.set() # if the load body failed before starting the load, the listener is released anyway
+            listener.join()
+            os.sched_setaffinity(0, affinity) # the load of a single core pins the worker to that core
+        conn.send(("stopped", current_ms()))
+
+
+def injector_listener(conn, injector: LoadInjector) -> None:
+    """
+    Function executed by a worker while an injection is running: it replies when the load has started and sets the stop event of the
+    injector when the stop command is received
+    :param conn: the connection with the pool
+    :param injector: the injector running in the worker
+    """
+    injector.load_started.wait()
+    conn.send(("started", current_ms()))
+    conn.recv() # the stop command
+    injector.stop_inj.set()
@@ -1,10 +1,22 @@
-import threading
+import os
 import time
-import random
+import threading
 import multiprocessing
 from utils.utilities import current_ms, get_int_number_from_string
-from cpu_load_generator import load_all_cores, load_single_core
-from monitoring.SystemMonitor import SystemMonitor     
+from utils.CsvSink import CsvSink
+from monitoring.ProbeBackend import ProbeBackend, PsutilProbeBackend
+from monitoring.MemoryBallast import MemoryBallast
+from monitoring.CPULoadProfile import CPULoadProfile
+
+CPU_CONTROL_PERIOD = 0.25 # seconds between two corrections of the duty cycles of the CPU injector (the CPU times are counted in ticks of 10 ms)
+CPU_CONTROL_GAIN = 0.5 # fraction of the difference between requested and measured utilisation corrected at each step by the CPU injector
+CPU_BURN_SLOT = 0.01 # seconds of each busy/sleep slot of the burner processes of the CPU injector
+
+DEFAULT_MEMORY_TARGET_PERCENT = 85 # memory used by the system held by the memory injector, as percentage of the total, if no target is given
+DEFAULT_MEMORY_FILL_RATE_MB_S = 512 # maximum speed at which the memory injector allocates memory, in MiB per second
+MEMORY_CONTROL_PERIOD = 0.05 # seconds between two corrections of the memory held by the memory injector
+MEMORY_DEADBAND_PERCENT = 0.5 # distance from the target (percentage of the total memory) ignored by the memory injector
+MEMORY_SAFETY_PERCENT = 95 # the memory injector never makes the memory used by the system exceed this percentage of the total
 
 # ABSTRACT CLASS FOR INJECTIONS
 class LoadInjector:
@@ -25,6 +37,7 @@ class LoadInjector:
         self.start_inj_time = 0
         self.end_inj_time = 0
         self.injected_interval = []
+        self.load_started = None # event set by the load body when the load actually starts (used by the InjectorWorkerPool)
         self.init()
 
     def is_valid(self) -> bool:
@@ -43,6 +56,20 @@ class LoadInjector:
         """
         pass
 
+    def load_body(self):
+        """
+        Abstract method to be overridden: the code that loads the system, executed in the main thread of the injection process until
+        the event self.stop_inj is set. It should call notify_load_started when the load actually starts
+        """
+        pass
+
+    def notify_load_started(self) -> None:
+        """
+        Method called by the load body when the load actually starts
+        """
+        if self.load_started is not None:
+            self.load_started.set()
+
     def inject(self):
         """
         Caller of the body of the injection mechanism, which will be executed in a separate thread
@@ -94,15 +121,27 @@ class LoadInjector:
 
 class CPUStressInjection(LoadInjector):
     """
-    CPUStress Error, execute an external process to stress the entire CPU or a specific core
-    without storing results anywhere
+    CPUStress Error, loads a set of cores (all of them, or the core whose number is in the tag) following a CPULoadProfile.
+    A process pinned to each core alternates busy loops and sleeps with a given duty cycle, while a feedback loop reads the CPU times
+    of the cores and corrects the duty cycles so that the utilisation of each core (including the load of the other processes) follows the profile
     """
 
-    def __init__(self, tag: str = '', duration_ms: float = 0):
+    def __init__(self, tag: str = '', duration_ms: float = 0, cores: list = None, profile: CPULoadProfile = None, control_log: str = None,
+                 backend: ProbeBackend = None):
         """
         Constructor
+        :param cores: numbers of the cores to load. If None, the core whose number is in the tag or, if the tag is CPU_default, all the cores
+        :param profile: the utilisation requested to each core (default: constant at 100%)
+        :param control_log: if given, CSV file to which the target and achieved utilisation of each core are appended at each correction
+        :param backend: the backend used to read the CPU times of the cores. If None, a PsutilProbeBackend is used
         """
         LoadInjector.__init__(self, tag, duration_ms)
+        if cores is None:
+            cores = list(range(os.cpu_count())) if self.tag == "CPU_default" else [get_int_number_from_string(self.tag)]
+        self.cores = list(cores)
+        self.profile = profile if profile is not None else CPULoadProfile()
+        self.control_log = control_log
+        self.backend = backend
 
     def inject_body(self):
         """
@@ -111,11 +150,7 @@ class CPUStressInjection(LoadInjector):
         self.completed_flag = False
         self.start_inj_time = current_ms()
         self.stop_inj = multiprocessing.Event()
-        if self.tag == "CPU_default":
-            self.load_process = multiprocessing.Process(target=self.stress_cpu, args=())
-        else:
-            core_number = get_int_number_from_string(self.tag)
-            self.load_process = multiprocessing.Process(target=self.stress_logical_core, args=(core_number,))
+        self.load_process = multiprocessing.Process(target=self.load_body, args=())
         self.load_process.start()
 
     def force_close(self):
@@ -132,84 +167,115 @@ class CPUStressInjection(LoadInjector):
         """
         Method to get a string description of the injection
         """
-        return "[" + self.tag + "]CPUStressInjection" + "(d" + str(self.duration_ms) + ")"
+        return "[" + self.tag + "]CPUStressInjection" + "(d" + str(self.duration_ms) + "-c" + ",".join(str(core) for core in self.cores) \
+               + "-" + self.profile.get_name() + ")"
     
-    def stress_cpu(self):
+    def load_body(self):
         """
-        Method to be used to stress the whole CPU.
+        Method that stresses the cores of the injection
         """
-        while not self.stop_inj.is_set():
-            if random.choice([True, False]): # randomly, if True CPU Overloaded to 100%
-                load_all_cores(0.8, 1)
-            else:
-                load_all_cores(0.8, random.uniform(0.9, 1))
-    
-    def stress_logical_core(self, core_number: int):
-        """
-        Method to stress a specific core of the cpu
-        :param core_number: the id number of the core to be stressed
-        """
-        cpu_monitor = SystemMonitor(monitor_cpu=True, monitor_vm=False, interval_cpu_cores_percent=0.2, interval_cpu_times_percent=0)
-        shared_cpu_data = {}
-        lock = threading.Lock()
-        self.dict_fill = threading.Event()
-        self.stop_monitoring = threading.Event()
-        monitor_thread = threading.Thread(target=self.monitor_cpu_in_loop, args=(cpu_monitor, shared_cpu_data, lock))
-        monitor_thread.start()
-        self.dict_fill.wait() # the first time it waits for the dictionary to be filled
-        while not self.stop_inj.is_set():
-            with lock:
-                logical_core_usage = {
-                    str(k): v for k, v in shared_cpu_data.items() if str(k).startswith("%logical_core_") and str(k).endswith("_usage") and get_int_number_from_string(str(k)) != core_number
-                }
-            target_load = min(100, max(logical_core_usage.values()) + random.uniform(50, 80)) # we get the maximum core load, we sum to it a number between 50 and 80 and if this value is over 100, we set the target load of the core at 100
-            if random.choice([True, False]): # randomly, if True CPU core Overloaded to 100%
-                load_single_core(core_number, 0.8, 1)
-            else:
-                load_single_core(core_number, 0.4, target_load/100)
-        self.stop_monitoring.set()
-        monitor_thread.join()
-
-    def monitor_cpu_in_loop(self, cpu_monitor: SystemMonitor, data_dict: dict, lock) -> None:
-        """
-        Method to update a shared dict with information about the CPU
-        :param cpu_monitor: object of type SystemMonitor to monitor CPU data
-        :param data_dict: shared dict updated by this method
-        :param lock: lock on the shared dict data_dict 
-        """
-        while not self.stop_monitoring.is_set():
-            cpu_data = cpu_monitor.monitor()
-            with lock:
-                data_dict.clear()
-                data_dict.update(cpu_data)
-                self.dict_fill.set()
+        self.stress_cores()
+
+    def stress_cores(self):
+        """
+        Method that starts a burner process on each core and, every CPU_CONTROL_PERIOD seconds, moves the duty cycle of each burner towards
+        the utilisation requested by the profile, proportionally to the difference between the requested and the measured utilisation of its core
+        """
+        backend = self.backend if self.backend is not None else PsutilProbeBackend()
+        fields = backend.cpu_times_fields()
+        idle_idx = [fields.index(field) for field in ("idle", "iowait") if field in fields]
+        self.profile.reset()
+        target = self.profile.target(0)
+        duties = multiprocessing.Array("d", [target / 100] * len(self.cores), lock=False)
+        stop_burners = multiprocessing.Event()
+        burners = [multiprocessing.Process(target=burn_core, args=(core, duties, i, stop_burners)) for i, core in enumerate(self.cores)]
+        for burner in burners:
+            burner.start()
+        log_sink = CsvSink(self.control_log, append=True) if self.control_log is not None else None
+        try:
+            self.notify_load_started()
+            start_time = time.monotonic()
+            last_times = [backend.cpu_times()[core] for core in self.cores]
+            while not self.stop_inj.wait(CPU_CONTROL_PERIOD):
+                times = [backend.cpu_times()[core] for core in self.cores]
+                for i, (core, prev, curr) in enumerate(zip(self.cores, last_times, times)):
+                    total = sum(curr) - sum(prev)
+                    achieved = 100 * (1 - sum(curr[idx] - prev[idx] for idx in idle_idx) / total) if total > 0 else target
+                    duties[i] = min(1.0, max(0.0, duties[i] + CPU_CONTROL_GAIN * (target - achieved) / 100))
+                    if log_sink is not None:
+                        log_sink.write({"time": current_ms(), "injector": self.tag, "core": core, "target": round(target, 1),
+                                        "achieved": round(achieved, 1), "duty": round(duties[i], 3)})
+                last_times = times
+                new_target = self.profile.target(time.monotonic() - start_time)
+                for i in range(len(self.cores)): # feed-forward of the change of the target (e.g. the edges of the square wave)
+                    duties[i] = min(1.0, max(0.0, duties[i] + (new_target - target) / 100))
+                target = new_target
+        finally:
+            stop_burners.set()
+            for burner in burners:
+                burner.join()
+            if log_sink is not None:
+                log_sink.close()
 
     @classmethod
     def fromJSON(cls, job):
         return CPUStressInjection(tag=(job['tag'] if 'tag' in job else ''),
-                                  duration_ms=(job['duration_ms'] if 'duration_ms' in job else 0))
+                                  duration_ms=(job['duration_ms'] if 'duration_ms' in job else 0),
+                                  cores=(job['cores'] if 'cores' in job else [job['core_number']] if 'core_number' in job else None),
+                                  profile=CPULoadProfile.fromJSON(job['profile'] if 'profile' in job else None),
+                                  control_log=(job['control_log'] if 'control_log' in job else None))
+
+
+def burn_core(core: int, duties, index: int, stop_event) -> None:
+    """
+    Function executed by the burner process of a core: pinned to the core, in each slot of CPU_BURN_SLOT seconds it runs a busy loop for
+    the fraction of the slot given by its duty cycle and sleeps for the rest
+    :param core: number of the core
+    :param duties: shared array with the duty cycles of the burners (values between 0 and 1)
+    :param index: position of the duty cycle of this burner in the array
+    :param stop_event: event that stops the burner
+    """
+    os.sched_setaffinity(0, {core})
+    while not stop_event.is_set():
+        slot_start = time.perf_counter()
+        busy_end = slot_start + duties[index] * CPU_BURN_SLOT
+        while time.perf_counter() < busy_end:
+            pass
+        rest = slot_start + CPU_BURN_SLOT - time.perf_counter()
+        if rest > 0:
+            time.sleep(rest)
 
 
 class MemoryStressInjection(LoadInjector):
     """
-    Loops and adds data to an array simulating memory usage
+    Holds the memory used by the system at a target level (bytes, or percentage of virtual_mem_total), growing a MemoryBallast
+    at a given fill rate and shrinking it as soon as the memory used goes above the target (e.g. because other processes allocate memory)
     """
 
-    def __init__(self, tag: str = '', duration_ms: float = 0, items_for_loop: int = 1234567):
+    def __init__(self, tag: str = '', duration_ms: float = 0, target_percent: float = None, target_bytes: int = None,
+                 fill_rate_mb_s: float = DEFAULT_MEMORY_FILL_RATE_MB_S, backend: ProbeBackend = None):
         """
         Constructor
+        :param target_percent: memory used by the system to reach, as percentage of the total (as virtual_mem_percent).
+            If neither this nor target_bytes are given, DEFAULT_MEMORY_TARGET_PERCENT is used
+        :param target_bytes: memory used by the system to reach, in bytes (used instead of target_percent if given)
+        :param fill_rate_mb_s: maximum speed at which the memory is allocated, in MiB per second
+        :param backend: the backend used to read the memory used by the system. If None, a PsutilProbeBackend is used
         """
         LoadInjector.__init__(self, tag, duration_ms)
-        self.items_for_loop = items_for_loop
+        self.target_percent = target_percent if target_percent is not None or target_bytes is not None else DEFAULT_MEMORY_TARGET_PERCENT
+        self.target_bytes = target_bytes
+        self.fill_rate_mb_s = fill_rate_mb_s
+        self.backend = backend
 
     def inject_body(self):
         """
         Method to call to start the VM stress injection
         """
         self.completed_flag = False
-        self.start_inj_timetime = current_ms()
+        self.start_inj_time = current_ms()
         self.stop_inj = multiprocessing.Event()
-        self.load_process = multiprocessing.Process(target=self.stress_virtual_memory, args=())
+        self.load_process = multiprocessing.Process(target=self.load_body, args=())
         self.load_process.start()
 
     def force_close(self):
@@ -226,54 +292,49 @@ class MemoryStressInjection(LoadInjector):
         """
         Method to get a string description of the injection
         """
-        return "[" + self.tag + "]MemoryStressInjection(d" + str(self.duration_ms) + "-i" \
-               + str(self.items_for_loop) + ")"
+        target = ("b" + str(self.target_bytes)) if self.target_bytes is not None else ("p" + str(self.target_percent))
+        return "[" + self.tag + "]MemoryStressInjection(d" + str(self.duration_ms) + "-" + target + "-r" + str(self.fill_rate_mb_s) + ")"
     
+    def load_body(self):
+        """
+        Method that stresses the VM
+        """
+        self.stress_virtual_memory()
+
     def stress_virtual_memory(self):
         """
-        Method to be used to stress the VM.
-        """
-        my_list = []
-        vm_monitor = SystemMonitor(monitor_cpu=False, monitor_vm=True, interval_cpu_cores_percent=0.4, interval_cpu_times_percent=0)
-        shared_vm_data: dict = {}
-        lock = threading.Lock()
-        self.dict_fill = threading.Event()
-        self.stop_monitoring = threading.Event()
-        monitor_thread = threading.Thread(target=self.monitor_vm_in_loop, args=(vm_monitor, shared_vm_data, lock))
-        monitor_thread.start()
-        self.dict_fill.wait()
-        while not self.stop_inj.is_set():
-            with lock:
-                perc_vm_usage = shared_vm_data["virtual_mem_percent"]
-
-            if perc_vm_usage > 90: # we clean a part of the VM to avoid a system crash
-                num_to_clear = int(len(my_list) * random.uniform(0.2, 0.8))
-                my_list = my_list[num_to_clear:]
-
-            my_list.append([999 for i in range(0, self.items_for_loop)])
-            time.sleep(0.001)
-        self.stop_monitoring.set()
-        monitor_thread.join()
-    
-    def monitor_vm_in_loop(self, vm_monitor: SystemMonitor, vm_shared_data: dict, lock) -> None:
-        """
-        Method to update a shared dict with information about the percentage of VM used
-        :param vm_monitor: object of type SystemMonitor to monitor vm data
-        :param vm_shared_data: shared dict updated by this method
-        :param lock: lock on the shared dict vm_shared_data 
-        """
-        while not self.stop_monitoring.is_set():
-            vm_data = vm_monitor.monitor()
-            vm_perc_usage = {"virtual_mem_percent": vm_data.get("virtual_mem_percent")}
-            with lock:
-                vm_shared_data.clear()
-                vm_shared_data.update(vm_perc_usage)
-                self.dict_fill.set()
-            time.sleep(0.5)
+        Method to be used to stress the VM: a closed loop that, every MEMORY_CONTROL_PERIOD seconds, reads the memory used by the system
+        and resizes the ballast by the distance from the target (the growth is limited by the fill rate, the shrink is immediate).
+        Differences within MEMORY_DEADBAND_PERCENT of the total are ignored, so the ballast does not follow the noise of the other processes
+        """
+        backend = self.backend if self.backend is not None else PsutilProbeBackend()
+        ballast = MemoryBallast()
+        max_step = self.fill_rate_mb_s * 1024 * 1024 * MEMORY_CONTROL_PERIOD
+        started = False
+        try:
+            while True:
+                vm_data = backend.virtual_memory()
+                total = vm_data["total"]
+                used = total - vm_data["available"] # memory used, as in the computation of virtual_mem_percent
+                target = self.target_bytes if self.target_bytes is not None else total * self.target_percent / 100
+                error = min(target, total * MEMORY_SAFETY_PERCENT / 100) - used
+                if error > total * MEMORY_DEADBAND_PERCENT / 100:
+                    ballast.resize(ballast.size + min(error, max_step))
+                elif error < -total * MEMORY_DEADBAND_PERCENT / 100:
+                    ballast.resize(ballast.size + error)
+                if not started: # the load starts with the first allocation
+                    self.notify_load_started()
+                    started = True
+                if self.stop_inj.wait(MEMORY_CONTROL_PERIOD):
+                    break
+        finally:
+            ballast.release()
 
     @classmethod
     def fromJSON(cls, job):
         return MemoryStressInjection(tag=(job['tag'] if 'tag' in job else ''),
                                      duration_ms=(job['duration_ms'] if 'duration_ms' in job else 0),
-                                     items_for_loop=(job['items_for_loop']
-                                                     if 'items_for_loop' in job else 1234567))
+                                     target_percent=(job['target_percent'] if 'target_percent' in job else None),
+                                     target_bytes=(job['target_bytes'] if 'target_bytes' in job else None),
+                                     fill_rate_mb_s=(job['fill_rate_mb_s']
+                                                     if 'fill_rate_mb_s' in job else DEFAULT_MEMORY_FILL_RATE_MB_S))
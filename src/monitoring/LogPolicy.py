@@ -0,0 +1,52 @@
+from utils.SeverityLevel import SeverityLevel
+from utils.RotatingCsvSink import RotatingCsvSink, DEFAULT_MAX_BYTES
+from utils.EventWindowSink import EventWindowSink
+
+DEFAULT_MAX_AGE_S = 24 * 3600 # the log files are rotated at least once a day
+DEFAULT_MAX_SEGMENTS = 30 # closed segments kept for each log file
+
+class LogPolicy:
+    """
+    Class that describes how the anomaly detector writes its log files: the datapoint log keeps the full datapoints only around the events
+    (anomalies detected or severity level above LEVEL_5, see EventWindowSink) and a decimated sample of the others, while the severity log
+    keeps every prediction. Both files are rotated by size and age, and their closed segments are compressed in background (see RotatingCsvSink)
+    """
+
+    def __init__(self, pre_event_rows: int = 60, post_event_rows: int = 60, decimation: int = 60, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age_s: float = DEFAULT_MAX_AGE_S, max_segments: int = DEFAULT_MAX_SEGMENTS, compress: bool = True):
+        """
+        Constructor
+        :param pre_event_rows: number of datapoints before an event written with it
+        :param post_event_rows: number of datapoints after the end of an event written with it
+        :param decimation: one datapoint out of decimation is written between the events (0 means none)
+        :param max_bytes: size in bytes after which a log file is rotated (None for no limit)
+        :param max_age_s: seconds after which a log file is rotated (None for no limit)
+        :param max_segments: closed segments kept for each log file (None to keep all of them)
+        :param compress: if True, the closed segments are compressed with gzip
+        """
+        self.pre_event_rows = pre_event_rows
+        self.post_event_rows = post_event_rows
+        self.decimation = decimation
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.max_segments = max_segments
+        self.compress = compress
+
+    def open_sinks(self, dp_log_filename: str, sl_log_filename: str) -> tuple:
+        """
+        Method that opens the sinks of the two log files of the detector
+        :param dp_log_filename: path of the datapoint log
+        :param sl_log_filename: path of the severity log
+        :return: a tuple (EventWindowSink of the datapoint log, RotatingCsvSink of the severity log)
+        """
+        dp_log_sink = EventWindowSink(RotatingCsvSink(dp_log_filename, self.max_bytes, self.max_age_s, self.max_segments, self.compress),
+                                      self.pre_event_rows, self.post_event_rows, self.decimation)
+        sl_log_sink = RotatingCsvSink(sl_log_filename, self.max_bytes, self.max_age_s, self.max_segments, self.compress)
+        return dp_log_sink, sl_log_sink
+
+    @staticmethod
+    def is_event(anomaly_detected: bool, severity_level: SeverityLevel) -> bool:
+        """
+        :return: True if a prediction is an interesting event, whose datapoint (with those around it) is written in full
+        """
+        return anomaly_detected or severity_level != SeverityLevel.LEVEL_5
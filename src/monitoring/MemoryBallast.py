@@ -0,0 +1,75 @@
+import mmap
+
+PAGE_SIZE = mmap.PAGESIZE # bytes of a page of memory
+BALLAST_CHUNK_BYTES = 64 * 1024 * 1024 # size of each anonymous mapping of the ballast
+
+class MemoryBallast:
+    """
+    Class that holds a given amount of resident memory in anonymous mmap regions. The regions are reserved in chunks of fixed size and
+    their pages are touched one by one (a single byte written per page), so growing costs a page fault per page instead of filling
+    Python objects, and shrinking gives the pages back to the system immediately (munmap or madvise(MADV_DONTNEED)), without copies
+    """
+
+    def __init__(self, chunk_bytes: int = BALLAST_CHUNK_BYTES):
+        """
+        Constructor, no memory is held until resize is called
+        :param chunk_bytes: size of each mapping, rounded to a multiple of the page size
+        """
+        self.chunk_bytes = max(PAGE_SIZE, chunk_bytes // PAGE_SIZE * PAGE_SIZE)
+        self.chunks = [] # mappings in order of allocation, all of them fully touched except the last one
+        self.last_touched = 0 # bytes touched in the last mapping
+
+    @property
+    def size(self) -> int:
+        """
+        :return: bytes currently held (touched) by the ballast
+        """
+        if not self.chunks:
+            return 0
+        return (len(self.chunks) - 1) * self.chunk_bytes + self.last_touched
+
+    def resize(self, target_bytes: int) -> int:
+        """
+        Method that grows or shrinks the memory held to the given amount, rounded down to a multiple of the page size
+        :param target_bytes: bytes to hold (negative values mean 0)
+        :return: bytes held after the resize
+        """
+        target_bytes = max(0, int(target_bytes)) // PAGE_SIZE * PAGE_SIZE
+        while self.size < target_bytes:
+            if not self.chunks or self.last_touched == self.chunk_bytes:
+                self.chunks.append(mmap.mmap(-1, self.chunk_bytes, flags=mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS))
+                self.last_touched = 0
+            end = min(self.chunk_bytes, self.last_touched + target_bytes - self.size)
+            self.touch(self.chunks[-1], self.last_touched, end)
+            self.last_touched = end
+        while self.size > target_bytes:
+            start = max(0, self.last_touched - (self.size - target_bytes))
+            if start == 0:
+                self.chunks.pop().close()
+                self.last_touched = self.chunk_bytes if self.chunks else 0
+            else:
+                self.chunks[-1].madvise(mmap.MADV_DONTNEED, start, self.last_touched - start)
+                self.last_touched = start
+        return self.size
+
+    def release(self) -> None:
+        """
+        Method that gives all the memory held back to the system
+        """
+        for chunk in self.chunks:
+            chunk.close()
+        self.chunks = []
+        self.last_touched = 0
+
+    @staticmethod
+    def touch(chunk: mmap.mmap, start: int, end: int) -> None:
+        """
+        Method that makes the pages of a range of a mapping resident, writing a byte in each of them with a single slice assignment.
+        This method should not be called from the outside of the class.
+        :param chunk: the mapping
+        :param start: first byte of the range (multiple of the page size)
+        :param end: end of the range (multiple of the page size)
+        """
+        num_pages = (end - start) // PAGE_SIZE
+        if num_pages > 0:
+            chunk[start:end:PAGE_SIZE] = b"\x01" * num_pages
@@ -0,0 +1,168 @@
+import os
+import socket
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from monitoring.AnomalyDetector import AnomalyDetector
+from utils.StreamProtocol import parse_address
+
+METRICS_PREFIX = "dcml_detector" # prefix of the names of the metrics
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8" # content type of the Prometheus text format
+
+class MetricsServer:
+    """
+    Class of a small HTTP server that exposes the health and the latency of an AnomalyDetector in the Prometheus text format (GET /metrics),
+    on TCP or on a Unix socket. It is served by daemon threads that only read the counters of the detector, without taking its lock,
+    so a scrape never delays the detection
+    """
+
+    def __init__(self, detector: AnomalyDetector, address: str = "127.0.0.1:9108"):
+        """
+        Constructor
+        :param detector: the detector whose metrics are exposed
+        :param address: address on which the server listens ("host:port" for TCP or "unix:/path/to/socket")
+        """
+        self.detector = detector
+        self.address = address
+        self.server = None
+        self.server_thread = None
+
+    def start(self) -> None:
+        """
+        Method that starts listening and serving the scrapes in a daemon thread
+        """
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(address):
+                os.remove(address)
+            self.server = ThreadingUnixHTTPServer(address, MetricsRequestHandler)
+        else:
+            self.server = ThreadingHTTPServer(address, MetricsRequestHandler)
+        self.server.daemon_threads = True
+        self.server.metrics_server = self
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+
+    def stop(self) -> None:
+        """
+        Method that stops the server
+        """
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.remove(address)
+        self.server = None
+
+    def render(self) -> str:
+        """
+        Method that builds the page of the metrics of the detector, in the Prometheus text format
+        :return: the page as a string
+        """
+        detector = self.detector
+        stats = detector.get_pipeline_stats()
+        lines = []
+        metric(lines, "up", "gauge", "1 if the anomaly detection is running", [({}, int(detector.is_detecting()))])
+        metric(lines, "ticks_total", "counter", "samples fired by the scheduler", [({}, detector.scheduler.num_ticks)])
+        metric(lines, "sampling_period_seconds", "gauge", "current time between two samples", [({}, f"{detector.scheduler.period:g}")])
+        metric(lines, "skipped_ticks_total", "counter", "samples skipped because the detector was late by whole periods", [({}, detector.scheduler.skipped_ticks)])
+        metric(lines, "samples_total", "counter", "samples taken by the sampler stage of the pipeline", [({}, stats["samples"])])
+        metric(lines, "dropped_samples_total", "counter", "samples dropped because the sample queue was full", [({}, stats["dropped_samples"])])
+        metric(lines, "dropped_logs_total", "counter", "log rows dropped because the log queue was full", [({}, stats["dropped_logs"])])
+        metric(lines, "predictions_total", "counter", "predictions made, by result",
+               [({"result": "anomaly"}, stats["anomalies"]), ({"result": "normal"}, stats["normal"])])
+        metric(lines, "queue_size", "gauge", "items waiting in the queues of the pipeline",
+               [({"queue": "sample"}, stats["sample_queue_size"]), ({"queue": "log"}, stats["log_queue_size"])])
+        severity_level = detector.severity_level
+        metric(lines, "severity_level", "gauge", "current severity level, from 1 (critical) to 5 (informational)", [({}, int(severity_level.name[len("LEVEL_"):]))])
+        metric(lines, "severity_info", "gauge", "current severity level, as a label", [({"level": severity_level.value}, 1)])
+        metric(lines, "anomalies_detected", "gauge", "anomalies currently counted by the severity tracker", [({}, detector.severity_tracker.num_anomalies_detec)])
+        stage_timers = detector.stage_timers
+        histogram_metric(lines, "stage_latency_seconds", "duration of each stage of the detection",
+                         [({"stage": name}, stage_timers.get_cumulative_histogram(name), 1e-6) for name in list(stage_timers.stages)])
+        histogram_metric(lines, "sampling_lateness_seconds", "delay of the samples from their deadline", [({}, detector.scheduler.lateness_ms, 1e-3)])
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: dict) -> str:
+    """
+    This function formats the labels of a sample of a metric
+    :param labels: dictionary name -> value of the labels
+    :return: the labels between braces (empty string if there are no labels)
+    """
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def metric(lines: list, name: str, metric_type: str, help_text: str, samples: list) -> None:
+    """
+    This function appends a counter or a gauge to a page of metrics
+    :param lines: lines of the page
+    :param name: name of the metric, without the prefix
+    :param metric_type: "counter" or "gauge"
+    :param help_text: description of the metric
+    :param samples: list of pairs (labels, value)
+    """
+    name = METRICS_PREFIX + "_" + name
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+    for labels, value in samples:
+        lines.append(f"{name}{format_labels(labels)} {value}")
+
+
+def histogram_metric(lines: list, name: str, help_text: str, samples: list) -> None:
+    """
+    This function appends a histogram to a page of metrics, with cumulative buckets
+    :param lines: lines of the page
+    :param name: name of the metric, without the prefix
+    :param help_text: description of the metric
+    :param samples: list of tuples (labels, Histogram, factor that converts the values of the histogram into the unit of the metric)
+    """
+    name = METRICS_PREFIX + "_" + name
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, histogram, factor in samples:
+        counts = list(histogram.counts) # copied, since the histogram is updated while the page is built
+        cumulative = 0
+        for edge, count in zip(histogram.edges, counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels(dict(labels, le=f'{edge * factor:g}'))} {cumulative}")
+        cumulative += counts[-1]
+        lines.append(f"{name}_bucket{format_labels(dict(labels, le='+Inf'))} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum * factor:g}")
+        lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    HTTP server listening on a Unix socket, each request served by a new thread
+    """
+    daemon_threads = True
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the requests of the MetricsServer: GET /metrics returns the page of the metrics, any other path 404
+    """
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics_server.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        return str(self.client_address[0]) if self.client_address else "unix" # the clients of a Unix socket have no address
+
+    def log_message(self, format, *args):
+        pass # the scrapes are not printed, the output of the detector is kept for the alerts
@@ -0,0 +1,89 @@
+import json
+import socket
+import threading
+import numpy as np
+from monitoring.SystemMonitor import SystemMonitor, TRAINING_CPU_TIMES_INTERVAL
+from monitoring.ProbePlan import ProbePlan
+from utils.StreamProtocol import parse_address, pack_json, pack_observation, read_message, MSG_HELLO, MSG_FEATURES, MSG_ERROR
+
+class MonitoringAgent:
+    """
+    Class of the lightweight agent that runs only the system monitor on a host and streams its observations, as compact binary frames,
+    to a collector that scores the observations of many hosts with a single copy of the model
+    """
+
+    def __init__(self, address: str, host_name: str = None, sampling_period: float = 1.0, monitor: SystemMonitor = None):
+        """
+        Constructor
+        :param address: address of the collector ("host:port" for TCP or "unix:/path/to/socket")
+        :param host_name: name used by the collector to identify this host (if None, the host name of the machine)
+        :param sampling_period: time between two observations, in seconds
+        :param monitor: the monitor to use. If None, after the handshake a non-blocking monitor that collects only the features requested
+            by the collector is built, whose CPU times percentages are rescaled to the window of the training set of the collector's model
+        """
+        self.address = address
+        self.host_name = host_name if host_name is not None else socket.gethostname()
+        self.sampling_period = sampling_period
+        self.monitor = monitor
+        self.sock = None
+        self.features: list = None # names of the features requested by the collector
+        self.feature_idx = None # position of each requested feature in the values of the monitor's observations
+        self.force_stop = threading.Event()
+        self.num_sent: int = 0
+
+    def connect(self) -> None:
+        """
+        Method that connects to the collector and performs the handshake: the agent sends its host name and receives the features to send
+        """
+        family, address = parse_address(self.address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.sendall(pack_json(MSG_HELLO, {"host": self.host_name}))
+        with self.sock.makefile("rb") as stream:
+            msg_type, payload = read_message(stream)
+        if msg_type == MSG_ERROR:
+            raise ConnectionError("The collector refused the agent: %s" % json.loads(payload)["error"])
+        if msg_type != MSG_FEATURES:
+            raise ConnectionError("Unexpected answer from the collector during the handshake")
+        self.features = json.loads(payload)["features"]
+        if self.monitor is None:
+            # the deltas over the sampling period are rescaled to the training window, otherwise with periods longer than it the CPU times
+            # percentages would be out of the distribution seen by the model (e.g. an idle core gives 100 over 1 second and 10 over 0.1 seconds)
+            self.monitor = SystemMonitor(non_blocking=True, interval_cpu_times_percent=TRAINING_CPU_TIMES_INTERVAL, probe_plan=ProbePlan.from_features(self.features))
+        self.feature_idx = self.monitor.schema.column_indices(self.features)
+
+    def run(self, max_observations: int = None) -> None:
+        """
+        Method that streams the observations to the collector until the stop method is called (or the connection is closed)
+        :param max_observations: if given, the agent stops after sending this number of observations
+        """
+        if self.sock is None:
+            self.connect()
+        values = np.empty(len(self.features), dtype=np.float64)
+        try:
+            while not self.force_stop.is_set() and (max_observations is None or self.num_sent < max_observations):
+                record = self.monitor.monitor_record()
+                np.take(record.values, self.feature_idx, out=values)
+                self.sock.sendall(pack_observation(record.time, values))
+                self.num_sent += 1
+                self.force_stop.wait(self.sampling_period)
+        except (BrokenPipeError, ConnectionResetError):
+            print("The connection with the collector has been closed")
+        finally:
+            self.close()
+
+    def stop(self) -> None:
+        """
+        Method to call to stop the agent
+        """
+        self.force_stop.set()
+
+    def close(self) -> None:
+        """
+        Method that closes the connection with the collector
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
@@ -0,0 +1,116 @@
+import numpy as np
+
+METADATA_COLUMNS = ("time", "datetime", "monotonic_time", "injector") # non numeric columns of an observation, kept outside of the array of values
+
+class ObservationSchema:
+    """
+    Class that describes the fixed layout of the numeric values of an observation made by the SystemMonitor.
+    The schema is compiled once: each metric has a fixed position in the array of values of every observation
+    """
+
+    def __init__(self, core_ids: list = (), cpu_fields: tuple = (), cpu_freq: bool = False, cpu_global_usage: bool = False, num_temps: int = 0, vm_fields: tuple = ()):
+        """
+        Constructor
+        :param core_ids: ids of the logical cores whose per-core metrics are monitored
+        :param cpu_fields: names of the CPU times monitored for each core
+        :param cpu_freq: True if the frequencies of the cores are monitored
+        :param cpu_global_usage: True if the global CPU usage percentage is monitored
+        :param num_temps: number of physical cores whose temperature is monitored
+        :param vm_fields: names of the VM data monitored
+        """
+        self.params = {"core_ids": [int(core_id) for core_id in core_ids], "cpu_fields": list(cpu_fields), "cpu_freq": bool(cpu_freq),
+                       "cpu_global_usage": bool(cpu_global_usage), "num_temps": int(num_temps), "vm_fields": list(vm_fields)} # to rebuild the schema elsewhere
+        self.columns: list = []
+        self.core_times_idx = np.array([[self.add_column(f"core_{core_id}_%{time_type}") for time_type in cpu_fields] for core_id in core_ids], dtype=np.intp).reshape(len(core_ids), len(cpu_fields))
+        self.freq_global_idx = self.add_column("freq_cpu_global_usage") if cpu_freq else None
+        self.usage_global_idx = self.add_column("%cpu_global_usage") if cpu_global_usage else None
+        self.usage_idx = []
+        self.freq_idx = []
+        for i in core_ids: # percentage usage and frequency of each logical core are interleaved, as in the dataset
+            self.usage_idx.append(self.add_column(f"%logical_core_{i}_usage"))
+            if cpu_freq:
+                self.freq_idx.append(self.add_column(f"freq_logical_core_{i}_usage"))
+        self.usage_idx = np.array(self.usage_idx, dtype=np.intp)
+        self.freq_idx = np.array(self.freq_idx, dtype=np.intp)
+        self.temp_idx = np.array([self.add_column(f"physical_core_{i}_temp") for i in range(num_temps)], dtype=np.intp)
+        self.vm_idx = np.array([self.add_column("virtual_mem_" + vm_type) for vm_type in vm_fields], dtype=np.intp)
+        self.is_int_column = [False] * len(self.columns) # VM data, except the percentage, are integer numbers of bytes
+        for vm_type, idx in zip(vm_fields, self.vm_idx):
+            self.is_int_column[idx] = vm_type != "percent"
+        self.index = {column: i for i, column in enumerate(self.columns)}
+
+    @classmethod
+    def from_params(cls, params: dict):
+        """
+        This function rebuilds a schema from the parameters of another one (its attribute params), e.g. in another process
+        :param params: the parameters of the schema, as a dictionary (it can be read from JSON)
+        :return: the schema object
+        """
+        return ObservationSchema(core_ids=params["core_ids"], cpu_fields=tuple(params["cpu_fields"]), cpu_freq=params["cpu_freq"],
+                                 cpu_global_usage=params["cpu_global_usage"], num_temps=params["num_temps"], vm_fields=tuple(params["vm_fields"]))
+
+    def add_column(self, column: str) -> int:
+        """
+        Method to append a new column to the schema, used only while the schema is compiled
+        :param column: the name of the column
+        :return: the position of the column in the array of values
+        """
+        self.columns.append(column)
+        return len(self.columns) - 1
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def column_indices(self, columns: list) -> np.ndarray:
+        """
+        Method that resolves a list of column names into the array of their positions
+        :param columns: list of column names
+        :return: array of positions in the same order of columns
+        """
+        missing = [column for column in columns if column not in self.index]
+        if missing:
+            raise ValueError("Columns not monitored by the SystemMonitor: %s" % ", ".join(missing))
+        return np.array([self.index[column] for column in columns], dtype=np.intp)
+
+
+class ObservationRecord:
+    """
+    Class that represents a single observation made by the SystemMonitor: the numeric values are stored in a float64 array
+    (a row of the monitor's buffer) following an ObservationSchema, while the dictionary view is built only on demand
+    """
+    __slots__ = ("schema", "values", "time", "datetime", "injector", "monotonic_time")
+
+    def __init__(self, schema: ObservationSchema, values: np.ndarray, time: int, datetime: str, injector: str, monotonic_time: int = None):
+        """
+        Constructor
+        :param schema: the schema of the values
+        :param values: float64 array with the numeric values of the observation
+        :param time: time of the observation in milliseconds
+        :param datetime: date and time of the observation as a string
+        :param injector: the injection ongoing during the observation
+        :param monotonic_time: time of the observation on the monotonic clock in milliseconds, to measure the actual periods between observations
+        """
+        self.schema = schema
+        self.values = values
+        self.time = time
+        self.datetime = datetime
+        self.injector = injector
+        self.monotonic_time = monotonic_time
+
+    def to_dict(self, columns: list = None) -> dict:
+        """
+        Method that builds the dictionary view of the observation, with the same keys and order of the SystemMonitor's dictionaries
+        :param columns: if given, only these numeric columns are put in the dictionary (without time, datetime, monotonic_time and injector)
+        :return: dictionary
+        """
+        values = self.values.tolist()
+        is_int_column = self.schema.is_int_column
+        if columns is not None:
+            return {column: int(values[i]) if is_int_column[i] else values[i] for column, i in ((column, self.schema.index[column]) for column in columns)}
+        data_dict = {"time": self.time, "datetime": self.datetime}
+        if self.monotonic_time is not None:
+            data_dict["monotonic_time"] = self.monotonic_time
+        for i, column in enumerate(self.schema.columns):
+            data_dict[column] = int(values[i]) if is_int_column[i] else values[i]
+        data_dict["injector"] = self.injector
+        return data_dict
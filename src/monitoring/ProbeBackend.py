@@ -0,0 +1,465 @@
+import os
+import glob
+import json
+import time
+import psutil
+import numpy as np
+from utils.Clock import Clock, VirtualClock, WALL_CLOCK
+
+CPU_TIMES_FIELDS = ("user", "nice", "system", "idle", "iowait", "irq", "softirq", "steal", "guest", "guest_nice") # CPU times exposed by Linux in /proc/stat
+VIRTUAL_MEMORY_FIELDS = ("total", "available", "percent", "used", "free", "active", "inactive", "buffers", "cached", "shared", "slab") # same fields (and order) of psutil.virtual_memory() on Linux
+READ_BUFFER_SIZE = 65536 # size of the buffer used to read a file in a single pread call
+GIB = 1024 ** 3
+
+# ABSTRACT CLASS FOR PROBE BACKENDS
+class ProbeBackend:
+    """
+    Abstract class for the backends used by the SystemMonitor to read raw data about the resources of the system.
+    Should you want to implement your own backend, just extend/override this class
+    """
+
+    def cpu_times_fields(self) -> tuple:
+        """
+        Abstract method to be overridden
+        :return: the names of the CPU times returned by the method cpu_times, in the same order
+        """
+        pass
+
+    def cpu_times(self) -> list:
+        """
+        Abstract method to be overridden
+        :return: list containing, for each logical core, the list of its raw CPU times in seconds
+        """
+        pass
+
+    def cpu_freq(self) -> list:
+        """
+        Abstract method to be overridden
+        :return: list containing the current frequency (MHz) of each logical core
+        """
+        pass
+
+    def core_temperatures(self) -> list:
+        """
+        Abstract method to be overridden
+        :return: list containing the current temperature of each physical core
+        """
+        pass
+
+    def virtual_memory(self) -> dict:
+        """
+        Abstract method to be overridden
+        :return: dictionary containing the VM data of the system (same keys of psutil.virtual_memory()._asdict())
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Override needed only if the backend holds some resources. Default is an empty method
+        """
+        pass
+
+
+# SUBCLASSES OF THE PROBEBACKEND CLASS
+
+class PsutilProbeBackend(ProbeBackend):
+    """
+    Backend that reads data about the resources of the system using psutil functions
+    """
+
+    def cpu_times_fields(self) -> tuple:
+        return psutil.cpu_times()._fields
+
+    def cpu_times(self) -> list:
+        return psutil.cpu_times(percpu=True)
+
+    def cpu_freq(self) -> list:
+        return [freq.current for freq in psutil.cpu_freq(percpu=True)]
+
+    def core_temperatures(self) -> list:
+        temperatures = psutil.sensors_temperatures()
+        return [temp.current for temp in temperatures.get("coretemp", []) if "Core" in temp.label]
+
+    def virtual_memory(self) -> dict:
+        return psutil.virtual_memory()._asdict()
+
+
+class ProcfsProbeBackend(ProbeBackend):
+    """
+    Backend that reads data about the resources of the system directly from /proc and /sys (Linux only).
+    All the files are opened once at construction time and re-read at each observation with a single pread call,
+    so each file is read and parsed only once per observation
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+        self.stat_fd = os.open("/proc/stat", os.O_RDONLY)
+        self.meminfo_fd = os.open("/proc/meminfo", os.O_RDONLY)
+        self.num_cores = len(self.cpu_times())
+        self.fields = CPU_TIMES_FIELDS[:self.num_fields]
+
+        # psutil takes the frequencies from /proc/cpuinfo when it lists all the cores, otherwise from the cpufreq files of each core.
+        # On hosts without cpufreq (e.g. many VMs and containers) the frequency of the cores without a file is 0, so the monitor keeps its schema
+        self.cpuinfo_fd = os.open("/proc/cpuinfo", os.O_RDONLY)
+        self.freq_fds = []
+        if len(self.read_cpuinfo_freq()) != self.num_cores:
+            os.close(self.cpuinfo_fd)
+            self.cpuinfo_fd = None
+            for core_id in range(self.num_cores):
+                try:
+                    self.freq_fds.append(os.open(f"/sys/devices/system/cpu/cpu{core_id}/cpufreq/scaling_cur_freq", os.O_RDONLY))
+                except OSError:
+                    self.freq_fds.append(None)
+
+        # the input files of the coretemp sensors labelled as "Core", sorted as psutil does
+        self.temp_fds = []
+        for hwmon_dir in sorted(glob.glob("/sys/class/hwmon/hwmon*")):
+            if self.read_text(os.path.join(hwmon_dir, "name")) != "coretemp":
+                continue
+            for base in sorted(set(path.rsplit("_", 1)[0] for path in glob.glob(os.path.join(hwmon_dir, "temp*_input")))):
+                if "Core" in self.read_text(base + "_label"):
+                    self.temp_fds.append(os.open(base + "_input", os.O_RDONLY))
+
+    @staticmethod
+    def read_text(path: str) -> str:
+        """
+        Method that reads a small text file, returning an empty string if it does not exist
+        :param path: the path of the file
+        :return: the content of the file without leading/trailing whitespaces
+        """
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    @staticmethod
+    def pread_all(fd: int) -> bytes:
+        """
+        Method that re-reads from the beginning the whole content of an already opened file
+        :param fd: file descriptor of the file
+        :return: the content of the file
+        """
+        content = os.pread(fd, READ_BUFFER_SIZE, 0)
+        while len(content) % READ_BUFFER_SIZE == 0 and content: # the buffer was filled, the file may be longer
+            chunk = os.pread(fd, READ_BUFFER_SIZE, len(content))
+            if not chunk:
+                break
+            content += chunk
+        return content
+
+    def cpu_times_fields(self) -> tuple:
+        return self.fields
+
+    def cpu_times(self) -> list:
+        cores_times = []
+        for line in self.pread_all(self.stat_fd).split(b"\n"):
+            if line.startswith(b"cpu") and line[3:4].isdigit():
+                values = line.split()[1:len(CPU_TIMES_FIELDS) + 1]
+                cores_times.append([int(value) / self.clock_ticks for value in values])
+            elif cores_times: # per-core lines are contiguous, the remaining lines are not needed
+                break
+        self.num_fields = len(cores_times[0])
+        return cores_times
+
+    def read_cpuinfo_freq(self) -> list:
+        """
+        Method that reads the current frequency of each core from /proc/cpuinfo
+        :return: list containing the current frequency (MHz) of each logical core
+        """
+        return [float(line.split(b":")[1]) for line in self.pread_all(self.cpuinfo_fd).split(b"\n") if line.startswith(b"cpu MHz")]
+
+    def cpu_freq(self) -> list:
+        if self.cpuinfo_fd is not None:
+            return self.read_cpuinfo_freq()
+        return [int(os.pread(fd, 32, 0)) / 1000 if fd is not None else 0.0 for fd in self.freq_fds]
+
+    def core_temperatures(self) -> list:
+        return [int(os.pread(fd, 32, 0)) / 1000.0 for fd in self.temp_fds]
+
+    def virtual_memory(self) -> dict:
+        mems = {}
+        for line in self.pread_all(self.meminfo_fd).split(b"\n"):
+            fields = line.split()
+            if len(fields) >= 2:
+                mems[fields[0]] = int(fields[1]) * 1024
+
+        # same computations of psutil.virtual_memory() on Linux
+        total = mems[b"MemTotal:"]
+        free = mems[b"MemFree:"]
+        buffers = mems.get(b"Buffers:", 0)
+        cached = mems.get(b"Cached:", 0) + mems.get(b"SReclaimable:", 0)
+        shared = mems.get(b"Shmem:", mems.get(b"MemShared:", 0))
+        active = mems.get(b"Active:", 0)
+        inactive = mems.get(b"Inactive:", mems.get(b"Inact_dirty:", 0) + mems.get(b"Inact_clean:", 0) + mems.get(b"Inact_laundry:", 0))
+        slab = mems.get(b"Slab:", 0)
+        used = total - free - cached - buffers
+        if used < 0:
+            used = total - free
+        available = mems.get(b"MemAvailable:", free + buffers + cached)
+        if available < 0:
+            available = 0
+        elif available > total:
+            available = free
+        percent = round((total - available) / total * 100, 1)
+        return dict(zip(VIRTUAL_MEMORY_FIELDS, (total, available, percent, used, free, active, inactive, buffers, cached, shared, slab)))
+
+    def close(self) -> None:
+        for fd in [self.stat_fd, self.meminfo_fd, self.cpuinfo_fd] + self.freq_fds + self.temp_fds:
+            if fd is not None:
+                os.close(fd)
+        self.freq_fds = []
+        self.temp_fds = []
+        self.stat_fd = self.meminfo_fd = self.cpuinfo_fd = None
+
+
+class RecordedProbeBackend(ProbeBackend):
+    """
+    Backend that replays, in a loop, raw data recorded from a backend (or generated synthetically), so that the SystemMonitor can be run
+    deterministically and without touching the system (e.g. in benchmarks). Each method returns the next recorded value of its kind.
+    When the values are restarted from the first one, the CPU times are shifted forward so that they keep increasing
+    """
+
+    def __init__(self, sequences: dict, fields: tuple = CPU_TIMES_FIELDS):
+        """
+        Constructor
+        :param sequences: dictionary with the keys "cpu_times", "cpu_freq", "core_temperatures" and "virtual_memory", each one containing
+            the list of the values returned by the method with the same name of the recorded backend
+        :param fields: the names of the CPU times of the sequences, in the same order
+        """
+        if len(sequences["cpu_times"]) < 2:
+            raise ValueError("At least two readings of the CPU times are needed to replay them")
+        self.sequences = sequences
+        self.fields = tuple(fields)
+        cpu_times = sequences["cpu_times"]
+        first_times = np.array(cpu_times[0], dtype=np.float64)
+        last_times = np.array(cpu_times[-1], dtype=np.float64)
+        # shift of the CPU times at each restart: the time covered by the readings plus an average step between two of them
+        self.cpu_times_shift = (last_times - first_times) * len(cpu_times) / (len(cpu_times) - 1)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Method that restarts the replay from the first recorded values
+        """
+        self.positions = {kind: 0 for kind in self.sequences} # number of values of each kind returned so far
+
+    def next_position(self, kind: str) -> tuple:
+        """
+        Method that finds the next recorded value of a kind of data.
+        This method should not be called from the outside of the class.
+        :param kind: the key of the sequence to read
+        :return: a tuple (index of the value in its sequence, number of times the sequence has been restarted)
+        """
+        position = self.positions[kind]
+        self.positions[kind] = position + 1
+        num_restarts, idx = divmod(position, len(self.sequences[kind]))
+        return idx, num_restarts
+
+    def cpu_times_fields(self) -> tuple:
+        return self.fields
+
+    def cpu_times(self) -> list:
+        idx, num_restarts = self.next_position("cpu_times")
+        cpu_times = self.sequences["cpu_times"][idx]
+        if num_restarts == 0:
+            return cpu_times
+        return (np.array(cpu_times, dtype=np.float64) + num_restarts * self.cpu_times_shift).tolist()
+
+    def cpu_freq(self) -> list:
+        return self.sequences["cpu_freq"][self.next_position("cpu_freq")[0]]
+
+    def core_temperatures(self) -> list:
+        return self.sequences["core_temperatures"][self.next_position("core_temperatures")[0]]
+
+    def virtual_memory(self) -> dict:
+        return self.sequences["virtual_memory"][self.next_position("virtual_memory")[0]]
+
+    @classmethod
+    def record(cls, backend: ProbeBackend, num_snapshots: int, interval: float = 0.1):
+        """
+        This function records snapshots of raw data from a backend, reading all its data once per interval
+        :param backend: the backend to record (e.g. a ProcfsProbeBackend)
+        :param num_snapshots: number of snapshots to record
+        :param interval: time between two snapshots, in seconds
+        :return: the RecordedProbeBackend that replays the snapshots
+        """
+        sequences = {"cpu_times": [], "cpu_freq": [], "core_temperatures": [], "virtual_memory": []}
+        for i in range(num_snapshots):
+            if i > 0:
+                time.sleep(interval)
+            for kind, value in raw_readings(backend).items():
+                sequences[kind].append(value)
+        return cls(sequences, backend.cpu_times_fields())
+
+    @classmethod
+    def synthetic(cls, num_cores: int = 8, num_temps: int = 4, num_snapshots: int = 200, interval: float = 0.1, seed: int = 0):
+        """
+        This function generates a sequence of plausible snapshots with a fixed seed, to replay a host that has not been recorded
+        :param num_cores: number of logical cores of the host
+        :param num_temps: number of physical cores with a temperature sensor
+        :param num_snapshots: number of snapshots to generate
+        :param interval: time between two snapshots, in seconds
+        :param seed: seed of the random generator
+        :return: the RecordedProbeBackend that replays the snapshots
+        """
+        rng = np.random.default_rng(seed)
+        fields = CPU_TIMES_FIELDS
+        busy_fields = [fields.index(field) for field in ("user", "nice", "system", "iowait", "irq", "softirq")]
+        share = np.zeros((num_snapshots, num_cores, len(fields))) # fraction of each interval spent in each CPU time
+        share[:, :, busy_fields] = rng.dirichlet(np.ones(len(busy_fields)), size=(num_snapshots, num_cores))
+        share[:, :, busy_fields] *= rng.uniform(0.02, 0.9, size=(num_snapshots, num_cores, 1))
+        share[:, :, fields.index("idle")] = 1 - share.sum(axis=2)
+        cpu_times = np.cumsum(share * interval, axis=0) + rng.uniform(1e3, 1e4, size=(1, num_cores, len(fields)))
+        total = 16 * GIB
+        sequences = {"cpu_times": [], "cpu_freq": [], "core_temperatures": [], "virtual_memory": []}
+        for i in range(num_snapshots):
+            free = int(rng.uniform(1, 8) * GIB)
+            buffers = int(rng.uniform(0.1, 0.5) * GIB)
+            cached = int(rng.uniform(1, 4) * GIB)
+            available = free + buffers + cached
+            used = total - free - buffers - cached
+            vm = (total, available, round((total - available) / total * 100, 1), used, free, int(used * 0.6), int(cached * 0.5), buffers, cached,
+                  int(rng.uniform(0.1, 1) * GIB), int(rng.uniform(0.1, 0.5) * GIB))
+            sequences["cpu_times"].append(np.round(cpu_times[i], 2).tolist())
+            sequences["cpu_freq"].append(np.round(rng.uniform(800, 4500, size=num_cores), 3).tolist())
+            sequences["core_temperatures"].append(np.round(rng.uniform(35, 90, size=num_temps)).tolist())
+            sequences["virtual_memory"].append(dict(zip(VIRTUAL_MEMORY_FIELDS, vm)))
+        return cls(sequences, fields)
+
+    def save(self, filename: str) -> None:
+        """
+        Method that writes the recorded values to a JSON file
+        :param filename: the name of the file
+        """
+        with open(filename, "w") as f:
+            json.dump({"fields": list(self.fields), "sequences": self.sequences}, f)
+
+    @classmethod
+    def load(cls, filename: str):
+        """
+        This function reads the recorded values written by the method save
+        :param filename: the name of the file
+        :return: the RecordedProbeBackend that replays them
+        """
+        with open(filename) as f:
+            content = json.load(f)
+        return cls(content["sequences"], tuple(content["fields"]))
+
+
+class TraceRecordingBackend(ProbeBackend):
+    """
+    Backend that wraps another backend and writes each raw reading, with the time at which it was done, as a line of a JSON trace file.
+    The trace can be replayed by a TraceReplayBackend driving a VirtualClock
+    """
+
+    def __init__(self, backend: ProbeBackend, filename: str, clock: Clock = WALL_CLOCK):
+        """
+        Constructor
+        :param backend: the backend whose readings are recorded (e.g. a PsutilProbeBackend)
+        :param filename: the name of the trace file (JSON lines: a header with the names of the CPU times, then one line per reading)
+        :param clock: the clock that gives the time of the readings
+        """
+        self.backend = backend
+        self.clock = clock
+        self.file = open(filename, "w")
+        self.file.write(json.dumps({"fields": list(backend.cpu_times_fields())}) + "\n")
+
+    def record(self, kind: str, value):
+        """
+        Method that writes a reading in the trace file.
+        This method should not be called from the outside of the class.
+        :param kind: the name of the method of the backend that returned the value
+        :param value: the value returned, made of lists and dictionaries
+        :return: the value
+        """
+        self.file.write(json.dumps({"t": self.clock.time(), "kind": kind, "value": value}) + "\n")
+        return value
+
+    def cpu_times_fields(self) -> tuple:
+        return self.backend.cpu_times_fields()
+
+    def cpu_times(self) -> list:
+        return self.record("cpu_times", [list(core_times) for core_times in self.backend.cpu_times()])
+
+    def cpu_freq(self) -> list:
+        return self.record("cpu_freq", list(self.backend.cpu_freq()))
+
+    def core_temperatures(self) -> list:
+        return self.record("core_temperatures", list(self.backend.core_temperatures()))
+
+    def virtual_memory(self) -> dict:
+        return self.record("virtual_memory", dict(self.backend.virtual_memory()))
+
+    def close(self) -> None:
+        self.file.close()
+        self.backend.close()
+
+
+class TraceReplayBackend(RecordedProbeBackend):
+    """
+    Backend that replays a trace written by a TraceRecordingBackend: each reading moves the VirtualClock forward to the time at which it
+    was recorded, so the components driven by the same clock see the timestamps of the recorded run, without waiting for them
+    """
+
+    def __init__(self, sequences: dict, timestamps: dict, fields: tuple, clock: VirtualClock):
+        """
+        Constructor, use load to build an instance from a trace file
+        :param sequences: dictionary kind of reading -> list of the values recorded (see RecordedProbeBackend)
+        :param timestamps: dictionary kind of reading -> list of the times (seconds since the epoch) of the values recorded
+        :param fields: the names of the CPU times of the trace
+        :param clock: the virtual clock moved by the readings
+        """
+        RecordedProbeBackend.__init__(self, sequences, fields)
+        self.timestamps = timestamps
+        self.clock = clock
+        all_times = [t for times in timestamps.values() for t in times]
+        cpu_times = timestamps["cpu_times"]
+        # when the trace is restarted, its times are shifted by its duration plus an average step between two readings of the CPU times
+        self.duration = max(all_times) - min(all_times) + (cpu_times[-1] - cpu_times[0]) / (len(cpu_times) - 1)
+
+    def next_position(self, kind: str) -> tuple:
+        idx, num_restarts = RecordedProbeBackend.next_position(self, kind)
+        self.clock.advance_to(self.timestamps[kind][idx] + num_restarts * self.duration)
+        return idx, num_restarts
+
+    @classmethod
+    def load(cls, filename: str, speedup: float = 0):
+        """
+        This function reads a trace file written by a TraceRecordingBackend
+        :param filename: the name of the trace file
+        :param speedup: speedup of the VirtualClock built for the replay (see VirtualClock)
+        :return: the TraceReplayBackend, whose clock starts at the time of the first reading of the trace
+        """
+        sequences = {"cpu_times": [], "cpu_freq": [], "core_temperatures": [], "virtual_memory": []}
+        timestamps = {kind: [] for kind in sequences}
+        with open(filename) as f:
+            fields = tuple(json.loads(f.readline())["fields"])
+            for line in f:
+                reading = json.loads(line)
+                sequences[reading["kind"]].append(reading["value"])
+                timestamps[reading["kind"]].append(reading["t"])
+        # kinds never read during the recording (e.g. the temperatures of a host without sensors) are replayed as empty values
+        for kind, empty_value in (("cpu_freq", []), ("core_temperatures", []), ("virtual_memory", {})):
+            if not sequences[kind]:
+                sequences[kind].append(empty_value)
+                timestamps[kind].append(timestamps["cpu_times"][0])
+        start_time = min(times[0] for times in timestamps.values())
+        return cls(sequences, timestamps, fields, VirtualClock(start_time, speedup))
+
+
+def raw_readings(backend: ProbeBackend) -> dict:
+    """
+    This function reads once all the raw data of a backend, converted into lists and dictionaries
+    :param backend: the backend to read
+    :return: dictionary with the keys "cpu_times", "cpu_freq", "core_temperatures" and "virtual_memory"
+    """
+    return {
+        "cpu_times": [list(core_times) for core_times in backend.cpu_times()],
+        "cpu_freq": list(backend.cpu_freq()),
+        "core_temperatures": list(backend.core_temperatures()),
+        "virtual_memory": dict(backend.virtual_memory())
+    }
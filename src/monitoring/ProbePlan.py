@@ -0,0 +1,69 @@
+import re
+
+class ProbePlan:
+    """
+    Class that describes which metrics the SystemMonitor has to collect, so that metric families, cores or sensors that nobody consumes are not probed.
+    A value None means "everything available on the host"
+    """
+
+    def __init__(self, core_ids: list = None, cpu_fields: list = None, cpu_freq: bool = True, cpu_global_usage: bool = True, num_temps: int = None, vm_fields: list = None):
+        """
+        Constructor
+        :param core_ids: ids of the logical cores whose per-core metrics (CPU times, usage, frequency) are collected
+        :param cpu_fields: names of the CPU times collected for each core (e.g. user, system, idle)
+        :param cpu_freq: True if the frequencies of the cores have to be collected
+        :param cpu_global_usage: True if the global CPU usage percentage has to be collected
+        :param num_temps: number of physical cores whose temperature is collected (0 means that the temperature sensors are not read at all)
+        :param vm_fields: names of the VM data collected (e.g. available, percent)
+        """
+        self.core_ids = sorted(core_ids) if core_ids is not None else None
+        self.cpu_fields = list(cpu_fields) if cpu_fields is not None else None
+        self.cpu_freq = cpu_freq
+        self.cpu_global_usage = cpu_global_usage
+        self.num_temps = num_temps
+        self.vm_fields = list(vm_fields) if vm_fields is not None else None
+
+    @classmethod
+    def from_features(cls, features: list):
+        """
+        This function builds the plan needed to collect a list of features, e.g. the feature_names_in_ of the scaler used by the anomaly detector
+        :param features: names of the features, with the same names used by the SystemMonitor
+        :return: the ProbePlan that collects only the metrics needed to compute the features
+        """
+        core_ids = set()
+        cpu_fields = []
+        vm_fields = []
+        cpu_freq = False
+        cpu_global_usage = False
+        num_temps = 0
+        for feature in features:
+            if match := re.fullmatch(r"core_(\d+)_%(\w+)", feature):
+                core_ids.add(int(match.group(1)))
+                if match.group(2) not in cpu_fields:
+                    cpu_fields.append(match.group(2))
+            elif match := re.fullmatch(r"%logical_core_(\d+)_usage", feature):
+                core_ids.add(int(match.group(1)))
+            elif match := re.fullmatch(r"freq_logical_core_(\d+)_usage", feature):
+                core_ids.add(int(match.group(1)))
+                cpu_freq = True
+            elif feature == "freq_cpu_global_usage":
+                cpu_freq = True
+            elif feature == "%cpu_global_usage":
+                cpu_global_usage = True
+            elif match := re.fullmatch(r"physical_core_(\d+)_temp", feature):
+                num_temps = max(num_temps, int(match.group(1)) + 1)
+            elif match := re.fullmatch(r"virtual_mem_(\w+)", feature):
+                vm_fields.append(match.group(1))
+        return cls(core_ids=list(core_ids), cpu_fields=cpu_fields, cpu_freq=cpu_freq, cpu_global_usage=cpu_global_usage, num_temps=num_temps, vm_fields=vm_fields)
+
+    def needs_cpu(self) -> bool:
+        """
+        :return: True if the plan needs some CPU data
+        """
+        return self.core_ids is None or len(self.core_ids) > 0 or self.cpu_freq or self.cpu_global_usage
+
+    def needs_vm(self) -> bool:
+        """
+        :return: True if the plan needs some VM data
+        """
+        return self.vm_fields is None or len(self.vm_fields) > 0
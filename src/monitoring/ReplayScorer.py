@@ -0,0 +1,101 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from monitoring.InferencePipeline import InferencePipeline
+from monitoring.SeverityTracker import SeverityTracker, SEVERITY_LEVEL_STATUS, TRESHOLD_TO_RESET_FLAG
+
+DATE_AND_TIME_COLUMNS = ("date_and_time", "datetime") # columns used (in this order) as date and time of the rows in the log files
+
+class ReplayScorer:
+    """
+    Class to score offline, in bulk, historical data (e.g. the dataset CSV or the datapoint log of a detector), reading them in large chunks.
+    Each chunk is scaled and predicted with vectorized calls, then the severity level is computed with a sequential pass on the predictions.
+    The outputs are the same two log files written by the AnomalyDetector
+    """
+
+    def __init__(self, model_clf, scaler, chunk_size: int = 50000, reset_threshold: int = TRESHOLD_TO_RESET_FLAG):
+        """
+        Constructor
+        :param model_clf: classifier already trained to use as anomaly detector
+        :param scaler: StandardScaler fitted on the training set of the model, with the names of the features
+        :param chunk_size: number of rows read, scaled and predicted at once
+        :param reset_threshold: number of consecutive normal predictions after which the number of anomalies currently detected is set to zero
+        """
+        self.model_clf = model_clf
+        self.scaler = scaler
+        self.chunk_size = chunk_size
+        self.reset_threshold = reset_threshold
+
+    def score_file(self, input_filename: str, dp_log_filename: str, sl_log_filename: str) -> dict:
+        """
+        Method to score all the rows of a CSV file, writing the predictions into two log files with the format of the AnomalyDetector
+        :param input_filename: the CSV file with the rows to score (it must contain all the features of the scaler)
+        :param dp_log_filename: log file in which date + time, prediction, predicted probability and the features of each row are written
+        :param sl_log_filename: log file in which date + time, prediction, predicted probability and the severity level of each row are written
+        :return: dictionary with a summary of the predictions (number of rows, anomalies and rows for each severity level)
+        """
+        feature_names = list(self.scaler.feature_names_in_)
+        pipeline = InferencePipeline(self.model_clf, self.scaler, feature_names, feature_names)
+        severity_tracker = SeverityTracker(self.reset_threshold)
+        summary = {"file": input_filename, "rows": 0, "anomalies": 0}
+        summary.update({status: 0 for status in SEVERITY_LEVEL_STATUS.values()})
+        is_first_chunk = True
+        for chunk in pd.read_csv(input_filename, chunksize=self.chunk_size, na_filter=False):
+            features = chunk[feature_names]
+            predicted_labels, predicted_proba = pipeline.predict(features.to_numpy(dtype=np.float64))
+            anomalies = predicted_labels == 1
+
+            # the severity level depends on the previous predictions, so it is computed with a sequential pass
+            severity_levels = [SEVERITY_LEVEL_STATUS[severity_tracker.update(anomaly_detected)] for anomaly_detected in anomalies.tolist()]
+
+            date_and_time_column = next((column for column in DATE_AND_TIME_COLUMNS if column in chunk.columns), None)
+            predictions = pd.DataFrame({
+                "date_and_time": chunk[date_and_time_column].to_numpy() if date_and_time_column is not None else chunk.index.to_numpy(),
+                "prediction": np.where(anomalies, "ANOMALY DETECTED", "NORMAL STATE"),
+                "predicted_proba": [str(proba.reshape(1, -1)) for proba in predicted_proba] # same format of the logs of the AnomalyDetector
+            })
+            pd.concat([predictions, features.reset_index(drop=True)], axis=1).to_csv(dp_log_filename, mode='w' if is_first_chunk else 'a', header=is_first_chunk, index=False)
+            predictions["severity_level"] = severity_levels
+            predictions.to_csv(sl_log_filename, mode='w' if is_first_chunk else 'a', header=is_first_chunk, index=False)
+            is_first_chunk = False
+
+            summary["rows"] += len(chunk)
+            summary["anomalies"] += int(anomalies.sum())
+            for status in severity_levels:
+                summary[status] += 1
+        return summary
+
+
+def score_file_in_process(model_filename: str, scaler_filename: str, input_filename: str, out_folder: str, chunk_size: int, reset_threshold: int) -> dict:
+    """
+    Function executed by each process of the pool: it loads the model and the scaler and scores a single file.
+    The log files are written in out_folder, with the name of the input file as prefix
+    :return: the summary of the predictions
+    """
+    scorer = ReplayScorer(joblib.load(model_filename), joblib.load(scaler_filename), chunk_size, reset_threshold)
+    prefix = os.path.splitext(os.path.basename(input_filename))[0]
+    return scorer.score_file(input_filename, os.path.join(out_folder, f"{prefix}_datapoint_with_predictions.log"),
+                             os.path.join(out_folder, f"{prefix}_predictions_with_severity_level.log"))
+
+
+def score_files(model_filename: str, scaler_filename: str, input_filenames: list, out_folder: str, chunk_size: int = 50000,
+                reset_threshold: int = TRESHOLD_TO_RESET_FLAG, processes: int = None) -> list:
+    """
+    Function to score more files in parallel, one file for each process of a pool
+    :param model_filename: the file of the saved model
+    :param scaler_filename: the file of the saved scaler
+    :param input_filenames: the CSV files to score
+    :param out_folder: the folder in which the log files are written
+    :param chunk_size: number of rows read, scaled and predicted at once
+    :param reset_threshold: number of consecutive normal predictions after which the number of anomalies currently detected is set to zero
+    :param processes: number of processes of the pool (if None, the number of cores)
+    :return: list with the summary of the predictions of each file, in the same order of input_filenames
+    """
+    if not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(score_file_in_process, model_filename, scaler_filename, input_filename, out_folder, chunk_size, reset_threshold)
+                   for input_filename in input_filenames]
+        return [future.result() for future in futures]
@@ -0,0 +1,163 @@
+import os
+import json
+import mmap
+import numpy as np
+from datetime import datetime
+from monitoring.ObservationRecord import ObservationSchema, ObservationRecord
+from monitoring.SamplingService import ring_arrays, RING_MAGIC, RING_VERSION, HEADER_PUBLISHED
+from utils.Clock import Clock, WALL_CLOCK
+
+READ_RETRIES = 10 # attempts to copy the latest observation when the writer keeps overwriting it during the copy
+WAIT_POLL_INTERVAL = 0.001 # seconds between two checks of the ring buffer while waiting for a new observation
+SHM_FOLDER = "/dev/shm" # folder in which Linux keeps the shared memory segments
+
+class SamplingReader:
+    """
+    Class that reads the observations published by a SamplingService, also from another process, attaching to its shared memory segment.
+    Reads never block the writer: each slot is protected by a sequence number (seqlock), so a copy made while the slot was rewritten is
+    detected and retried. It has the same interface of the SystemMonitor used by the AnomalyDetector (schema, clock, monitor_record, monitor),
+    so it can be given to the detector in place of a monitor
+    """
+
+    def __init__(self, name: str, history_size: int = 1, clock: Clock = WALL_CLOCK):
+        """
+        Constructor
+        :param name: name of the shared memory segment of the service
+        :param history_size: number of observations kept by the reader: the values of an ObservationRecord returned by monitor_record are a view
+            on a row of this buffer, so they are overwritten after history_size new observations (as in the SystemMonitor)
+        :param clock: the clock on which the reader waits for new observations
+        """
+        # the segment is mapped read-only, without multiprocessing.shared_memory: before Python 3.13 a process attaching a segment with it
+        # registers the segment in its resource tracker, which removes it when the process ends, while only the service has to remove it
+        fd = os.open(os.path.join(SHM_FOLDER, name.lstrip("/")), os.O_RDONLY)
+        try:
+            self.shm = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        self.header, schema, self.slot_seq, self.times, self.values = ring_arrays(self.shm)
+        schema_params = json.loads(schema.tobytes()) if self.header[0] == RING_MAGIC and self.header[1] == RING_VERSION else None
+        del schema # the views must be released before closing the mapping
+        if schema_params is None:
+            self.close()
+            raise ValueError("The shared memory segment %s is not a ring buffer of a SamplingService" % name)
+        self.schema = ObservationSchema.from_params(schema_params)
+        self.capacity = len(self.slot_seq)
+        self.sampling_period = int(self.header[6]) / 1e9
+        self.clock = clock
+        self.injector: str = "None"
+        self.history = np.zeros((history_size, len(self.schema)), dtype=np.float64)
+        self.num_obs: int = 0
+        self.last_seq: int = -1 # sequence number of the last observation returned by monitor_record
+
+    def published(self) -> int:
+        """
+        :return: number of observations published by the service so far
+        """
+        return int(self.header[HEADER_PUBLISHED])
+
+    def read(self, seq: int, out: np.ndarray) -> tuple:
+        """
+        Method that copies an observation from the ring buffer
+        :param seq: sequence number of the observation
+        :param out: array in which the values are copied
+        :return: a tuple (time, monotonic time) of the observation, or None if it is not in the ring buffer (not published yet,
+            already overwritten or rewritten during the copy)
+        """
+        slot = seq % self.capacity
+        expected = 2 * seq + 2
+        if self.slot_seq[slot] != expected:
+            return None
+        out[:] = self.values[slot]
+        time, monotonic_time = self.times[slot].tolist()
+        if self.slot_seq[slot] != expected:
+            return None
+        return time, monotonic_time
+
+    def read_latest(self, out: np.ndarray) -> tuple:
+        """
+        Method that copies the latest observation published
+        :param out: array in which the values are copied
+        :return: a tuple (sequence number, time, monotonic time) of the observation, or None if nothing has been published yet
+        """
+        for _ in range(READ_RETRIES):
+            seq = self.published() - 1
+            if seq < 0:
+                return None
+            times = self.read(seq, out)
+            if times is not None:
+                return (seq,) + times
+        raise RuntimeError("The latest observation has been overwritten during %d consecutive copies" % READ_RETRIES)
+
+    def get_history(self, num_rows: int = None) -> tuple:
+        """
+        Method that copies the last observations kept in the ring buffer, discarding those rewritten during the copy
+        :param num_rows: maximum number of observations (default: the whole ring buffer)
+        :return: a tuple (array of sequence numbers, array observations x 2 of times and monotonic times, array observations x columns of values)
+            in chronological order
+        """
+        published = self.published()
+        num_rows = min(published, self.capacity, num_rows if num_rows is not None else self.capacity)
+        seqs = np.arange(published - num_rows, published, dtype=np.int64)
+        slots = seqs % self.capacity
+        before = self.slot_seq[slots] # fancy indexing copies
+        times = self.times[slots]
+        values = self.values[slots]
+        valid = (before == 2 * seqs + 2) & (self.slot_seq[slots] == before)
+        return seqs[valid], times[valid], values[valid]
+
+    def wait_next(self, timeout: float = None) -> bool:
+        """
+        Method that waits until an observation more recent than the last one returned by monitor_record is published
+        :param timeout: maximum time to wait, in seconds (None to wait forever)
+        :return: True if a new observation is available
+        """
+        waited = 0.0
+        while self.published() - 1 <= self.last_seq:
+            if timeout is not None and waited >= timeout:
+                return False
+            self.clock.sleep(WAIT_POLL_INTERVAL)
+            waited += WAIT_POLL_INTERVAL
+        return True
+
+    def monitor_record(self) -> ObservationRecord:
+        """
+        Method that returns the latest observation published (waiting for the first one), copied into the next row of the buffer of the reader
+        :return: the observation, whose values are a view on the row of the buffer
+        """
+        row = self.history[self.num_obs % len(self.history)]
+        self.num_obs += 1
+        latest = self.read_latest(row)
+        while latest is None:
+            self.wait_next()
+            latest = self.read_latest(row)
+        self.last_seq, time, monotonic_time = latest
+        return ObservationRecord(self.schema, row, time, datetime.fromtimestamp(time / 1000).strftime('%Y-%m-%d %H:%M:%S'), self.injector,
+                                 monotonic_time if monotonic_time >= 0 else None)
+
+    def monitor(self) -> dict:
+        """
+        Method that returns the latest observation published as a dictionary
+        """
+        return self.monitor_record().to_dict()
+
+    def get_estimation_monitoring_time_per_obs(self) -> float:
+        """
+        Reading an observation never waits for the probes of the system
+        """
+        return 0.0
+
+    def set_reduced_probes(self, reduced: bool) -> None:
+        """
+        The probes are run by the service: the reader always returns the observations published by it
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Method that detaches the reader from the shared memory segment
+        """
+        if self.shm is None:
+            return
+        self.header = self.slot_seq = self.times = self.values = None # the views must be released before closing the mapping
+        self.shm.close()
+        self.shm = None
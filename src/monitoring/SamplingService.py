@@ -0,0 +1,135 @@
+import json
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from monitoring.SystemMonitor import SystemMonitor
+from monitoring.ObservationRecord import ObservationRecord
+from utils.FixedRateScheduler import FixedRateScheduler
+
+RING_MAGIC = 0x44434D4C52494E47 # first value of the header of the shared memory segment ("DCMLRING"), to recognise it
+RING_VERSION = 1 # version of the layout of the segment
+HEADER_SLOTS = 8 # int64 values of the header: magic, version, capacity, number of columns, published rows, bytes of the schema, period in ns, unused
+HEADER_PUBLISHED = 4 # position in the header of the number of rows published so far
+DEFAULT_RING_CAPACITY = 1024 # observations kept in the ring buffer
+DEFAULT_SERVICE_NAME = "dcml_sampler" # name of the shared memory segment used by the main scripts
+
+def ring_arrays(buf, capacity: int = None, num_columns: int = None, schema_bytes: int = None) -> tuple:
+    """
+    Function that maps the arrays of a ring buffer on the buffer of a shared memory segment, without copies. The layout is: the header,
+    the schema of the observations as JSON text (padded to 8 bytes), the sequence number of each slot, time and monotonic time of each slot
+    and the values of each slot. A slot holding the observation number seq (0-based) has sequence number 2 * seq + 2 when it is complete
+    and 2 * seq + 1 while it is being written (seqlock)
+    :param buf: the buffer of the segment
+    :param capacity: number of slots (if None, it is read from the header)
+    :param num_columns: number of values of an observation (if None, it is read from the header)
+    :param schema_bytes: length of the JSON text of the schema (if None, it is read from the header)
+    :return: a tuple (header, schema bytes, slot sequence numbers, times, values)
+    """
+    header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=buf)
+    capacity = int(header[2]) if capacity is None else capacity
+    num_columns = int(header[3]) if num_columns is None else num_columns
+    schema_bytes = int(header[5]) if schema_bytes is None else schema_bytes
+    offset = header.nbytes
+    schema = np.ndarray((schema_bytes,), dtype=np.uint8, buffer=buf, offset=offset)
+    offset += (schema_bytes + 7) // 8 * 8
+    slot_seq = np.ndarray((capacity,), dtype=np.int64, buffer=buf, offset=offset)
+    offset += slot_seq.nbytes
+    times = np.ndarray((capacity, 2), dtype=np.int64, buffer=buf, offset=offset)
+    offset += times.nbytes
+    values = np.ndarray((capacity, num_columns), dtype=np.float64, buffer=buf, offset=offset)
+    return header, schema, slot_seq, times, values
+
+
+def ring_size(capacity: int, num_columns: int, schema_bytes: int) -> int:
+    """
+    Function that computes the bytes of a shared memory segment holding a ring buffer
+    """
+    return HEADER_SLOTS * 8 + (schema_bytes + 7) // 8 * 8 + capacity * 8 * (1 + 2 + num_columns)
+
+
+class SamplingService:
+    """
+    Class of the single writer that samples the system with one SystemMonitor and publishes each observation into a ring buffer in a
+    multiprocessing.shared_memory segment, with a fixed layout (see ring_arrays). Any number of SamplingReader, in other threads or processes,
+    read the latest or the past observations from the segment without locks, pickling or sampling the system again
+    """
+
+    def __init__(self, monitor: SystemMonitor, name: str = None, capacity: int = DEFAULT_RING_CAPACITY, sampling_period: float = 1.0):
+        """
+        Constructor, the shared memory segment is created here
+        :param monitor: the monitor that samples the system (a non-blocking one is advised, so that the period is not spent in the CPU probe)
+        :param name: name of the segment, given to the readers (if None, a random name is chosen: see the attribute name)
+        :param capacity: number of observations kept in the ring buffer
+        :param sampling_period: time between two observations taken by the thread of the service, in seconds
+        """
+        self.monitor = monitor
+        self.capacity = capacity
+        self.sampling_period = sampling_period
+        schema_json = json.dumps(monitor.schema.params).encode()
+        num_columns = len(monitor.schema)
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=ring_size(capacity, num_columns, len(schema_json)))
+        self.name = self.shm.name
+        self.header, schema, self.slot_seq, self.times, self.values = ring_arrays(self.shm.buf, capacity, num_columns, len(schema_json))
+        schema[:] = np.frombuffer(schema_json, dtype=np.uint8)
+        self.slot_seq[:] = 0
+        self.header[:] = (RING_MAGIC, RING_VERSION, capacity, num_columns, 0, len(schema_json), round(sampling_period * 1e9), 0)
+        self.published: int = 0
+        self.scheduler = FixedRateScheduler(sampling_period, monitor.clock)
+        self.force_stop = threading.Event()
+        self.sampling_thread = None
+
+    def publish(self, record: ObservationRecord) -> int:
+        """
+        Method that writes an observation into the next slot of the ring buffer, e.g. when the observations are taken by a loop of the caller
+        :param record: the observation, with the schema of the monitor of the service
+        :return: the sequence number of the observation
+        """
+        seq = self.published
+        slot = seq % self.capacity
+        self.slot_seq[slot] = 2 * seq + 1 # odd: the slot is being written, the readers discard what they copy from it
+        self.times[slot] = (record.time, record.monotonic_time if record.monotonic_time is not None else -1)
+        self.values[slot] = record.values
+        self.slot_seq[slot] = 2 * seq + 2
+        self.published = seq + 1
+        self.header[HEADER_PUBLISHED] = self.published
+        return seq
+
+    def start(self) -> None:
+        """
+        Method that starts the thread of the service, that takes an observation on fixed deadlines and publishes it
+        """
+        self.force_stop.clear()
+        self.scheduler.reset()
+        self.sampling_thread = threading.Thread(target=self.sampling_loop, daemon=True)
+        self.sampling_thread.start()
+
+    def sampling_loop(self) -> None:
+        """
+        Body of the thread of the service.
+        This method should not be called from the outside of the class.
+        """
+        while self.scheduler.wait_next(self.force_stop):
+            self.publish(self.monitor.monitor_record())
+
+    def stop(self) -> None:
+        """
+        Method that stops the thread of the service
+        """
+        self.force_stop.set()
+        self.scheduler.wake()
+        if self.sampling_thread is not None:
+            self.sampling_thread.join()
+            self.sampling_thread = None
+
+    def close(self) -> None:
+        """
+        Method that stops the service and removes the shared memory segment (the readers already attached keep their mapping).
+        The monitor is not closed. It can be called more than once
+        """
+        self.stop()
+        if self.shm is None:
+            return
+        self.header = self.slot_seq = self.times = self.values = None # the views must be released before closing the segment
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
@@ -0,0 +1,58 @@
+from utils.SeverityLevel import SeverityLevel
+
+TRESHOLD_TO_RESET_FLAG = 5 # after this number of consecutive times that the anomaly detector says NOTHING DETECTED, the SeverityLevel is set to LEVEL_5 (the lowest one)
+SEVERITY_LEVEL_THRESHOLDS = ((15, SeverityLevel.LEVEL_1), (10, SeverityLevel.LEVEL_2), (4, SeverityLevel.LEVEL_3), (1, SeverityLevel.LEVEL_4)) # minimum number of anomalies currently detected for each level
+SEVERITY_LEVEL_STATUS = { # description of each severity level written in the log files
+    SeverityLevel.LEVEL_1: "LEVEL 1 - System Status -> CRITICAL",
+    SeverityLevel.LEVEL_2: "LEVEL 2 - System Status -> SEVERE",
+    SeverityLevel.LEVEL_3: "LEVEL 3 - System Status -> CAUTION",
+    SeverityLevel.LEVEL_4: "LEVEL 4 - System Status -> UNDER OBSERVATION",
+    SeverityLevel.LEVEL_5: "LEVEL 5 - System Status -> NORMAL"
+}
+
+class SeverityTracker:
+    """
+    Class that keeps the state used to compute the severity level of the system from the sequence of predictions of the model
+    """
+
+    def __init__(self, reset_threshold: int = TRESHOLD_TO_RESET_FLAG, level_thresholds: tuple = SEVERITY_LEVEL_THRESHOLDS):
+        """
+        Constructor
+        :param reset_threshold: number of consecutive normal predictions after which the number of anomalies currently detected is set to zero
+        :param level_thresholds: pairs (minimum number of anomalies currently detected, severity level), from the most severe level
+        """
+        self.reset_threshold = reset_threshold
+        self.level_thresholds = level_thresholds
+        self.num_anomalies_detec: int = 0 # number of anomalies currently detected
+        self.reset_flag: int = 0 # this is incremented each time a normal behavior is detected. If its value reaches a treshold (reset_threshold), the num_anomalies_detec variable is set to zero.
+                                 # This is the case when, after a long anomaly is detected, the system is said to be normal enough times to be considered safe
+        self.severity_level = SeverityLevel.LEVEL_5
+
+    def update(self, anomaly_detected: bool) -> SeverityLevel:
+        """
+        Method to call after each prediction of the model to update the severity level of the system
+        :param anomaly_detected: True if the model detected an anomaly
+        :return: the updated severity level
+        """
+        if anomaly_detected:
+            self.num_anomalies_detec += 1
+            self.reset_flag = 0
+        elif self.reset_flag >= self.reset_threshold:
+            self.reset_flag = 0
+            self.num_anomalies_detec = 0
+        elif self.num_anomalies_detec > 0:
+            self.reset_flag += 1
+            self.num_anomalies_detec -= 1
+        self.severity_level = self.severity_level_from_anomalies(self.num_anomalies_detec)
+        return self.severity_level
+
+    def severity_level_from_anomalies(self, num_obs_anomalies: int) -> SeverityLevel:
+        """
+        Method that maps the number of anomalies currently detected to a severity level
+        :param num_obs_anomalies: number of anomalies currently detected
+        :return: the severity level
+        """
+        for min_anomalies, severity_level in self.level_thresholds:
+            if num_obs_anomalies >= min_anomalies:
+                return severity_level
+        return SeverityLevel.LEVEL_5
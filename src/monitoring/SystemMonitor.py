@@ -1,77 +1,258 @@
-import psutil
-from datetime import datetime
-from utils.utilities import current_ms
+import time
+import numpy as np
+from monitoring.ProbeBackend import ProbeBackend, PsutilProbeBackend
+from monitoring.ObservationRecord import ObservationSchema, ObservationRecord
+from monitoring.ProbePlan import ProbePlan
+from utils.utilities import cpu_percentages_from_delta
+from utils.Clock import Clock, WALL_CLOCK
 from utils.SystemState import SystemState
+from utils.StageTimers import StageTimers
+
+TRAINING_CPU_TIMES_INTERVAL = 0.10 # window (seconds) of the CPU times percentages of the training set: the non-blocking monitors given to the model rescale their deltas to it
 
 class SystemMonitor:
     """
     Class to build a system monitor to monitor the usage of resources in the system (and gather data)
     """
-    def __init__(self, monitor_cpu: bool = True, monitor_vm: bool = True, interval_cpu_times_percent: int = 0.10, interval_cpu_cores_percent: int = 0.50):
+    def __init__(self, monitor_cpu: bool = True, monitor_vm: bool = True, interval_cpu_times_percent: int = TRAINING_CPU_TIMES_INTERVAL, interval_cpu_cores_percent: int = 0.50, non_blocking: bool = False, backend: ProbeBackend = None, history_size: int = 1, probe_plan: ProbePlan = None, clock: Clock = WALL_CLOCK, stage_timers: StageTimers = None):
         """
         Constructor
         :param monitor_cpu: True is CPU data has to be monitored
         :param monitor_vm: True is VM data has to be monitored
         :param interval_cpu_times_percent: CPU time percentage data collection interval duration, in seconds
         :param interval_cpu_cores_percent: CPU usage percentage data collection interval duration per core, in seconds
+        :param non_blocking: if True, the monitor does not sleep during the CPU probe: all the CPU percentages are computed from the
+            difference between the raw CPU times read at the current observation and those read at the previous one (or at construction time).
+            In this mode the monitor does not sleep and both CPU percentages cover the same time window: since the CPU times percentages computed
+            as psutil does depend on the length of the window (see cpu_percentages_from_delta), the deltas are rescaled to interval_cpu_times_percent,
+            so that the values stay comparable with those of a blocking monitor (e.g. the ones of the training set) at any sampling period
+        :param backend: the backend used to read raw data from the system (e.g. ProcfsProbeBackend). If None, a PsutilProbeBackend is used
+        :param history_size: number of observations kept in the ring buffer of the monitor. The values of an ObservationRecord are a view on a row
+            of this buffer, so they are overwritten after history_size new observations
+        :param probe_plan: the metrics to collect (e.g. ProbePlan.from_features(scaler.feature_names_in_)). If None, all the metrics available are collected
+        :param clock: the clock that gives the time of the observations and on which the CPU probe sleeps (e.g. the VirtualClock of a TraceReplayBackend)
+        :param stage_timers: if given, the durations of the probes (CPU times, frequencies, temperatures, VM data) are recorded in it at each observation
         """
-        self.monitor_cpu = monitor_cpu
-        self.monitor_vm = monitor_vm
+        self.clock = clock
+        self.stage_timers = stage_timers
+        self.probe_plan = probe_plan if probe_plan is not None else ProbePlan()
+        self.monitor_cpu = monitor_cpu and self.probe_plan.needs_cpu()
+        self.monitor_vm = monitor_vm and self.probe_plan.needs_vm()
         self.interval_cpu_times_percent = interval_cpu_times_percent
         self.interval_cpu_cores_percent = interval_cpu_cores_percent
+        self.non_blocking = non_blocking
+        self.backend = backend if backend is not None else PsutilProbeBackend()
+        self.cpu_fields = self.backend.cpu_times_fields()
+        self.last_cpu_times = None # raw CPU times of the previous reading of each CPU probe, used with intervals equal to 0 (as psutil does)
+        self.last_cpu_times_cores = None
+        # raw CPU times read at the end of the previous observation, from which the percentages are computed without sleeping
+        # (in non-blocking mode and with the reduced probe set)
+        self.delta_cpu_times = self.read_cpu_times() if non_blocking else None
+        self.delta_cpu_times_time = self.clock.monotonic() # monotonic time at which delta_cpu_times was read
         self.system_state = SystemState.NORMAL
         self.injector: str = "None"
 
+        # the schema of the observations is compiled once, reading from the backend how many cores, sensors and VM data are available
+        # and keeping only the metrics required by the probe plan
+        plan = self.probe_plan
+        core_ids = []
+        cpu_fields = []
+        num_temps = 0
+        if self.monitor_cpu:
+            num_cores = len(self.backend.cpu_times())
+            core_ids = plan.core_ids if plan.core_ids is not None else list(range(num_cores))
+            if core_ids and core_ids[-1] >= num_cores:
+                raise ValueError("The probe plan requires the logical core %d, but the host has only %d logical cores" % (core_ids[-1], num_cores))
+            cpu_fields = [field for field in self.cpu_fields if plan.cpu_fields is None or field in plan.cpu_fields]
+            if plan.num_temps is None or plan.num_temps > 0: # temperature sensors are read only if needed, since it is expensive
+                num_temps = len(self.backend.core_temperatures())
+                if plan.num_temps is not None:
+                    num_temps = min(num_temps, plan.num_temps)
+        vm_fields = []
+        if self.monitor_vm:
+            vm_fields = [field for field in self.backend.virtual_memory().keys() if plan.vm_fields is None or field in plan.vm_fields]
+        self.core_ids = np.array(core_ids, dtype=np.intp)
+        self.vm_fields = vm_fields
+        # position, in the flattened array (cores x CPU times) of CPU times percentages, of each CPU time to put in the observation
+        self.core_times_src = (self.core_ids[:, None] * len(self.cpu_fields) + np.array([self.cpu_fields.index(field) for field in cpu_fields], dtype=np.intp)).reshape(len(core_ids), len(cpu_fields))
+        self.schema = ObservationSchema(core_ids=core_ids, cpu_fields=tuple(cpu_fields), cpu_freq=self.monitor_cpu and plan.cpu_freq,
+                                        cpu_global_usage=self.monitor_cpu and plan.cpu_global_usage, num_temps=num_temps, vm_fields=tuple(vm_fields))
+        self.history = np.zeros((history_size, len(self.schema)), dtype=np.float64)
+        self.num_obs: int = 0 # number of observations done, used to find the next row of the ring buffer to fill
+        # with the reduced probe set the frequencies and the temperatures are not read: their values are carried forward from the last full observation
+        self.reduced_probes: bool = False
+        self.carried_idx = np.concatenate([np.array([self.schema.freq_global_idx] if self.schema.freq_global_idx is not None else [], dtype=np.intp),
+                                           self.schema.freq_idx, self.schema.temp_idx])
+        self.carried_row: int = -1 # position in the ring buffer of the last observation holding the values of the frequencies and the temperatures
+
     def monitor(self) -> dict:
         """
         Method that read data about the resources usage in the system
         :return:  dictionary
         """
-        data_dict = {"time": current_ms(), "datetime": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        return self.monitor_record().to_dict()
+
+    def monitor_record(self) -> ObservationRecord:
+        """
+        Method that read data about the resources usage in the system, writing the values in the next row of the ring buffer of the monitor
+        :return: the observation, whose values are a view on the row of the buffer
+        """
+        row_idx = self.num_obs % len(self.history)
+        row = self.history[row_idx]
+        self.num_obs += 1
+        record = ObservationRecord(self.schema, row, self.clock.time_ms(), self.clock.now().strftime('%Y-%m-%d %H:%M:%S'), self.injector,
+                                   round(self.clock.monotonic() * 1000))
+        reduced = self.reduced_probes and self.carried_row >= 0
+        if reduced:
+            if self.carried_row != row_idx:
+                row[self.carried_idx] = self.history[self.carried_row, self.carried_idx]
+                self.carried_row = row_idx # the carried values move forward with the ring buffer, so that they are never overwritten
+        else:
+            self.carried_row = row_idx
+        if self.stage_timers is not None:
+            return self.timed_probes(record, reduced)
+        if self.monitor_cpu:
+            self.cpu_probe(row, reduced)
+        if self.monitor_vm:
+            self.vm_probe(row)
+        return record
+
+    def timed_probes(self, record: ObservationRecord, reduced: bool = False) -> ObservationRecord:
+        """
+        This method fills the values of an observation as monitor_record does, recording the duration of each probe in the stage timers.
+        The CPU probe includes its intervals, if the monitor is blocking
+        :param record: the observation, whose values are filled
+        :param reduced: True if the frequencies and the temperatures are not read (see set_reduced_probes)
+        :return: the observation
+        """
+        timers = self.stage_timers
+        start = time.perf_counter_ns()
         if self.monitor_cpu:
-            self.cpu_probe(data_dict)
+            self.cpu_probe(record.values, reduced)
+            start = timers.record("monitor.cpu_probe", start)
         if self.monitor_vm:
-            self.vm_probe(data_dict)
-        data_dict["injector"] = self.injector
-        return data_dict
+            self.vm_probe(record.values)
+            timers.record("monitor.vm_probe", start)
+        return record
+
+    def get_history(self) -> np.ndarray:
+        """
+        Method that returns the values of the last observations kept in the ring buffer of the monitor
+        :return: array (observations x columns of the schema) in chronological order
+        """
+        num_rows = min(self.num_obs, len(self.history))
+        last_row = self.num_obs % len(self.history)
+        return np.roll(self.history, -last_row, axis=0)[len(self.history) - num_rows:]
+
+    def read_cpu_times(self) -> np.ndarray:
+        """
+        This method reads the raw CPU times of each core from the backend
+        :return: array (cores x CPU times) of raw CPU times, in seconds
+        """
+        return np.array(self.backend.cpu_times(), dtype=np.float64)
 
-    def cpu_probe(self, data_dict: dict) -> None:
+    def cpu_probe(self, row: np.ndarray, reduced: bool = False) -> None:
         """
-        This method reads CPU data from the system and uses it to update the dict passed as parameter
-        :param data_dict: dictionary that will be updated with the cpu data monitored
+        This method reads CPU data from the system and uses it to update the row of values passed as parameter
+        :param row: array of values of the observation, updated with the cpu data monitored
+        :param reduced: if True, the frequencies and the temperatures are not read (their values in the row are left untouched)
         """
+        schema = self.schema
+        timers = self.stage_timers
+        if timers is not None:
+            start = time.perf_counter_ns()
+        non_blocking = self.non_blocking or reduced # the reduced probe set never sleeps
+        if non_blocking:
+            cpu_t, cpu_percent_per_core = self.cpu_delta_percentages()
+        elif schema.core_times_idx.size > 0: # the CPU times are read over their interval only if some of them are needed
+            t1, t2 = self.read_cpu_times_over_interval(self.interval_cpu_times_percent, "last_cpu_times")
+            cpu_t, _ = cpu_percentages_from_delta(t1, t2, self.cpu_fields)
+
         # CPU time monitoring
-        cpu_t = psutil.cpu_times_percent(interval=self.interval_cpu_times_percent, percpu=True)
-        for core_id, core_data in enumerate(cpu_t):
-            for time_type, value in core_data._asdict().items():
-                key = f"core_{core_id}_%{time_type}"
-                data_dict[key] = value
+        if schema.core_times_idx.size > 0:
+            row[schema.core_times_idx] = cpu_t.take(self.core_times_src)
     
+        if timers is not None:
+            start = timers.record("monitor.cpu_times", start)
+
         # CPU usage monitoring
-        data_dict["freq_cpu_global_usage"] = psutil.cpu_freq().current
-        cpu_percent_per_core = psutil.cpu_percent(interval=self.interval_cpu_cores_percent, percpu=True)
-        cpu_freq_per_core = psutil.cpu_freq(percpu=True)
-        data_dict["%cpu_global_usage"] = sum(cpu_percent_per_core)/len(cpu_percent_per_core) # CPU usage percentage is the average of all core usage percentages
-        for i, perc in enumerate(cpu_percent_per_core): # this for cycle add the percentage usage of each logic core to the dictionary
-            data_dict[f"%logical_core_{i}_usage"] = perc
-            data_dict[f"freq_logical_core_{i}_usage"] = cpu_freq_per_core[i].current
+        if schema.freq_global_idx is not None and not reduced:
+            cpu_freq_per_core = self.backend.cpu_freq()
+            row[schema.freq_global_idx] = sum(cpu_freq_per_core)/len(cpu_freq_per_core) # as psutil does, the global frequency is the average of all core frequencies
+            row[schema.freq_idx] = [cpu_freq_per_core[i] for i in self.core_ids]
+            if timers is not None:
+                start = timers.record("monitor.cpu_freq", start)
+        if not non_blocking:
+            t1, t2 = self.read_cpu_times_over_interval(self.interval_cpu_cores_percent, "last_cpu_times_cores")
+            _, cpu_percent_per_core = cpu_percentages_from_delta(t1, t2, self.cpu_fields)
+            self.delta_cpu_times = t2 # origin of the deltas of the next observation, if it is made with the reduced probe set
+            self.delta_cpu_times_time = self.clock.monotonic()
+        if schema.usage_global_idx is not None:
+            row[schema.usage_global_idx] = cpu_percent_per_core.mean() # CPU usage percentage is the average of all core usage percentages
+        row[schema.usage_idx] = cpu_percent_per_core[self.core_ids]
+        if timers is not None:
+            start = timers.record("monitor.cpu_usage", start)
  
         # CPU physical cores temperatures monitoring
-        temperatures = psutil.sensors_temperatures()
-        count = 0
-        for _, temp in enumerate(temperatures["coretemp"]):
-            if "Core" in temp.label:
-                data_dict[f"physical_core_{count}_temp"] = temp.current
-                count += 1
+        if len(schema.temp_idx) > 0 and not reduced:
+            row[schema.temp_idx] = self.backend.core_temperatures()[:len(schema.temp_idx)]
+            if timers is not None:
+                timers.record("monitor.temperatures", start)
   
-    def vm_probe(self, data_dict: dict) -> None:
+    def read_cpu_times_over_interval(self, interval: float, last_attr: str) -> tuple:
+        """
+        This method reads the raw CPU times of each core twice, sleeping for the given interval between the two readings.
+        As psutil does, if the interval is 0 the first reading is the one done at the previous call (stored in the attribute last_attr)
+        :param interval: time to wait between the two readings, in seconds
+        :param last_attr: name of the attribute that stores the last reading, used only if interval is 0
+        :return: a tuple (CPU times at the beginning of the interval, CPU times at the end of the interval)
+        """
+        if interval > 0:
+            t1 = self.read_cpu_times()
+            self.clock.sleep(interval)
+            t2 = self.read_cpu_times()
+        else:
+            t2 = self.read_cpu_times()
+            t1 = getattr(self, last_attr)
+            if t1 is None:
+                t1 = t2
+            setattr(self, last_attr, t2)
+        return t1, t2
+
+    def cpu_delta_percentages(self) -> tuple:
+        """
+        This method reads the raw CPU times of each core and computes, from the difference with the ones read at the end of the previous observation,
+        both the CPU times percentages and the CPU usage percentages of each core. It never sleeps. The deltas are rescaled from the time passed
+        since the previous call to interval_cpu_times_percent, the window over which a blocking monitor computes the CPU times percentages
+        :return: a tuple (array cores x CPU times of CPU times percentages, array of CPU usage percentages per core)
         """
-        This method reads VM data from the system and uses it to update the dict passed as parameter
-        :param data_dict: dictionary that will be updated with the VM data monitored
+        current_cpu_times = self.read_cpu_times()
+        now = self.clock.monotonic()
+        elapsed = now - self.delta_cpu_times_time
+        time_scale = self.interval_cpu_times_percent / elapsed if elapsed > 0 and self.interval_cpu_times_percent > 0 else 1.0
+        cpu_t, cpu_percent_per_core = cpu_percentages_from_delta(self.delta_cpu_times, current_cpu_times, self.cpu_fields, time_scale)
+        self.delta_cpu_times = current_cpu_times
+        self.delta_cpu_times_time = now
+        return cpu_t, cpu_percent_per_core
+
+    def vm_probe(self, row: np.ndarray) -> None:
+        """
+        This method reads VM data from the system and uses it to update the row of values passed as parameter
+        :param row: array of values of the observation, updated with the VM data monitored
+        """
+        vm_data = self.backend.virtual_memory()
+        row[self.schema.vm_idx] = [vm_data[field] for field in self.vm_fields]
+
+    def set_reduced_probes(self, reduced: bool) -> None:
         """
-        vm_data = psutil.virtual_memory()._asdict()
-        for type, data in vm_data.items():
-            data_dict["virtual_mem_"+type] = data
+        This method enables or disables the reduced probe set: the CPU times and usages and the VM data are read at each observation, while
+        the frequencies and the temperatures (the most expensive probes, of slowly changing metrics) keep the values of the last observation
+        made with all the probes. The CPU percentages are computed without sleeping, as in non-blocking mode: from the raw CPU times read at the
+        end of the previous observation, with the CPU times percentages rescaled to interval_cpu_times_percent. The first observation is always
+        made with all the probes
+        :param reduced: True to enable the reduced probe set
+        """
+        self.reduced_probes = reduced
 
     def start_injection(self, injector: str) -> None:
         """
@@ -89,6 +270,12 @@ class SystemMonitor:
         self.system_state = SystemState.NORMAL
         self.injector = "None"
 
+    def close(self) -> None:
+        """
+        This method releases the resources held by the backend of the monitor
+        """
+        self.backend.close()
+
     def get_system_state(self) -> SystemState:
         return self.system_state
     
@@ -97,5 +284,7 @@ class SystemMonitor:
         This method gives an estimation of the time needed to monitor the system at each observation
         :return: the estimation of the time needed to monitor
         """
+        if self.non_blocking:
+            return 0.0
         return self.interval_cpu_times_percent + self.interval_cpu_cores_percent
   
\ No newline at end of file
@@ -0,0 +1,184 @@
+import re
+import numpy as np
+from collections import deque
+from typing import TYPE_CHECKING
+if TYPE_CHECKING: # pandas is needed only to compute the windowed features of a whole dataset
+    import pandas as pd
+
+WINDOW_STATS = ("mean", "std", "min", "max", "ewma", "slope") # windowed features computed for each metric
+
+class WindowFeatureEngine:
+    """
+    Class that computes, in streaming, windowed features of a set of metrics over the last window_size observations.
+    Each metric has a ring buffer and the statistics are updated incrementally, so the cost of a tick does not depend on the length of the window:
+    rolling mean and variance with the Welford update (with removal of the value that leaves the window), min and max with monotonic deques,
+    EWMA with its recursive formula and the least-squares slope with running sums. The function compute_window_features gives the same
+    features on a whole DataFrame (e.g. the dataset CSV), to train a model on them
+    """
+
+    def __init__(self, columns: list, window_size: int = 30, ewma_alpha: float = 0.2, stats: tuple = WINDOW_STATS):
+        """
+        Constructor
+        :param columns: names of the metrics whose windowed features are computed (e.g. some columns of the monitor's schema)
+        :param window_size: number of observations in the window
+        :param ewma_alpha: smoothing factor of the exponentially weighted moving average
+        :param stats: windowed features to emit for each metric (a subset of WINDOW_STATS)
+        """
+        unknown = [stat for stat in stats if stat not in WINDOW_STATS]
+        if unknown:
+            raise ValueError("Unknown windowed features: %s" % ", ".join(unknown))
+        self.columns: list = list(columns)
+        self.window_size = window_size
+        self.ewma_alpha = ewma_alpha
+        self.stats: tuple = tuple(stats)
+        self.feature_columns: list = window_feature_names(self.columns, window_size, self.stats)
+        num_metrics = len(self.columns)
+        self.stat_rows = np.array([WINDOW_STATS.index(stat) for stat in self.stats], dtype=np.intp)
+        self.all_stats = np.empty((len(WINDOW_STATS), num_metrics), dtype=np.float64) # every statistic of every metric, updated at each tick
+        self.output = np.empty(len(self.feature_columns), dtype=np.float64) # emitted features, ordered by metric and then by statistic
+        self.buffer = np.zeros((window_size, num_metrics), dtype=np.float64)
+        self.reset()
+
+    @classmethod
+    def from_features(cls, features: list, ewma_alpha: float = 0.2):
+        """
+        This function builds the engine that computes the windowed features found in a list of features (e.g. the feature_names_in_ of the scaler)
+        :param features: names of the features, windowed features have names like "%cpu_global_usage_w30_mean"
+        :param ewma_alpha: smoothing factor of the exponentially weighted moving average
+        :return: the WindowFeatureEngine, or None if there are no windowed features
+        """
+        columns = []
+        stats = []
+        window_sizes = set()
+        for feature in features:
+            if match := re.fullmatch(r"(.+)_w(\d+)_(%s)" % "|".join(WINDOW_STATS), feature):
+                window_sizes.add(int(match.group(2)))
+                if match.group(1) not in columns:
+                    columns.append(match.group(1))
+                if match.group(3) not in stats:
+                    stats.append(match.group(3))
+        if not columns:
+            return None
+        if len(window_sizes) > 1:
+            raise ValueError("Windowed features with different window sizes: %s" % ", ".join(map(str, sorted(window_sizes))))
+        return cls(columns, window_sizes.pop(), ewma_alpha, tuple(stat for stat in WINDOW_STATS if stat in stats))
+
+    def reset(self) -> None:
+        """
+        Method that empties the window
+        """
+        num_metrics = len(self.columns)
+        self.count: int = 0 # number of observations currently in the window
+        self.num_updates: int = 0 # number of observations received, used to find the position of the oldest one in the ring buffer
+        self.mean = np.zeros(num_metrics)
+        self.m2 = np.zeros(num_metrics) # sum of the squared differences from the mean (Welford)
+        self.ewma = np.zeros(num_metrics)
+        self.sum_y = np.zeros(num_metrics) # sum of the values in the window
+        self.sum_iy = np.zeros(num_metrics) # sum of the values multiplied by their position in the window (0 is the oldest)
+        self.min_deques = [deque() for _ in range(num_metrics)] # items (number of the update, value) with increasing values
+        self.max_deques = [deque() for _ in range(num_metrics)] # items (number of the update, value) with decreasing values
+
+    def update(self, values: np.ndarray) -> np.ndarray:
+        """
+        Method that adds an observation to the window and computes the windowed features
+        :param values: array with the values of the metrics, in the order of columns
+        :return: array of the windowed features, in the order of feature_columns. It is overwritten by the next update, so it has to be copied to be kept
+        """
+        n = self.window_size
+        position = self.num_updates % n
+        if self.count == n: # the window is full: the oldest value leaves it
+            old = self.buffer[position].copy()
+            old_mean = self.mean
+            self.mean = old_mean + (values - old) / n
+            self.m2 += (values - old) * (values - self.mean + old - old_mean)
+            self.sum_iy += (n - 1) * values - (self.sum_y - old)
+            self.sum_y += values - old
+        else:
+            self.count += 1
+            delta = values - self.mean
+            self.mean = self.mean + delta / self.count
+            self.m2 += delta * (values - self.mean)
+            self.sum_iy += (self.count - 1) * values
+            self.sum_y += values
+        self.buffer[position] = values
+        if self.count == n and position == n - 1:
+            # once per pass over the ring buffer, the running sums are recomputed from the window (amortized O(1)) so that rounding errors do not accumulate
+            self.mean = self.buffer.mean(axis=0)
+            self.m2 = ((self.buffer - self.mean) ** 2).sum(axis=0)
+            self.sum_y = self.buffer.sum(axis=0)
+            self.sum_iy = np.arange(n, dtype=np.float64) @ np.roll(self.buffer, -(position + 1), axis=0)
+        self.ewma = self.ewma_alpha * values + (1 - self.ewma_alpha) * self.ewma if self.num_updates > 0 else values.copy()
+
+        # min and max of the window: the values that can not be the extreme of any future window are discarded from the deques
+        first_valid = self.num_updates - n + 1
+        stats = self.all_stats
+        for i, value in enumerate(values.tolist()):
+            min_deque = self.min_deques[i]
+            while min_deque and min_deque[-1][1] >= value:
+                min_deque.pop()
+            min_deque.append((self.num_updates, value))
+            if min_deque[0][0] < first_valid:
+                min_deque.popleft()
+            max_deque = self.max_deques[i]
+            while max_deque and max_deque[-1][1] <= value:
+                max_deque.pop()
+            max_deque.append((self.num_updates, value))
+            if max_deque[0][0] < first_valid:
+                max_deque.popleft()
+            stats[2, i] = min_deque[0][1]
+            stats[3, i] = max_deque[0][1]
+        self.num_updates += 1
+
+        k = self.count
+        stats[0] = self.mean
+        stats[1] = np.sqrt(np.maximum(self.m2, 0) / k) if k > 1 else 0 # population standard deviation (ddof=0)
+        stats[4] = self.ewma
+        if k > 1: # least-squares slope of the values against their position in the window
+            sum_i = k * (k - 1) / 2
+            sum_i2 = (k - 1) * k * (2 * k - 1) / 6
+            stats[5] = (k * self.sum_iy - sum_i * self.sum_y) / (k * sum_i2 - sum_i * sum_i)
+        else:
+            stats[5] = 0
+        self.output[:] = stats[self.stat_rows].T.ravel()
+        return self.output
+
+
+def window_feature_names(columns: list, window_size: int, stats: tuple = WINDOW_STATS) -> list:
+    """
+    This function returns the names of the windowed features of some metrics, ordered by metric and then by statistic
+    :param columns: names of the metrics
+    :param window_size: number of observations in the window
+    :param stats: windowed features computed for each metric
+    :return: list of names, e.g. "%cpu_global_usage_w30_mean"
+    """
+    return [f"{column}_w{window_size}_{stat}" for column in columns for stat in stats]
+
+
+def compute_window_features(df: "pd.DataFrame", columns: list, window_size: int = 30, ewma_alpha: float = 0.2, stats: tuple = WINDOW_STATS) -> "pd.DataFrame":
+    """
+    This function computes on a whole DataFrame (e.g. the dataset CSV, in the order in which the rows were collected) the same windowed
+    features computed in streaming by WindowFeatureEngine, so that a model can be trained on them
+    :param df: the DataFrame with the metrics
+    :param columns: names of the metrics whose windowed features are computed
+    :param window_size: number of observations in the window
+    :param ewma_alpha: smoothing factor of the exponentially weighted moving average
+    :param stats: windowed features to compute for each metric
+    :return: DataFrame with the columns of df followed by the windowed features
+    """
+    import pandas as pd
+    values = df[list(columns)].astype(np.float64)
+    rolling = values.rolling(window_size, min_periods=1)
+    # least-squares slope of the values against their position: covariance between position and value over the variance of the positions
+    position = pd.Series(np.arange(len(df), dtype=np.float64), index=df.index)
+    position_var = position.rolling(window_size, min_periods=1).var(ddof=0)
+    slope = values.rolling(window_size, min_periods=1).cov(position, ddof=0).div(position_var, axis=0).fillna(0.0)
+    computed = {
+        "mean": rolling.mean(),
+        "std": rolling.std(ddof=0).fillna(0.0),
+        "min": rolling.min(),
+        "max": rolling.max(),
+        "ewma": values.ewm(alpha=ewma_alpha, adjust=False).mean(),
+        "slope": slope
+    }
+    window_features = pd.DataFrame({f"{column}_w{window_size}_{stat}": computed[stat][column] for column in columns for stat in stats}, index=df.index)
+    return pd.concat([df, window_features], axis=1)
@@ -0,0 +1,225 @@
+import gc
+import sys
+import json
+import time
+import platform
+import tracemalloc
+import numpy as np
+from datetime import datetime
+
+PERCENTILES = (50, 90, 99) # percentiles of the latencies reported for each stage
+COMPARED_PERCENTILES = ("p50", "p99") # latencies compared with the baseline
+REGRESSION_TOLERANCE = 0.20 # relative increase of a latency, with respect to the baseline, reported as a regression
+
+class BenchmarkRunner:
+    """
+    Class to run micro-benchmarks of the hot paths of the project. A benchmark is a sequence of stages (functions) executed in order at each
+    iteration: the latency of each stage and of the whole iteration is measured with perf_counter_ns, with the garbage collector disabled.
+    A second, shorter, run is done under tracemalloc to measure the memory allocated by an iteration, so that tracing does not slow down the timed run
+    """
+
+    def __init__(self, iterations: int = 1000, warmup: int = 20, alloc_iterations: int = 100):
+        """
+        Constructor
+        :param iterations: default number of timed iterations of each benchmark
+        :param warmup: number of iterations executed before the timed ones (e.g. to fill caches and lazy attributes)
+        :param alloc_iterations: maximum number of iterations executed under tracemalloc (0 disables the measurement of the allocations)
+        """
+        self.iterations = iterations
+        self.warmup = warmup
+        self.alloc_iterations = alloc_iterations
+        self.results: dict = {} # name of the benchmark -> result, in the order in which the benchmarks were run
+
+    def run(self, name: str, func, iterations: int = None, rows_per_call: int = 1) -> dict:
+        """
+        Method that runs a benchmark made of a single function
+        :param name: the name of the benchmark
+        :param func: function without parameters to measure
+        :param iterations: number of timed iterations (default: the one of the runner)
+        :param rows_per_call: number of rows (e.g. observations or CSV rows) processed by a call, used to compute the throughput in rows per second
+        :return: the result of the benchmark (see run_stages)
+        """
+        return self.run_stages(name, [("call", lambda state: func())], iterations, rows_per_call)
+
+    def run_stages(self, name: str, stages: list, iterations: int = None, rows_per_call: int = 1) -> dict:
+        """
+        Method that runs a benchmark made of a sequence of stages. The value returned by a stage is given in input to the next one
+        (the first stage receives None), so that a stage can pass its output (e.g. an observation) to the following one
+        :param name: the name of the benchmark
+        :param stages: list of pairs (name of the stage, function with one parameter)
+        :param iterations: number of timed iterations (default: the one of the runner)
+        :param rows_per_call: number of rows processed by an iteration, used to compute the throughput in rows per second
+        :return: dictionary with the latency percentiles (in microseconds) of each stage and of the whole iteration, the throughput and the allocations
+        """
+        iterations = iterations if iterations is not None else self.iterations
+        for _ in range(min(self.warmup, iterations)):
+            self.run_iteration(stages)
+
+        latencies = np.empty((iterations, len(stages)), dtype=np.int64)
+        gc.collect()
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for i in range(iterations):
+                state = None
+                for j, (_, func) in enumerate(stages):
+                    start = time.perf_counter_ns()
+                    state = func(state)
+                    latencies[i, j] = time.perf_counter_ns() - start
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        total_seconds = latencies.sum() / 1e9
+        result = {
+            "iterations": iterations,
+            "rows_per_call": rows_per_call,
+            "total": latency_stats(latencies.sum(axis=1)),
+            "calls_per_s": iterations / total_seconds if total_seconds > 0 else None,
+            "rows_per_s": iterations * rows_per_call / total_seconds if total_seconds > 0 else None
+        }
+        if len(stages) > 1:
+            result["stages"] = {stage_name: latency_stats(latencies[:, j]) for j, (stage_name, _) in enumerate(stages)}
+        if self.alloc_iterations > 0:
+            result["allocations"] = self.measure_allocations(stages, min(self.alloc_iterations, iterations))
+        self.results[name] = result
+        return result
+
+    @staticmethod
+    def run_iteration(stages: list) -> None:
+        """
+        Method that executes the stages of a benchmark once, without measuring them.
+        This method should not be called from the outside of the class.
+        """
+        state = None
+        for _, func in stages:
+            state = func(state)
+
+    def measure_allocations(self, stages: list, iterations: int) -> dict:
+        """
+        Method that runs the stages of a benchmark under tracemalloc.
+        This method should not be called from the outside of the class.
+        :param stages: list of pairs (name of the stage, function with one parameter)
+        :param iterations: number of iterations to run
+        :return: dictionary with the peak of the memory allocated during the run and the memory still allocated at its end, per iteration
+        """
+        gc.collect()
+        tracemalloc.start()
+        try:
+            start_size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            for _ in range(iterations):
+                self.run_iteration(stages)
+            end_size, peak_size = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            "iterations": iterations,
+            "peak_kib": (peak_size - start_size) / 1024,
+            "retained_bytes_per_call": (end_size - start_size) / iterations
+        }
+
+    def report(self) -> str:
+        """
+        Method that builds a table with the results of the benchmarks run so far
+        :return: the table as a string
+        """
+        rows = []
+        for name, result in self.results.items():
+            rows.append((name, result["total"], result))
+            for stage_name, stats in result.get("stages", {}).items():
+                rows.append(("  " + stage_name, stats, None))
+        width = max([len(name) for name, _, _ in rows] + [9])
+        lines = [f"{'benchmark':<{width}} {'p50 us':>10} {'p90 us':>10} {'p99 us':>10} {'calls/s':>10} {'rows/s':>10} {'peak KiB':>9} {'B/call':>8}"]
+        for name, stats, result in rows:
+            line = f"{name:<{width}} {stats['p50']:10.1f} {stats['p90']:10.1f} {stats['p99']:10.1f}"
+            if result is not None:
+                line += f" {result['calls_per_s'] or 0:10.1f} {result['rows_per_s'] or 0:10.1f}"
+                if "allocations" in result:
+                    line += f" {result['allocations']['peak_kib']:9.1f} {result['allocations']['retained_bytes_per_call']:8.1f}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def save(self, filename: str) -> None:
+        """
+        Method that writes the results to a JSON file, with a description of the environment in which they were measured, to be used as baseline
+        :param filename: the name of the file
+        """
+        with open(filename, "w") as f:
+            json.dump({"environment": environment_info(), "results": self.results}, f, indent=2)
+
+    def compare(self, baseline: dict, tolerance: float = REGRESSION_TOLERANCE) -> list:
+        """
+        Method that compares the latencies measured with those of a baseline (see save). Benchmarks or stages missing in one of the two are skipped
+        :param baseline: the content of a baseline file, as returned by load_baseline
+        :param tolerance: relative increase of a latency reported as a regression
+        :return: list of dictionaries (benchmark, stage, percentile, baseline, current, ratio, regression)
+        """
+        comparisons = []
+        for name, result in self.results.items():
+            base_result = baseline["results"].get(name)
+            if base_result is None:
+                continue
+            pairs = [("total", result["total"], base_result["total"])]
+            pairs += [(stage_name, stats, base_result.get("stages", {}).get(stage_name)) for stage_name, stats in result.get("stages", {}).items()]
+            for stage_name, stats, base_stats in pairs:
+                if base_stats is None:
+                    continue
+                for percentile in COMPARED_PERCENTILES:
+                    ratio = stats[percentile] / base_stats[percentile] if base_stats[percentile] > 0 else float("inf")
+                    comparisons.append({"benchmark": name, "stage": stage_name, "percentile": percentile, "baseline": base_stats[percentile],
+                                        "current": stats[percentile], "ratio": ratio, "regression": ratio > 1 + tolerance})
+        return comparisons
+
+
+def latency_stats(latencies_ns: np.ndarray) -> dict:
+    """
+    This function summarizes a series of latencies
+    :param latencies_ns: array of latencies, in nanoseconds
+    :return: dictionary with the percentiles (e.g. "p50"), mean and max of the latencies, in microseconds
+    """
+    latencies_us = latencies_ns / 1000
+    stats = {f"p{percentile}": float(value) for percentile, value in zip(PERCENTILES, np.percentile(latencies_us, PERCENTILES))}
+    stats["mean"] = float(latencies_us.mean())
+    stats["max"] = float(latencies_us.max())
+    return stats
+
+
+def environment_info() -> dict:
+    """
+    This function describes the environment in which the benchmarks are run, since results measured on different machines are not comparable
+    """
+    return {
+        "date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor()
+    }
+
+
+def load_baseline(filename: str) -> dict:
+    """
+    This function reads a baseline file written by BenchmarkRunner.save
+    :param filename: the name of the file
+    :return: dictionary with the keys "environment" and "results"
+    """
+    with open(filename) as f:
+        return json.load(f)
+
+
+def format_comparisons(comparisons: list) -> str:
+    """
+    This function builds a table with the comparisons returned by BenchmarkRunner.compare
+    :param comparisons: list of comparisons
+    :return: the table as a string
+    """
+    if not comparisons:
+        return "No benchmark in common with the baseline"
+    width = max(len(f"{c['benchmark']}/{c['stage']}") for c in comparisons)
+    lines = [f"{'benchmark/stage':<{width}} {'pct':>4} {'baseline us':>12} {'current us':>12} {'ratio':>7}"]
+    for c in comparisons:
+        flag = "  REGRESSION" if c["regression"] else ""
+        lines.append(f"{c['benchmark'] + '/' + c['stage']:<{width}} {c['percentile']:>4} {c['baseline']:12.1f} {c['current']:12.1f} {c['ratio']:7.2f}{flag}")
+    return "\n".join(lines)
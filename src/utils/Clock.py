@@ -0,0 +1,102 @@
+import time
+import threading
+from datetime import datetime
+
+class Clock:
+    """
+    Class that gives the time to the components that sample the system (SystemMonitor, AnomalyDetector, InjectionManager and the main loops),
+    so that they can be driven by a VirtualClock instead of the wall clock. This default implementation uses the wall clock
+    """
+
+    def time(self) -> float:
+        """
+        :return: seconds since the epoch
+        """
+        return time.time()
+
+    def time_ms(self) -> int:
+        """
+        :return: milliseconds since the epoch, rounded as current_ms does
+        """
+        return round(self.time() * 1000)
+
+    def now(self) -> datetime:
+        """
+        :return: the current date and time
+        """
+        return datetime.fromtimestamp(self.time())
+
+    def monotonic(self) -> float:
+        """
+        :return: seconds of a clock that never goes back, to measure intervals
+        """
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        """
+        Method that waits for the given number of seconds
+        """
+        time.sleep(seconds)
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        """
+        Method that waits for the given number of seconds or until the event is set
+        :return: True if the event is set
+        """
+        return event.wait(timeout)
+
+
+class VirtualClock(Clock):
+    """
+    Clock whose time advances only when someone sleeps on it (or when a TraceReplayBackend moves it to the time of the observation it replays),
+    so that hours of sampling can be replayed in seconds with the same timestamps. With a speedup greater than 0, each sleep also waits
+    for the virtual time divided by the speedup (e.g. 100 runs 100 times faster than real time)
+    """
+
+    def __init__(self, start_time: float = None, speedup: float = 0):
+        """
+        Constructor
+        :param start_time: virtual time at the creation of the clock, in seconds since the epoch (default: the current time)
+        :param speedup: ratio between the virtual time and the real time waited by a sleep (0 means that sleeps do not wait at all)
+        """
+        self.lock = threading.Lock()
+        self.current_time = start_time if start_time is not None else time.time()
+        self.start_time = self.current_time
+        self.speedup = speedup
+
+    def time(self) -> float:
+        with self.lock:
+            return self.current_time
+
+    def monotonic(self) -> float:
+        return self.time() - self.start_time
+
+    def sleep(self, seconds: float) -> None:
+        if self.speedup > 0:
+            time.sleep(seconds / self.speedup)
+        self.advance(seconds)
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        if event.wait(timeout / self.speedup if self.speedup > 0 else 0):
+            return True
+        self.advance(timeout)
+        return event.is_set()
+
+    def advance(self, seconds: float) -> None:
+        """
+        Method that moves the virtual time forward
+        :param seconds: number of seconds to add (negative values are ignored)
+        """
+        with self.lock:
+            self.current_time += max(seconds, 0)
+
+    def advance_to(self, timestamp: float) -> None:
+        """
+        Method that moves the virtual time forward to a given time, if it is in the future
+        :param timestamp: seconds since the epoch
+        """
+        with self.lock:
+            self.current_time = max(self.current_time, timestamp)
+
+
+WALL_CLOCK = Clock() # clock used when no other clock is given
@@ -0,0 +1,134 @@
+import os
+import csv
+import time
+import threading
+
+class CsvSink:
+    """
+    Class to write dictionaries as rows of a CSV file keeping the file open between rows.
+    Rows are kept in memory and written to the file in batches, when the number of pending rows or the time since the last flush exceed a threshold.
+    The time threshold is checked also by a background timer, so the pending rows are written even if no new row arrives (e.g. a slow sampling)
+    """
+
+    def __init__(self, filename: str, append: bool = False, flush_every_rows: int = 50, flush_interval_s: float = 1.0, fsync: bool = False):
+        """
+        Constructor
+        :param filename: the name of the CSV file
+        :param append: if True, rows are appended to an existing file (with the same header); if False, the file is overwritten
+        :param flush_every_rows: the pending rows are written to the file when their number reaches this value
+        :param flush_interval_s: the pending rows are written to the file when this number of seconds has passed since the last flush
+            (None to disable the time threshold and its timer)
+        :param fsync: if True, after each flush the content of the file is forced to the disk
+        """
+        self.filename = filename
+        self.flush_every_rows = flush_every_rows
+        self.flush_interval_s = flush_interval_s
+        self.fsync = fsync
+        self.pending_rows: list = []
+        self.fieldnames: list = None
+        self.fieldset: set = set()
+        self.last_flush_time = time.monotonic()
+        self.lock = threading.RLock() # taken by the writer and by the flush timer
+        self.timer_stop = threading.Event()
+        if append and os.path.exists(filename) and os.path.getsize(filename) > 0:
+            with open(filename, newline="") as f:
+                self.fieldnames = next(csv.reader(f))
+            self.fieldset = set(self.fieldnames)
+            self.file = open(filename, 'a', newline="")
+        else:
+            self.file = open(filename, 'w', newline="")
+        self.writer = csv.DictWriter(self.file, self.fieldnames, restval="") if self.fieldnames is not None else None
+        self.flush_thread = None
+        if flush_interval_s is not None and flush_interval_s > 0:
+            self.flush_thread = threading.Thread(target=self.flush_timer, daemon=True)
+            self.flush_thread.start()
+
+    def flush_timer(self) -> None:
+        """
+        Body of the thread that writes the pending rows when flush_interval_s seconds have passed since the last flush.
+        This method should not be called from the outside of the class.
+        """
+        while not self.timer_stop.wait(self.flush_interval_s):
+            with self.lock:
+                if self.pending_rows and not self.file.closed and time.monotonic() - self.last_flush_time >= self.flush_interval_s:
+                    self.flush()
+
+    def write(self, dict_item: dict) -> None:
+        """
+        Method to add a dictionary as a new row of the CSV file
+        :param dict_item: a dictionary containing the items to insert in the CSV file
+        """
+        with self.lock:
+            self.write_row(dict_item)
+
+    def write_row(self, dict_item: dict) -> None:
+        """
+        Method that adds a row, with the lock already taken.
+        This method should not be called from the outside of the class.
+        """
+        if self.fieldnames is None:
+            self.fieldnames = list(dict_item.keys())
+            self.fieldset = set(self.fieldnames)
+            self.writer = csv.DictWriter(self.file, self.fieldnames, restval="")
+            self.writer.writeheader()
+        elif not dict_item.keys() <= self.fieldset: # the row has keys that are not in the header
+            self.extend_fieldnames(dict_item)
+        self.pending_rows.append(dict_item)
+        if len(self.pending_rows) >= self.flush_every_rows or \
+                (self.flush_interval_s is not None and time.monotonic() - self.last_flush_time >= self.flush_interval_s):
+            self.flush()
+
+    def extend_fieldnames(self, dict_item: dict) -> None:
+        """
+        Method called when a row has keys that are not in the header of the file: they are appended to the header and the file is rewritten with
+        the new header (the previous rows get empty values for the new keys). Keys of the header missing in a row are always written as empty values
+        :param dict_item: the row with new keys
+        """
+        new_keys = [key for key in dict_item if key not in self.fieldset]
+        self.flush()
+        self.file.close()
+        self.fieldnames = self.fieldnames + new_keys
+        self.fieldset.update(new_keys)
+        tmp_filename = self.filename + ".tmp"
+        with open(self.filename, newline="") as f_in, open(tmp_filename, 'w', newline="") as f_out:
+            reader = csv.reader(f_in)
+            writer = csv.writer(f_out)
+            next(reader)
+            writer.writerow(self.fieldnames)
+            for row in reader:
+                writer.writerow(row + [""] * len(new_keys))
+        os.replace(tmp_filename, self.filename)
+        self.file = open(self.filename, 'a', newline="")
+        self.writer = csv.DictWriter(self.file, self.fieldnames, restval="")
+
+    def flush(self) -> None:
+        """
+        Method to write all the pending rows to the file
+        """
+        with self.lock:
+            if self.pending_rows:
+                self.writer.writerows(self.pending_rows)
+                self.pending_rows.clear()
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.last_flush_time = time.monotonic()
+
+    def close(self) -> None:
+        """
+        Method to write all the pending rows and close the file. It can be called more than once
+        """
+        self.timer_stop.set()
+        if self.flush_thread is not None:
+            self.flush_thread.join()
+            self.flush_thread = None
+        with self.lock:
+            if not self.file.closed:
+                self.flush()
+                self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,100 @@
+from collections import deque
+
+LOG_REASON_COLUMN = "log_reason" # column added to each row written, telling why it was written
+
+class EventWindowSink:
+    """
+    Class that writes into a sink (e.g. a CsvSink) only the rows around interesting events: the rows of the events, the pre_event_rows rows
+    before each event (kept in memory in a ring buffer until an event comes) and the post_event_rows rows after it. Between the events only one
+    row out of decimation is written, so that the size of the log grows with the events and not with the uptime: the decimation is applied to the
+    rows leaving the ring buffer, so the rows are always written in chronological order
+    """
+
+    def __init__(self, sink, pre_event_rows: int = 60, post_event_rows: int = 60, decimation: int = 60):
+        """
+        Constructor
+        :param sink: the sink in which the rows are written, with write, flush and close methods
+        :param pre_event_rows: number of rows before an event written with it
+        :param post_event_rows: number of rows after the last row of an event written with it
+        :param decimation: one row out of decimation is written between the events (0 means that no row is written between the events)
+        """
+        self.sink = sink
+        self.pre_event = deque() # last rows outside the events, not written yet
+        self.pre_event_rows = pre_event_rows
+        self.post_event_rows = post_event_rows
+        self.decimation = decimation
+        self.post_event_left: int = 0 # rows still to write after the last event
+        self.in_event: bool = False
+        self.rows_since_decimated: int = 0
+        self.stats = {"rows": 0, "written_rows": 0, "events": 0}
+
+    def write(self, row: dict, event: bool = False) -> None:
+        """
+        Method to add a row
+        :param row: the row, a dictionary that is not modified by the caller after this call
+        :param event: True if the row belongs to an interesting event (e.g. an anomaly is detected)
+        """
+        self.stats["rows"] += 1
+        if event:
+            if not self.in_event:
+                self.in_event = True
+                self.stats["events"] += 1
+                for pre_row in self.pre_event:
+                    self.write_row(pre_row, "pre_event")
+                self.pre_event.clear()
+            self.write_row(row, "event")
+            self.post_event_left = self.post_event_rows
+            return
+        self.in_event = False
+        if self.post_event_left > 0:
+            self.post_event_left -= 1
+            self.write_row(row, "post_event")
+            return
+        self.pre_event.append(row)
+        if len(self.pre_event) > self.pre_event_rows:
+            self.decimate(self.pre_event.popleft())
+
+    def decimate(self, row: dict) -> None:
+        """
+        Method that writes one out of decimation of the rows that are not written around an event.
+        This method should not be called from the outside of the class.
+        """
+        self.rows_since_decimated += 1
+        if self.decimation > 0 and self.rows_since_decimated >= self.decimation:
+            self.rows_since_decimated = 0
+            self.write_row(row, "decimated")
+
+    def write_row(self, row: dict, reason: str) -> None:
+        """
+        Method that writes a row into the sink, with the reason why it is written.
+        This method should not be called from the outside of the class.
+        """
+        row[LOG_REASON_COLUMN] = reason
+        self.sink.write(row)
+        self.stats["written_rows"] += 1
+
+    def get_stats(self) -> dict:
+        """
+        Method that returns the counters of the sink (rows received, rows written, events)
+        """
+        return dict(self.stats)
+
+    def flush(self) -> None:
+        """
+        Method to write the pending rows of the sink (the rows kept for a future event are not written)
+        """
+        self.sink.flush()
+
+    def close(self) -> None:
+        """
+        Method that closes the sink, decimating the rows kept for a future event. It can be called more than once
+        """
+        while self.pre_event:
+            self.decimate(self.pre_event.popleft())
+        self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,123 @@
+import threading
+from utils.Clock import Clock, WALL_CLOCK
+from utils.Histogram import Histogram
+
+LATENESS_EDGES_MS = (0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000) # edges of the histogram of the lateness of the ticks, in milliseconds
+PERIOD_RATIO_EDGES = (0.5, 0.9, 0.99, 1.01, 1.1, 1.5, 2, 3) # edges of the histogram of the actual periods, as multiples of the nominal period
+
+class FixedRateScheduler:
+    """
+    Class that fires the ticks of a sampling loop at a fixed rate: the deadlines are absolute times on the monotonic clock (the first
+    tick plus a multiple of the period), so the time spent by the loop body does not accumulate as drift. If the loop is late by one or
+    more whole periods, the missed ticks are skipped (and counted) instead of being fired back to back. The lateness of each tick and the
+    actual periods between ticks are recorded in histograms, to see when the host is too loaded to keep the rate
+    """
+
+    def __init__(self, period: float, clock: Clock = WALL_CLOCK):
+        """
+        Constructor
+        :param period: time between two ticks, in seconds (0 means that the ticks are fired back to back: only the periods are recorded)
+        :param clock: the clock whose monotonic time gives the deadlines and on which the scheduler waits
+        """
+        self.period = period
+        self.clock = clock
+        self.lock = threading.Lock() # the period can be changed by another thread (see set_period)
+        self.wakeup = threading.Event() # set to wake up the thread waiting for the next deadline
+        period_ms = period * 1000
+        self.lateness_ms = Histogram(LATENESS_EDGES_MS)
+        self.period_ms = Histogram(tuple(ratio * period_ms for ratio in PERIOD_RATIO_EDGES) if period > 0 else LATENESS_EDGES_MS)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Method that restarts the scheduler: the next tick is fired immediately and becomes the origin of the following deadlines
+        """
+        self.next_deadline: float = None
+        self.last_tick_time: float = None
+        self.num_ticks: int = 0
+        self.skipped_ticks: int = 0
+        self.lateness_ms.reset()
+        self.period_ms.reset()
+
+    def wait_next(self, stop_event: threading.Event = None) -> bool:
+        """
+        Method that waits for the deadline of the next tick. The wait is woken up by set_period, so that a shorter period applies to the wait
+        in progress, and by wake, so that the stop event is checked without waiting for the deadline
+        :param stop_event: if given, the wait is interrupted when this event is set (call wake after setting it)
+        :return: False if the wait was interrupted by the stop event, True when the tick is fired
+        """
+        clock = self.clock
+        while True:
+            with self.lock:
+                if self.next_deadline is None:
+                    self.next_deadline = clock.monotonic()
+                waited_deadline = self.next_deadline
+                self.wakeup.clear()
+            if stop_event is not None and stop_event.is_set():
+                return False
+            delay = waited_deadline - clock.monotonic()
+            if delay <= 0 or not clock.wait(self.wakeup, delay):
+                break
+            # woken up before the deadline: the deadline is read again, since the period may have changed
+
+        now = clock.monotonic()
+        with self.lock:
+            deadline = waited_deadline
+            if self.period > 0:
+                missed = int((now - deadline) // self.period) # whole periods passed since the deadline: those ticks are skipped
+                if missed > 0:
+                    self.skipped_ticks += missed
+                    deadline += missed * self.period
+                self.next_deadline = deadline + self.period
+            else:
+                deadline = now
+        self.lateness_ms.add(max(now - deadline, 0) * 1000)
+        if self.last_tick_time is not None:
+            self.period_ms.add((now - self.last_tick_time) * 1000)
+        self.last_tick_time = now
+        self.num_ticks += 1
+        return True
+
+    def set_period(self, period: float) -> None:
+        """
+        Method that changes the time between two ticks: the next deadline becomes the last one plus the new period (or now, if that time has
+        already passed). It can be called by another thread while the loop waits: the wait in progress is woken up and ends at the new deadline
+        :param period: the new time between two ticks, in seconds (greater than 0)
+        """
+        with self.lock:
+            if self.next_deadline is not None and self.period > 0:
+                self.next_deadline = max(self.next_deadline - self.period + period, self.clock.monotonic())
+            self.period = period
+            self.wakeup.set()
+
+    def wake(self) -> None:
+        """
+        Method that wakes up the thread waiting in wait_next, e.g. after setting its stop event
+        """
+        self.wakeup.set()
+
+    def get_stats(self) -> dict:
+        """
+        Method that returns the counters and the histograms of the scheduler
+        """
+        return {
+            "period_s": self.period,
+            "ticks": self.num_ticks,
+            "skipped_ticks": self.skipped_ticks,
+            "lateness_ms": self.lateness_ms.to_dict(),
+            "actual_period_ms": self.period_ms.to_dict()
+        }
+
+    def report(self) -> str:
+        """
+        Method that builds a textual report of the ticks fired so far
+        :return: the report as a string
+        """
+        lines = [f"Ticks: {self.num_ticks}, skipped ticks: {self.skipped_ticks}, nominal period: {self.period * 1000:g} ms"]
+        if self.period_ms.count > 0:
+            lines.append(f"Actual period: mean {self.period_ms.mean():.1f} ms, min {self.period_ms.min:.1f} ms, max {self.period_ms.max:.1f} ms")
+            lines.append(self.period_ms.report("ms"))
+        if self.lateness_ms.count > 0:
+            lines.append(f"Lateness: mean {self.lateness_ms.mean():.2f} ms, p99 <= {self.lateness_ms.quantile(0.99):.2f} ms, max {self.lateness_ms.max:.2f} ms")
+            lines.append(self.lateness_ms.report("ms"))
+        return "\n".join(lines)
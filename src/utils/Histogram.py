@@ -0,0 +1,79 @@
+import bisect
+
+class Histogram:
+    """
+    Class to count values (e.g. latencies) in bins with fixed edges. Recording a value costs a binary search on the edges,
+    so it can be used on every tick of a loop
+    """
+
+    def __init__(self, edges: tuple):
+        """
+        Constructor
+        :param edges: increasing upper edges of the bins: a value goes in the first bin whose edge is greater or equal to it,
+            the values greater than the last edge go in an additional last bin
+        """
+        self.edges: tuple = tuple(edges)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Method that removes all the values counted so far
+        """
+        self.counts: list = [0] * (len(self.edges) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.min: float = None
+        self.max: float = None
+
+    def add(self, value: float) -> None:
+        """
+        Method to count a value
+        :param value: the value
+        """
+        self.counts[bisect.bisect_left(self.edges, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.count == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def mean(self) -> float:
+        """
+        :return: the mean of the values counted (None if there are none)
+        """
+        return self.sum / self.count if self.count > 0 else None
+
+    def quantile(self, q: float) -> float:
+        """
+        Method that estimates a quantile of the values counted, as the upper edge of the bin that contains it
+        :param q: the quantile, between 0 and 1
+        :return: the estimate (the maximum value if the quantile is in the last bin, None if there are no values)
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for edge, count in zip(self.edges, self.counts):
+            cumulative += count
+            if cumulative >= rank and cumulative > 0:
+                return min(edge, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        """
+        Method that returns the content of the histogram, e.g. to write it into a JSON file
+        """
+        return {"edges": list(self.edges), "counts": list(self.counts), "count": self.count, "mean": self.mean(), "min": self.min, "max": self.max}
+
+    def report(self, unit: str = "") -> str:
+        """
+        Method that builds a table with the number of values in each bin (empty bins are omitted)
+        :param unit: unit of the values, written after the edges
+        :return: the table as a string
+        """
+        labels = [f"<= {edge:g} {unit}".rstrip() for edge in self.edges] + [f"> {self.edges[-1]:g} {unit}".rstrip()] if self.edges else ["all"]
+        width = max(len(label) for label in labels)
+        return "\n".join(f"{label:>{width}}: {count}" for label, count in zip(labels, self.counts) if count > 0)
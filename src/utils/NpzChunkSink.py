@@ -0,0 +1,190 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+MANIFEST_FILENAME = "manifest.json"
+CHUNK_PREFIX = "chunk_"
+
+class NpzChunkSink:
+    """
+    Class to write dictionaries as rows of a columnar dataset made of a series of NumPy chunks, with a fixed number of rows each.
+    Numeric values are stored as float32 (except the wall-clock and monotonic times, stored as int64, and the byte counts of the memory, stored as float64
+    so that they are not rounded) and the values of the label columns (e.g. injector) are dictionary-encoded.
+    The dataset is a folder containing the chunks and a manifest (JSON) with the dictionaries of the encoded columns and the list of chunks.
+    Only the uncompressed layout (compress=False) can be memory-mapped when it is loaded (see iter_npz_chunks): np.load reads the members of an .npz file into memory
+    """
+
+    def __init__(self, folder: str, row_group_size: int = 4096, compress: bool = True, dictionary_columns: tuple = ("injector",),
+                 int_columns: tuple = ("time", "monotonic_time"), float_dtype=np.float32, wide_prefixes: tuple = ("virtual_mem_",), string_length: int = 32):
+        """
+        Constructor
+        :param folder: the folder of the dataset (created if it does not exist)
+        :param row_group_size: number of rows of each chunk
+        :param compress: if True each chunk is a compressed .npz file; if False each chunk is a folder with a .npy file per column, that can be memory-mapped when loaded
+        :param dictionary_columns: names of the columns whose values are dictionary-encoded
+        :param int_columns: names of the columns stored as int64
+        :param float_dtype: type used to store all the other numeric columns
+        :param wide_prefixes: prefixes of the names of the numeric columns stored as float64, whose values would be rounded by float_dtype (e.g. byte counts)
+        :param string_length: minimum number of characters of the string columns that are not dictionary-encoded (longer values raise a ValueError)
+        """
+        self.folder = folder
+        self.row_group_size = row_group_size
+        self.compress = compress
+        self.dictionary_columns = dictionary_columns
+        self.int_columns = int_columns
+        self.float_dtype = float_dtype
+        self.wide_prefixes = wide_prefixes
+        self.string_length = string_length
+        self.dictionaries: dict = {column: {} for column in dictionary_columns} # for each encoded column, map value -> code
+        self.chunks: list = []
+        self.columns: list = None
+        self.arrays: dict = None
+        self.num_rows: int = 0 # number of rows in the current chunk
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    def new_chunk(self, dict_item: dict) -> None:
+        """
+        Method to allocate the arrays of a new chunk, using the keys and the types of the values of the given row
+        :param dict_item: the first row of the new chunk
+        """
+        self.columns = list(dict_item.keys())
+        self.arrays = {}
+        for column, value in dict_item.items():
+            if column in self.dictionary_columns:
+                dtype = np.int32
+            elif column in self.int_columns:
+                dtype = np.int64
+            elif isinstance(value, str):
+                dtype = np.dtype(f"U{max(len(value), self.string_length)}")
+            elif column.startswith(self.wide_prefixes):
+                dtype = np.float64
+            else:
+                dtype = self.float_dtype
+            self.arrays[column] = np.zeros(self.row_group_size, dtype=dtype)
+        self.num_rows = 0
+
+    def write(self, dict_item: dict) -> None:
+        """
+        Method to add a dictionary as a new row of the dataset
+        :param dict_item: a dictionary containing the items to insert in the dataset
+        """
+        if self.columns is None:
+            self.new_chunk(dict_item)
+        elif dict_item.keys() != self.arrays.keys(): # schema of the rows changed, a new chunk is started
+            self.flush()
+            self.new_chunk(dict_item)
+        i = self.num_rows
+        for column, value in dict_item.items():
+            if column in self.dictionaries:
+                value = self.dictionaries[column].setdefault(value, len(self.dictionaries[column]))
+            elif isinstance(value, str) and len(value) > self.arrays[column].dtype.itemsize // 4: # NumPy would silently cut the value
+                raise ValueError(f"The value of the column {column} is longer than {self.arrays[column].dtype.itemsize // 4} characters: "
+                                 f"increase string_length or dictionary-encode the column")
+            self.arrays[column][i] = value
+        self.num_rows += 1
+        if self.num_rows == self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Method to write the current chunk (if it contains rows) and to update the manifest of the dataset
+        """
+        if self.columns is None or self.num_rows == 0:
+            return
+        chunk_name = f"{CHUNK_PREFIX}{len(self.chunks):05d}"
+        arrays = {column: array[:self.num_rows] for column, array in self.arrays.items()}
+        if self.compress:
+            chunk_name += ".npz"
+            np.savez_compressed(os.path.join(self.folder, chunk_name), **arrays)
+        else:
+            os.makedirs(os.path.join(self.folder, chunk_name), exist_ok=True)
+            for i, (column, array) in enumerate(arrays.items()):
+                np.save(os.path.join(self.folder, chunk_name, f"c{i}.npy"), array)
+        self.chunks.append({"name": chunk_name, "rows": self.num_rows, "columns": self.columns, "dtypes": [array.dtype.str for array in arrays.values()]})
+        self.num_rows = 0
+        self.write_manifest()
+
+    def write_manifest(self) -> None:
+        """
+        Method to (re)write the manifest of the dataset
+        """
+        manifest = {
+            "chunks": self.chunks,
+            "dictionaries": {column: list(values.keys()) for column, values in self.dictionaries.items()} # the position of each value is its code
+        }
+        tmp_filename = os.path.join(self.folder, MANIFEST_FILENAME + ".tmp")
+        with open(tmp_filename, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_filename, os.path.join(self.folder, MANIFEST_FILENAME))
+
+    def close(self) -> None:
+        """
+        Method to write the last (partial) chunk. It can be called more than once
+        """
+        self.flush()
+
+
+def read_npz_chunk(folder: str, chunk: dict, mmap: bool = True) -> dict:
+    """
+    This function reads the columns of a chunk written by a NpzChunkSink, without decoding the dictionary-encoded columns
+    :param folder: the folder of the dataset
+    :param chunk: the entry of the chunk in the manifest
+    :param mmap: if True and the chunk is not compressed, its columns are memory-mapped (read-only) instead of being read into memory
+    :return: dictionary column -> array
+    """
+    path = os.path.join(folder, chunk["name"])
+    if chunk["name"].endswith(".npz"): # the members of an .npz file cannot be memory-mapped
+        with np.load(path) as npz:
+            return {column: npz[column] for column in chunk["columns"]}
+    return {column: np.load(os.path.join(path, f"c{i}.npy"), mmap_mode="r" if mmap else None) for i, column in enumerate(chunk["columns"])}
+
+
+def iter_npz_chunks(folder: str, mmap: bool = True):
+    """
+    Generator that yields a DataFrame for each chunk of a dataset written by a NpzChunkSink. With mmap and the uncompressed layout the numeric columns
+    of each DataFrame are backed by the memory-mapped files (read-only), so a chunk is read from the disk only when its values are used
+    :param folder: the folder of the dataset
+    :param mmap: if True, the chunks not compressed are memory-mapped instead of being read into memory
+    :return: a generator of DataFrames, one per chunk, with the dictionary-encoded columns as categorical columns
+    """
+    with open(os.path.join(folder, MANIFEST_FILENAME)) as f:
+        manifest = json.load(f)
+    for chunk in manifest["chunks"]:
+        data = read_npz_chunk(folder, chunk, mmap)
+        for column, categories in manifest["dictionaries"].items():
+            if column in data:
+                data[column] = pd.Categorical.from_codes(np.asarray(data[column]), categories=categories)
+        yield pd.DataFrame(data, copy=False)
+
+
+def load_npz_chunks(folder: str, mmap: bool = True) -> pd.DataFrame:
+    """
+    Function that loads a whole dataset written by a NpzChunkSink into a DataFrame. Dictionary-encoded columns are returned as categorical columns.
+    The columns of the DataFrame are allocated once and filled chunk by chunk, so each value is copied only once (use iter_npz_chunks to keep the
+    chunks memory-mapped instead)
+    :param folder: the folder of the dataset
+    :param mmap: if True, the chunks not compressed are memory-mapped while they are copied, instead of being read into temporary arrays
+    :return: the DataFrame with all the rows of the dataset
+    """
+    with open(os.path.join(folder, MANIFEST_FILENAME)) as f:
+        manifest = json.load(f)
+    chunks = manifest["chunks"]
+    if not chunks:
+        return pd.DataFrame()
+    columns = chunks[0]["columns"]
+    if any(chunk["columns"] != columns or "dtypes" not in chunk for chunk in chunks): # the schema changed during the collection
+        return pd.concat(iter_npz_chunks(folder, mmap), ignore_index=True)
+    num_rows = sum(chunk["rows"] for chunk in chunks)
+    dtypes = [np.result_type(*(np.dtype(chunk["dtypes"][i]) for chunk in chunks)) for i in range(len(columns))] # e.g. longer strings in a later chunk
+    data = {column: np.empty(num_rows, dtype=dtype) for column, dtype in zip(columns, dtypes)}
+    start = 0
+    for chunk in chunks:
+        for column, array in read_npz_chunk(folder, chunk, mmap).items():
+            data[column][start:start + chunk["rows"]] = array
+        start += chunk["rows"]
+    for column, categories in manifest["dictionaries"].items():
+        if column in data:
+            data[column] = pd.Categorical.from_codes(data[column], categories=categories)
+    return pd.DataFrame(data, copy=False)
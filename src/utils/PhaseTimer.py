@@ -0,0 +1,41 @@
+import time
+from contextlib import contextmanager
+
+class PhaseTimer:
+    """
+    Class to measure the duration of the consecutive phases of a procedure (e.g. the startup of the anomaly detector) and to report them
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.start_time = time.perf_counter()
+        self.phases: list = [] # pairs (name of the phase, duration in seconds), in the order in which the phases ended
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Context manager that measures the duration of the code in its block as a phase with the given name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def elapsed(self) -> float:
+        """
+        :return: seconds since the creation of the timer
+        """
+        return time.perf_counter() - self.start_time
+
+    def report(self) -> str:
+        """
+        Method that builds a table with the duration of each phase
+        :return: the table as a string
+        """
+        width = max([len(name) for name, _ in self.phases] + [5])
+        lines = [f"{name:<{width}} {duration * 1000:10.1f} ms" for name, duration in self.phases]
+        lines.append(f"{'total':<{width}} {self.elapsed() * 1000:10.1f} ms")
+        return "\n".join(lines)
@@ -0,0 +1,137 @@
+import os
+import re
+import csv
+import gzip
+import time
+import queue
+import shutil
+import threading
+from datetime import datetime
+from utils.CsvSink import CsvSink
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024 # size after which the current file is closed and a new one is started
+SEGMENT_SUFFIX_FORMAT = "%Y%m%d-%H%M%S" # suffix added to the name of a closed segment, so that the segments sort by age
+
+def compress_segment(path: str) -> str:
+    """
+    This function compresses a closed segment with gzip, replacing it with path + ".gz" only when the compressed file is complete
+    :param path: the path of the segment
+    :return: the path of the compressed segment
+    """
+    tmp_path = path + ".gz.tmp"
+    with open(path, "rb") as f_in, gzip.open(tmp_path, "wb", compresslevel=6) as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.replace(tmp_path, path + ".gz")
+    os.remove(path)
+    return path + ".gz"
+
+
+class RotatingCsvSink(CsvSink):
+    """
+    CsvSink whose file is rotated when it exceeds a size or an age: the current file is renamed to a closed segment (the name of the file followed
+    by the time of the rotation) and a new file with the same header is started. The closed segments are compressed and the oldest ones are removed
+    by a background thread, so that the writer never waits for them
+    """
+
+    def __init__(self, filename: str, max_bytes: int = DEFAULT_MAX_BYTES, max_age_s: float = None, max_segments: int = None, compress: bool = True, **kwargs):
+        """
+        Constructor
+        :param filename: the name of the CSV file
+        :param max_bytes: the file is rotated when its size reaches this number of bytes (None for no limit)
+        :param max_age_s: the file is rotated when this number of seconds has passed since it was started (None for no limit)
+        :param max_segments: maximum number of closed segments kept, the oldest ones are removed (None to keep all of them)
+        :param compress: if True, the closed segments are compressed with gzip
+        :param kwargs: the other parameters of CsvSink (append, flush_every_rows, flush_interval_s, fsync)
+        """
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.max_segments = max_segments
+        self.compress = compress
+        self.started_at = time.monotonic()
+        self.segment_pattern = re.compile(re.escape(os.path.basename(filename)) + r"\.(\d{8}-\d{6})(?:-(\d+))?(?:\.gz)?")
+        self.segment_queue = queue.Queue()
+        self.segment_thread = None
+        self.num_rotations: int = 0
+        self.closing: bool = False # set by close, so that the last flush does not start a new file that would stay with the header only
+
+    def flush(self) -> None:
+        """
+        Method to write all the pending rows to the file, rotating it if it has exceeded its size or its age
+        """
+        with self.lock: # the flush timer of CsvSink can rotate the file too
+            super().flush()
+            if self.fieldnames is None or self.closing: # nothing has been written yet, or the file is being closed
+                return
+            if (self.max_bytes is not None and self.file.tell() >= self.max_bytes) or \
+                    (self.max_age_s is not None and time.monotonic() - self.started_at >= self.max_age_s):
+                self.rotate()
+
+    def rotate(self) -> None:
+        """
+        Method that closes the current file as a segment and starts a new file with the same header.
+        This method should not be called from the outside of the class.
+        """
+        self.file.close()
+        suffix = datetime.now().strftime(SEGMENT_SUFFIX_FORMAT)
+        segment = f"{self.filename}.{suffix}"
+        num = 0
+        while os.path.exists(segment) or os.path.exists(segment + ".gz"): # more rotations in the same second
+            num += 1
+            segment = f"{self.filename}.{suffix}-{num}"
+        os.replace(self.filename, segment)
+        self.file = open(self.filename, 'w', newline="")
+        self.writer = csv.DictWriter(self.file, self.fieldnames, restval="")
+        self.writer.writeheader()
+        self.started_at = time.monotonic()
+        self.num_rotations += 1
+        if self.segment_thread is None:
+            self.segment_thread = threading.Thread(target=self.segment_loop, daemon=True)
+            self.segment_thread.start()
+        self.segment_queue.put(segment)
+
+    def segment_loop(self) -> None:
+        """
+        Body of the background thread that compresses the closed segments and removes the oldest ones.
+        This method should not be called from the outside of the class.
+        """
+        while (segment := self.segment_queue.get()) is not None:
+            try:
+                if self.compress:
+                    compress_segment(segment)
+                self.remove_old_segments()
+            except OSError as e:
+                print(f"Error while handling the log segment {segment}: {e}")
+
+    def get_segments(self) -> list:
+        """
+        Method that returns the paths of the closed segments of the file (compressed or not), from the oldest one
+        """
+        folder = os.path.dirname(self.filename) or "."
+        segments = []
+        for name in os.listdir(folder):
+            if match := self.segment_pattern.fullmatch(name):
+                segments.append(((match.group(1), int(match.group(2) or 0)), os.path.join(folder, name)))
+        return [path for _, path in sorted(segments)]
+
+    def remove_old_segments(self) -> None:
+        """
+        Method that removes the oldest closed segments beyond max_segments.
+        This method should not be called from the outside of the class.
+        """
+        if self.max_segments is None:
+            return
+        segments = self.get_segments()
+        for segment in segments[:max(len(segments) - self.max_segments, 0)]:
+            os.remove(segment)
+
+    def close(self) -> None:
+        """
+        Method to write all the pending rows and close the file, waiting for the compression of the closed segments. It can be called more than once
+        """
+        self.closing = True
+        super().close()
+        if self.segment_thread is not None:
+            self.segment_queue.put(None)
+            self.segment_thread.join()
+            self.segment_thread = None
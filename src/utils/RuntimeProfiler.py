@@ -0,0 +1,119 @@
+import os
+import io
+import signal
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from datetime import datetime
+
+PROFILE_SIGNAL = signal.SIGUSR1 # signal that starts/stops the CPU profiling (cProfile)
+TRACEMALLOC_SIGNAL = signal.SIGUSR2 # signal that starts the tracing of the allocations / takes a snapshot and stops it (tracemalloc)
+TRACEMALLOC_FRAMES = 10 # frames kept in the traceback of each allocation
+REPORT_TOP_LINES = 30 # lines of the text reports (functions with the highest cumulative time, lines with the most allocated memory)
+
+class RuntimeProfiler:
+    """
+    Class that profiles a running process on demand, toggled by signals (e.g. kill -USR1 <pid>), without restarting it.
+    cProfile profiles only the thread that enables it, so the threads to profile call checkpoint at each iteration of their loop: there they start
+    and stop their own profiler, and the stats of all of them are merged when the last one stops. tracemalloc traces the whole process.
+    The reports are written into the output folder, with the reports of the given stage timers
+    """
+
+    def __init__(self, out_folder: str, stage_timers: list = ()):
+        """
+        Constructor
+        :param out_folder: folder in which the reports are written
+        :param stage_timers: StageTimers whose report is written with the CPU profile
+        """
+        self.out_folder = out_folder
+        self.stage_timers = list(stage_timers)
+        self.cpu_requested = False # True while the CPU profiling is requested by the signal
+        self.lock = threading.Lock()
+        self.active_profilers: int = 0
+        self.finished_profilers: list = []
+        self.local = threading.local()
+
+    def install(self) -> None:
+        """
+        Method that registers the signal handlers. It must be called from the main thread
+        """
+        signal.signal(PROFILE_SIGNAL, lambda signum, frame: self.toggle_cpu())
+        signal.signal(TRACEMALLOC_SIGNAL, lambda signum, frame: self.toggle_tracemalloc())
+
+    def toggle_cpu(self) -> None:
+        """
+        Method that requests the start (or the stop) of the CPU profiling: each profiled thread starts (or stops) it at its next checkpoint
+        """
+        self.cpu_requested = not self.cpu_requested
+        print("CPU profiling %s" % ("requested" if self.cpu_requested else "stopped, the report is written at the next checkpoint"))
+
+    def checkpoint(self) -> None:
+        """
+        Method called by a profiled thread at each iteration of its loop: it starts or stops the profiler of the thread as requested.
+        When the profiling is not requested, its cost is the check of a flag
+        """
+        profiler = getattr(self.local, "profiler", None)
+        if self.cpu_requested == (profiler is not None):
+            return
+        if profiler is None:
+            self.local.profiler = cProfile.Profile()
+            with self.lock:
+                self.active_profilers += 1
+            self.local.profiler.enable()
+        else:
+            self.stop()
+
+    def stop(self) -> None:
+        """
+        Method that stops the profiler of the calling thread, if any. A profiled thread must call it also when its loop ends.
+        When the last profiler running is stopped, the report is written
+        """
+        profiler = getattr(self.local, "profiler", None)
+        if profiler is None:
+            return
+        profiler.disable()
+        self.local.profiler = None
+        with self.lock:
+            self.finished_profilers.append(profiler)
+            self.active_profilers -= 1
+            if self.active_profilers > 0:
+                return
+            profilers, self.finished_profilers = self.finished_profilers, []
+        self.write_cpu_report(profilers)
+
+    def write_cpu_report(self, profilers: list) -> None:
+        """
+        Method that merges the stats of the profilers of the threads and writes them (as a pstats file and as text) into the output folder.
+        This method should not be called from the outside of the class.
+        :param profilers: the stopped profilers
+        """
+        filename = os.path.join(self.out_folder, "profile_" + datetime.now().strftime("%Y%m%d-%H%M%S"))
+        stream = io.StringIO()
+        stats = pstats.Stats(*profilers, stream=stream)
+        stats.dump_stats(filename + ".prof")
+        stats.sort_stats("cumulative").print_stats(REPORT_TOP_LINES)
+        with open(filename + ".txt", "w") as f:
+            for stage_timers in self.stage_timers:
+                f.write(stage_timers.report() + "\n\n")
+            f.write(stream.getvalue())
+        print("CPU profile of %d threads written into %s.prof and %s.txt" % (len(profilers), filename, filename))
+
+    def toggle_tracemalloc(self) -> None:
+        """
+        Method that starts the tracing of the allocations or, if it is running, takes a snapshot, writes the lines that allocated
+        the most memory still held into the output folder and stops the tracing
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            print("Tracing of the allocations started")
+            return
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        filename = os.path.join(self.out_folder, "tracemalloc_" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".txt")
+        with open(filename, "w") as f:
+            f.write(f"Traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n")
+            for stat in snapshot.statistics("lineno")[:REPORT_TOP_LINES]:
+                f.write(str(stat) + "\n")
+        print("Snapshot of the allocations written into %s" % filename)
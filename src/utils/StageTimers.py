@@ -0,0 +1,85 @@
+import time
+import threading
+from utils.Histogram import Histogram
+
+LATENCY_EDGES_US = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000) # edges of the histograms of the stages, in microseconds
+STAGE_WINDOW_S = 60 # seconds covered by each window of the rolling histograms
+
+class StageTimers:
+    """
+    Class that keeps a rolling latency histogram for each stage of a loop (e.g. sample, model, log of the anomaly detector).
+    Recording a stage costs a perf_counter_ns call and a binary search, so the timers can stay enabled on the live host.
+    Each stage keeps the histogram of the current window and the one of the last complete window of STAGE_WINDOW_S seconds, besides a
+    cumulative histogram since the creation of the timers (e.g. for the metrics scraped by Prometheus).
+    A stage must be recorded always by the same thread, while different stages can be recorded by different threads
+    """
+
+    def __init__(self, window_s: float = STAGE_WINDOW_S, edges: tuple = LATENCY_EDGES_US):
+        """
+        Constructor
+        :param window_s: seconds covered by each window of the histograms
+        :param edges: edges of the histograms, in microseconds
+        """
+        self.window_ns = int(window_s * 1e9)
+        self.edges = edges
+        self.stages: dict = {} # name of the stage -> [histogram of the current window, histogram of the last complete window, start of the current window in ns, cumulative histogram]
+        self.lock = threading.Lock() # taken only to add a new stage
+
+    def record(self, name: str, start_ns: int) -> int:
+        """
+        Method that records the duration of a stage, from the given start to now
+        :param name: name of the stage
+        :param start_ns: time.perf_counter_ns() at the start of the stage
+        :return: the current time.perf_counter_ns(), to be used as start of the next stage
+        """
+        now = time.perf_counter_ns()
+        stage = self.stages.get(name)
+        if stage is None:
+            with self.lock:
+                stage = self.stages.setdefault(name, [Histogram(self.edges), None, now, Histogram(self.edges)])
+        if now - stage[2] >= self.window_ns: # the current window is complete: it becomes the last one
+            stage[1] = stage[0]
+            stage[0] = Histogram(self.edges)
+            stage[2] = now
+        duration_us = (now - start_ns) / 1000
+        stage[0].add(duration_us)
+        stage[3].add(duration_us)
+        return now
+
+    def get_histogram(self, name: str) -> Histogram:
+        """
+        Method that returns the histogram of the last complete window of a stage or, if the first window is not complete yet, the current one
+        """
+        current, last, _, _ = self.stages[name]
+        return last if last is not None else current
+
+    def get_cumulative_histogram(self, name: str) -> Histogram:
+        """
+        Method that returns the histogram of all the durations of a stage recorded since the creation of the timers
+        """
+        return self.stages[name][3]
+
+    def get_stats(self) -> dict:
+        """
+        Method that returns, for each stage, the content of its histogram (see get_histogram), e.g. to write it into a JSON file
+        """
+        return {name: self.get_histogram(name).to_dict() for name in list(self.stages)}
+
+    def report(self) -> str:
+        """
+        Method that builds a table with count, mean, median, 99th percentile and maximum latency of each stage, in milliseconds
+        (the 50th and 99th percentiles are upper bounds, given by the edges of the histogram)
+        :return: the table as a string
+        """
+        names = list(self.stages)
+        if not names:
+            return "No stage recorded"
+        width = max(len(name) for name in names + ["stage"])
+        lines = [f"{'stage':<{width}} {'count':>8} {'mean':>10} {'p50<=':>10} {'p99<=':>10} {'max':>10}"]
+        for name in names:
+            histogram = self.get_histogram(name)
+            if histogram.count == 0:
+                continue
+            lines.append(f"{name:<{width}} {histogram.count:>8} {histogram.mean() / 1000:>10.3f} {histogram.quantile(0.5) / 1000:>10.3f} "
+                         f"{histogram.quantile(0.99) / 1000:>10.3f} {histogram.max / 1000:>10.3f}")
+        return "\n".join(lines)
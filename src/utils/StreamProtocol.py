@@ -0,0 +1,90 @@
+import json
+import socket
+import struct
+import numpy as np
+
+# Binary protocol used between the monitoring agents and the collector. Each message is a frame made of a header (type, length of the payload)
+# followed by the payload. After the connection, the agent sends HELLO with its host name, the collector answers with FEATURES (names of the
+# values that the agent has to send, in order) or ERROR, then the agent streams one OBSERVATION for each observation made
+MSG_HELLO = 1 # payload: JSON {"host": ...}
+MSG_FEATURES = 2 # payload: JSON {"features": [...]}
+MSG_OBSERVATION = 3 # payload: time in milliseconds (int64) + values (float64), little endian
+MSG_ERROR = 4 # payload: JSON {"error": ...}
+HEADER = struct.Struct("<BI")
+OBS_TIME = struct.Struct("<q")
+VALUES_DTYPE = np.dtype("<f8")
+
+
+def parse_address(address: str) -> tuple:
+    """
+    This function parses the address of the collector
+    :param address: "unix:/path/to/socket" for a Unix socket or "host:port" for TCP
+    :return: a tuple (socket family, address to give to connect/bind)
+    """
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "0.0.0.0", int(port))
+
+
+def pack_message(msg_type: int, payload: bytes) -> bytes:
+    """
+    This function builds a frame of the protocol
+    :param msg_type: type of the message (one of the MSG_* constants)
+    :param payload: the payload of the message
+    :return: the bytes to send
+    """
+    return HEADER.pack(msg_type, len(payload)) + payload
+
+
+def pack_json(msg_type: int, data: dict) -> bytes:
+    """
+    This function builds a frame with a JSON payload (used by the messages of the handshake)
+    """
+    return pack_message(msg_type, json.dumps(data).encode())
+
+
+def pack_observation(time_ms: int, values: np.ndarray) -> bytes:
+    """
+    This function builds the frame of an observation
+    :param time_ms: time of the observation in milliseconds
+    :param values: the values of the features requested by the collector, in the same order
+    :return: the bytes to send
+    """
+    payload = OBS_TIME.pack(time_ms) + np.ascontiguousarray(values, dtype=VALUES_DTYPE).tobytes()
+    return pack_message(MSG_OBSERVATION, payload)
+
+
+def unpack_observation(payload: bytes) -> tuple:
+    """
+    This function decodes the payload of an observation
+    :return: a tuple (time in milliseconds, float64 array of values)
+    """
+    time_ms = OBS_TIME.unpack_from(payload)[0]
+    return time_ms, np.frombuffer(payload, dtype=VALUES_DTYPE, offset=OBS_TIME.size)
+
+
+def read_exactly(stream, size: int) -> bytes:
+    """
+    This function reads exactly size bytes from a binary stream (e.g. socket.makefile("rb"))
+    :return: the bytes read, or None if the connection has been closed
+    """
+    data = stream.read(size)
+    if data is None or len(data) < size:
+        return None
+    return data
+
+
+def read_message(stream) -> tuple:
+    """
+    This function reads the next frame from a binary stream
+    :return: a tuple (type of the message, payload), or (None, None) if the connection has been closed
+    """
+    header = read_exactly(stream, HEADER.size)
+    if header is None:
+        return None, None
+    msg_type, length = HEADER.unpack(header)
+    payload = read_exactly(stream, length) if length > 0 else b""
+    if payload is None:
+        return None, None
+    return msg_type, payload
@@ -1,6 +1,7 @@
 import time
 import csv
 import re
+import numpy as np
 from datetime import datetime
 
 def current_ms():
@@ -35,6 +36,36 @@ def write_dict_to_csv(filename, dict_item, is_first_time) -> None:
     w.writerow(dict_item)
     f.close()
 
+def cpu_percentages_from_delta(t1: np.ndarray, t2: np.ndarray, fields: tuple, time_scale: float = 1.0) -> tuple:
+    """
+    Function that computes, from two snapshots of the raw CPU times of all cores, both the CPU times percentages and the usage percentage of each core.
+    The results are the same computed by psutil.cpu_times_percent() and psutil.cpu_percent() over the interval between the two snapshots.
+    Note that psutil divides the CPU times by max(1, total CPU time of the core): for intervals shorter than one second the CPU times percentages
+    are not percentages of the interval but depend on its length (e.g. an idle core gives about 10 over 0.1 seconds and about 100 over 1 second),
+    so the values are comparable only between equal intervals. With time_scale the deltas are rescaled to a reference interval before applying
+    the scaling of psutil, so that snapshots taken at any distance give the values that psutil would give over the reference interval
+    :param t1: array (cores x CPU times) of the first snapshot of the raw CPU times
+    :param t2: array (cores x CPU times) of the second snapshot of the raw CPU times, taken after t1
+    :param fields: names of the CPU times, in the same order of the columns of the snapshots
+    :param time_scale: ratio between the reference interval and the interval between the two snapshots (1 to use the actual interval)
+    :return: a tuple (array cores x CPU times of CPU times percentages, array of usage percentages per core)
+    """
+    times_delta = np.maximum(t2 - t1, 0.0) # CPU times counters can go backwards, negative deltas are trimmed to zero as psutil does
+    if time_scale != 1.0:
+        times_delta *= time_scale # the usage percentages are ratios, so they do not change
+    total = times_delta.sum(axis=1)
+    busy = total.copy()
+    for i, field in enumerate(fields):
+        if field == "guest" or field == "guest_nice": # on Linux guest times are already accounted in "user" and "nice" times
+            total -= times_delta[:, i]
+            busy -= times_delta[:, i]
+        elif field == "idle" or field == "iowait": # on Linux iowait is not accounted in idle time
+            busy -= times_delta[:, i]
+    scale = 100.0 / np.maximum(total, 1) # same scaling used by psutil.cpu_times_percent()
+    times_percent = np.clip(np.round(times_delta * scale[:, None], 1), 0.0, 100.0)
+    usage_percent = np.round(np.divide(busy, total, out=np.zeros_like(total), where=total != 0) * 100, 1)
+    return times_percent, usage_percent
+
 def get_int_number_from_string(str: str) -> int:
     """
     Function that given a string, returns the first integer number inside of it
@@ -47,3 +78,48 @@ def get_int_number_from_string(str: str) -> int:
     else:
         return None
 
+
+def load_model(filename: str, mmap_mode: str = "r"):
+    """
+    This function loads a model (or a scaler) saved with joblib. joblib is imported here, so that it (and the libraries needed to unpickle
+    the model, e.g. sklearn and xgboost) is loaded only when needed. If the file was saved without compression, the NumPy arrays of the model
+    are memory-mapped in read-only mode, so that more processes that load the same file share the same pages
+    :param filename: the file of the saved model
+    :param mmap_mode: the mmap_mode of joblib.load (None to read the whole file into memory)
+    :return: the model
+    """
+    import joblib
+    import warnings
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*mmap.*") # compressed files can not be memory-mapped: they are loaded into memory
+        return joblib.load(filename, mmap_mode=mmap_mode)
+
+
+def load_npz_mmap(filename: str) -> dict:
+    """
+    This function loads the arrays of an npz file saved without compression (np.savez), memory-mapping them in read-only mode, so that more
+    processes that load the same file share the same pages. np.load reads the members of an npz file into memory: here the position of the data
+    of each member is read from its zip and npy headers, and the data is mapped directly from the file. Compressed members, arrays of objects,
+    0-d and empty arrays are read into memory
+    :param filename: the name of the npz file
+    :return: dictionary name -> array
+    """
+    import zipfile
+    arrays = {}
+    with zipfile.ZipFile(filename) as archive, open(filename, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type == zipfile.ZIP_STORED:
+                f.seek(info.header_offset)
+                local_header = f.read(30) # the local header of the member is followed by its name and its extra field
+                f.seek(info.header_offset + 30 + int.from_bytes(local_header[26:28], "little") + int.from_bytes(local_header[28:30], "little"))
+                version = np.lib.format.read_magic(f)
+                if version in ((1, 0), (2, 0)):
+                    read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+                    shape, fortran_order, dtype = read_header(f)
+                    if shape != () and not dtype.hasobject and int(np.prod(shape)) > 0:
+                        arrays[name] = np.memmap(f, dtype=dtype, mode="r", offset=f.tell(), shape=shape, order="F" if fortran_order else "C")
+                        continue
+            with archive.open(info) as member:
+                arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+    return arrays